@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""Time reading a generated stat file with the pandas and the memory mapped readers.
+
+Usage: PYTHONPATH=../ush python bench_read_stat.py [number_of_lines]
+"""
+
+# pylint:disable=import-error
+# imported modules exist
+
+import os
+import sys
+import random
+import tempfile
+import timeit
+
+import constants as CN
+from read_data_files import ReadDataFiles
+
+HEADER = ("VERSION MODEL DESC FCST_LEAD FCST_VALID_BEG FCST_VALID_END OBS_LEAD OBS_VALID_BEG "
+          "OBS_VALID_END FCST_VAR FCST_UNITS FCST_LEV OBS_VAR OBS_UNITS OBS_LEV OBTYPE VX_MASK "
+          "INTERP_MTHD INTERP_PNTS FCST_THRESH OBS_THRESH COV_THRESH ALPHA LINE_TYPE")
+
+
+def stat_line(rand):
+    """Make one CTC or SL1L2 line."""
+    line_type = rand.choice(["CTC", "SL1L2"])
+    if line_type == "CTC":
+        data = [str(rand.randint(1, 100)) for _ in range(5)]
+    else:
+        data = [str(rand.randint(1, 100))] + ["%.5f" % rand.random() for _ in range(6)]
+    return " ".join(["V9.1", "GFS", "NA", "120000", "20120409_120000", "20120409_120000",
+                     "000000", "20120409_113000", "20120409_123000",
+                     rand.choice(["TMP", "RH", "UGRD"]), "NA", "P850", "TMP", "NA", "P850",
+                     "ADPUPA", rand.choice(["FULL", "NH", "SH"]), "NEAREST", "1",
+                     rand.choice(["NA", ">273.0"]), "NA", "NA", "NA", line_type] + data)
+
+
+def main():
+    """Write the file, read it with each engine, and print the best times."""
+    line_count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    rand = random.Random(1)
+    hdr_names = CN.LONG_HEADER + CN.COL_NUMS
+    file_data = ReadDataFiles()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filename = os.path.join(tmp_dir, "bench.stat")
+        with open(filename, "w") as stat_file:
+            stat_file.write(HEADER + "\n")
+            for _ in range(line_count):
+                stat_file.write(stat_line(rand) + "\n")
+
+        for engine in CN.READ_ENGINES:
+            file_data.read_engine = engine
+            best = min(timeit.repeat(lambda: file_data.read_stat(filename, hdr_names),
+                                     number=1, repeat=3))
+            print("{:8} {:8d} lines {:.3f} seconds".format(engine, line_count, best))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Time writing a generated MPR-like dataframe with pandas to_csv and FormatCsvData.
+
+Usage: PYTHONPATH=../ush python bench_write_csv.py [number_of_lines]
+"""
+
+# pylint:disable=import-error
+# imported modules exist
+
+import os
+import sys
+import tempfile
+import timeit
+import numpy as np
+import pandas as pd
+
+import constants as CN
+from format_csv_data import FormatCsvData
+
+
+def mpr_data(line_count):
+    """Make a dataframe with the kinds of columns in line_data_mpr."""
+    rand = np.random.RandomState(1)
+    valid = pd.Timestamp('2012-04-09 12:00:00')
+    raw_data = pd.DataFrame({'stat_header_id': rand.randint(0, 1000, line_count),
+                             'data_file_id': np.ones(line_count, dtype=int),
+                             'line_num': np.arange(line_count),
+                             'fcst_lead': np.full(line_count, 120000),
+                             'fcst_valid_beg': valid,
+                             'fcst_init_beg': valid - pd.Timedelta(hours=12),
+                             'obs_sid': rand.choice(['72469', 'KDEN', 'KBOU'], line_count),
+                             'obs_lat': rand.uniform(-90, 90, line_count),
+                             'obs_lon': rand.uniform(-180, 180, line_count),
+                             'obs_lvl': np.full(line_count, 850.0),
+                             'fcst': rand.normal(273, 5, line_count).round(5),
+                             'obs': rand.normal(273, 5, line_count).round(5),
+                             'obs_qc': 'NA'})
+    raw_data.loc[::10, 'obs'] = np.nan
+    return raw_data
+
+
+def main():
+    """Write the dataframe with each writer, and print the best times."""
+    line_count = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    raw_data = mpr_data(line_count)
+    col_list = list(raw_data.columns)
+
+    def write_pandas(filename):
+        with open(filename, 'w') as csv_file:
+            raw_data[col_list].to_csv(csv_file, na_rep=CN.MV_NOTAV, index=False,
+                                      header=False, sep=CN.SEP)
+
+    def write_numpy(filename):
+        with open(filename, 'wb') as csv_file:
+            FormatCsvData.write_csv(raw_data, col_list, csv_file)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filename = os.path.join(tmp_dir, 'bench.csv')
+        for name, writer in (('pandas', write_pandas), ('numpy', write_numpy)):
+            best = min(timeit.repeat(lambda: writer(filename), number=1, repeat=3))
+            print("{:8} {:8d} lines {:.3f} seconds".format(name, line_count, best))
+
+
+if __name__ == '__main__':
+    main()
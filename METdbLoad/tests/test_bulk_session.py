@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Test the bulk_session option, from the XML file to the database connection."""
+
+# pylint:disable=import-error
+# imported modules exist
+
+import pymysql
+
+import constants as CN
+from read_load_xml import XmlLoadFile
+from run_sql import RunSql
+
+XML_TEXT = """<load_spec>
+  <connection>
+    <management_system>mysql</management_system>
+    <host>localhost:3306</host>
+    <database>mv_test</database>
+    <user>met_admin</user>
+    <password>pass</password>
+  </connection>
+  {}
+</load_spec>
+"""
+
+
+class ConnectCursor:
+    """Cursor for the queries run when connecting."""
+
+    def execute(self, query, args=None):
+        """Nothing to run."""
+
+    @staticmethod
+    def fetchall():
+        """Result of the SHOW VARIABLES queries."""
+        return [('variable', '1048576')]
+
+
+class FakeConnection:
+    """Connection that hands out a ConnectCursor."""
+
+    @staticmethod
+    def cursor():
+        """Cursor for the connection."""
+        return ConnectCursor()
+
+
+def read_flags(tmp_path, tags):
+    """Read an XML load file with the given tags."""
+    xml_file = tmp_path / "load.xml"
+    xml_file.write_text(XML_TEXT.format(tags))
+    xml_loadfile = XmlLoadFile(str(xml_file))
+    xml_loadfile.read_xml()
+    return xml_loadfile
+
+
+def test_bulk_session(tmp_path, monkeypatch):
+    """The bulk session settings are run on connecting only if bulk_session is TRUE."""
+    connects = []
+
+    def connect(**kwargs):
+        connects.append(kwargs)
+        return FakeConnection()
+
+    monkeypatch.setattr(pymysql, 'connect', connect)
+
+    for tags, bulk_session, init_command in (("", False, None),
+                                             ("<bulk_session>FALSE</bulk_session>", False, None),
+                                             ("<bulk_session>true</bulk_session>", True,
+                                              CN.BULK_SESSION)):
+        xml_loadfile = read_flags(tmp_path, tags)
+        assert xml_loadfile.flags['bulk_session'] is bulk_session
+        monkeypatch.setattr(RunSql, 'bulk_session', xml_loadfile.flags['bulk_session'])
+        RunSql().sql_on(xml_loadfile.connection)
+        assert connects[-1]['init_command'] == init_command
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""Test writing the CSV files that are loaded with LOAD DATA."""
+
+# pylint:disable=import-error
+# imported modules exist
+
+import io
+import numpy as np
+import pandas as pd
+
+import constants as CN
+from format_csv_data import FormatCsvData
+
+
+def pandas_csv(raw_data):
+    """Lines written by pandas to_csv, as the files were written before."""
+    return raw_data.to_csv(None, na_rep=CN.MV_NOTAV, index=False, header=False,
+                           sep=CN.SEP, date_format='%Y-%m-%d %H:%M:%S').encode()
+
+
+def written_csv(raw_data):
+    """Lines written by FormatCsvData."""
+    csv_file = io.BytesIO()
+    FormatCsvData.write_csv(raw_data, list(raw_data.columns), csv_file)
+    return csv_file.getvalue()
+
+
+def test_write_csv():
+    """Numbers, strings, missing values and dates are written as pandas writes them."""
+    raw_data = pd.DataFrame({'stat_header_id': [1, 2, 3],
+                             'fcst_valid_beg': pd.to_datetime(['2012-04-09 12:00:00', None,
+                                                               '2012-04-10 06:30:00']),
+                             'total': [10.0, np.nan, 0.125],
+                             'fcst_var': ['TMP', None, 'Δ850'],
+                             'alpha': [np.nan, 0.05, 1e-20],
+                             'cov_thresh': [4, 4.0, 'NA']})
+    assert written_csv(raw_data) == pandas_csv(raw_data)
+
+
+def test_write_csv_quoted():
+    """Values that pandas quotes are written by pandas."""
+    raw_data = pd.DataFrame({'stat_header_id': [1, 2], 'fcst_var': ['A' + CN.SEP + 'B', 'C']})
+    assert written_csv(raw_data) == pandas_csv(raw_data)
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""Test getting header keys ready for the header lookup."""
+
+# pylint:disable=import-error
+# imported modules exist
+
+import numpy as np
+import pandas as pd
+import pymysql
+
+import constants as CN
+from lookup_header_sql import LookupHeaderSql
+from run_sql import RunSql
+
+
+def test_key_values():
+    """Dates become strings, and nulls become None."""
+    key_data = pd.DataFrame({CN.MODEL: ['WRF', 'GFS'], CN.N_VALID: [CN.MV_NULL, 100],
+                             CN.FCST_RAD: [2.0, np.nan],
+                             CN.FCST_VALID: pd.to_datetime(['2010-05-17 12:00:00', None]),
+                             CN.OBS_VALID: [pd.Timestamp('2010-05-17'), CN.MV_NULL]})
+
+    key_values = LookupHeaderSql.get_key_values(key_data)
+
+    assert key_values.values.tolist() == [['WRF', None, 2.0, '2010-05-17 12:00:00',
+                                           '2010-05-17 00:00:00'],
+                                          ['GFS', 100, None, None, None]]
+
+
+def test_new_header_ids(monkeypatch):
+    """Without a database check, new headers get ids counted on through the run."""
+    monkeypatch.setattr(RunSql, 'use_id_sequence', False)
+    monkeypatch.setattr(RunSql, 'next_ids', {CN.MODE_HEADER + '.' + CN.MODE_HEADER_ID: 7})
+    headers = pd.DataFrame({CN.MODEL: ['WRF', 'GFS']})
+    next_header_id = LookupHeaderSql.set_header_ids(headers, CN.MODE_HEADER, CN.MODE_HEADER_ID,
+                                                    [CN.MODEL], False, None)
+    assert next_header_id == 7
+    assert headers[CN.MODE_HEADER_ID].tolist() == [7, 8]
+    # the next load of the run counts on from the last id
+    assert RunSql.reserve_ids(CN.MODE_HEADER, CN.MODE_HEADER_ID, 3, None) == 9
+
+
+def test_cached_header_ids(monkeypatch):
+    """Headers seen earlier in the run get their ids without a database lookup."""
+    monkeypatch.setattr(LookupHeaderSql, 'header_cache',
+                        {CN.MODE_HEADER: {LookupHeaderSql.hash_values(['WRF', None]): 3,
+                                          LookupHeaderSql.hash_values(['GFS', 100]): 5}})
+    monkeypatch.setattr(LookupHeaderSql, 'pending_headers', {})
+    headers = pd.DataFrame({CN.MODEL: ['GFS', 'WRF'], CN.N_VALID: [100, CN.MV_NULL]})
+    monkeypatch.setattr(RunSql, 'use_id_sequence', False)
+    monkeypatch.setattr(RunSql, 'next_ids', {CN.MODE_HEADER + '.' + CN.MODE_HEADER_ID: 7})
+    LookupHeaderSql.set_header_ids(headers, CN.MODE_HEADER, CN.MODE_HEADER_ID,
+                                   [CN.MODEL, CN.N_VALID], True, None)
+    assert headers[CN.MODE_HEADER_ID].tolist() == [5, 3]
+
+
+def test_pending_header_ids(monkeypatch):
+    """New headers are cached only when their set is committed, and not if they were not written."""
+    monkeypatch.setattr(LookupHeaderSql, 'header_cache', {})
+    monkeypatch.setattr(LookupHeaderSql, 'pending_headers', {})
+    monkeypatch.setattr(LookupHeaderSql, 'get_header_ids',
+                        staticmethod(lambda key_values, *_:
+                                     np.where(key_values[CN.MODEL] == 'WRF', 4, CN.NO_KEY)))
+    monkeypatch.setattr(RunSql, 'use_id_sequence', False)
+    monkeypatch.setattr(RunSql, 'next_ids', {CN.MODE_HEADER + '.' + CN.MODE_HEADER_ID: 7})
+    wrf_key = LookupHeaderSql.hash_values(['WRF'])
+    gfs_key = LookupHeaderSql.hash_values(['GFS'])
+
+    headers = pd.DataFrame({CN.MODEL: ['WRF', 'GFS']})
+    LookupHeaderSql.set_header_ids(headers, CN.MODE_HEADER, CN.MODE_HEADER_ID,
+                                   [CN.MODEL], True, None)
+    assert LookupHeaderSql.header_cache[CN.MODE_HEADER] == {wrf_key: 4}
+
+    # a header write that failed leaves nothing for later sets
+    LookupHeaderSql.drop_new_headers(CN.MODE_HEADER)
+    LookupHeaderSql.keep_new_headers()
+    assert LookupHeaderSql.header_cache[CN.MODE_HEADER] == {wrf_key: 4}
+
+    LookupHeaderSql.set_header_ids(headers, CN.MODE_HEADER, CN.MODE_HEADER_ID,
+                                   [CN.MODEL], True, None)
+    LookupHeaderSql.keep_new_headers()
+    assert LookupHeaderSql.header_cache[CN.MODE_HEADER] == {wrf_key: 4, gfs_key: 8}
+    assert not LookupHeaderSql.pending_headers
+
+
+def test_hash_headers():
+    """Lines with the same keys get the same header, in order of first appearance."""
+    key_data = pd.DataFrame({CN.MODEL: ['WRF', 'GFS', 'WRF', 'GFS', 'NAM'],
+                             CN.FCST_LEAD: [0, 0, 0, 60000, 0]})
+    header_codes, first_rows = LookupHeaderSql.hash_headers(key_data)
+    assert header_codes.tolist() == [0, 1, 0, 2, 3]
+    assert first_rows.tolist() == [0, 1, 3, 4]
+
+    # lines are grouped by header, as with a merge of the headers and lines
+    line_data = pd.DataFrame({CN.LINENUMBER: [1, 2, 3, 4, 5]})
+    line_data = LookupHeaderSql.add_header_ids(line_data, np.array([10, 11, 12, 13]),
+                                               header_codes, CN.MODE_HEADER_ID)
+    assert line_data[CN.LINENUMBER].tolist() == [1, 3, 2, 4, 5]
+    assert line_data[CN.MODE_HEADER_ID].tolist() == [10, 10, 11, 12, 13]
+
+
+class NoTmpCursor:
+    """Cursor whose user may not create temporary tables, with two headers in the table."""
+
+    def __init__(self):
+        self.queries = []
+        self.args = None
+
+    def execute(self, query, args=None):
+        """Refuse temporary tables, and keep the SELECT queries."""
+        if query.startswith('CREATE TEMPORARY'):
+            raise pymysql.OperationalError(1044, 'Access denied')
+        if query.startswith('(SELECT'):
+            self.queries.append(query)
+            self.args = args
+
+    def executemany(self, query, args):
+        """Nothing to insert."""
+
+    def fetchall(self):
+        """Ids of the headers in the last query, by model."""
+        header_ids = {'WRF': 4, 'GFS': 9}
+        return [(row_num, header_ids.get(model))
+                for row_num, model in zip(self.args[::2], self.args[1::2])]
+
+
+def test_select_header_ids(monkeypatch):
+    """Without temporary tables, headers are looked up in chunks of SELECTs."""
+    monkeypatch.setattr(LookupHeaderSql, 'use_tmp_table', True)
+    monkeypatch.setattr(CN, 'HEADER_QUERY_SIZE', 2)
+    key_values = pd.DataFrame({CN.MODEL: ['GFS', 'NAM', 'WRF']})
+    sql_cur = NoTmpCursor()
+    header_ids = LookupHeaderSql.get_header_ids(key_values, CN.MODE_HEADER, CN.MODE_HEADER_ID,
+                                                [CN.MODEL], sql_cur)
+    assert header_ids.tolist() == [9, CN.NO_KEY, 4]
+    assert [query.count('SELECT') for query in sql_cur.queries] == [2, 1]
+    assert 'model <=> %s' in sql_cur.queries[0]
+    assert not LookupHeaderSql.use_tmp_table
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""Test making MTD 2D revision lines."""
+
+# pylint:disable=import-error
+# imported modules exist
+
+import pandas as pd
+
+import constants as CN
+from read_data_files import ReadDataFiles
+
+
+def test_revision_lines():
+    """Runs of 3 or more lines of an object make differences of earlier lines."""
+    mtd_file = pd.DataFrame({CN.OBJECT_ID: ['F001', 'F001', 'F001', 'F001', 'F002', 'F003',
+                                            'F003', 'F003'],
+                             CN.FCST_VAR: 'APCP', CN.OBS_VAR: 'APCP',
+                             CN.AXIS_ANG: 1.5, CN.REVISION_ID: CN.MV_NULL,
+                             CN.LINENUMBER: range(2, 10)})
+    for mtd_col in CN.MTD_2D_REV_DIFF_FIELDS:
+        mtd_file[mtd_col] = [1, 3, 6, 10, 15, 21, 28, 36]
+
+    mtd_file, rev_ctr = ReadDataFiles.add_mtd_revisions(mtd_file, 5)
+    rev_lines = mtd_file.iloc[8:]
+
+    assert rev_ctr == 7
+    assert rev_lines[CN.REVISION_ID].tolist() == [6, 6, 7]
+    assert rev_lines[CN.AREA].tolist() == [2, 3, 7]
+    assert rev_lines[CN.INTENSITY_90].tolist() == [2, 3, 7]
+    assert (rev_lines[CN.FCST_VAR] == 'REV_APCP').all()
+    assert (rev_lines[CN.LINENUMBER] == 0).all()
+    assert (rev_lines[CN.AXIS_ANG] == CN.MV_NOTAV).all()
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""Test the cache of data files that have been read."""
+
+# pylint:disable=import-error
+# imported modules exist
+
+import os
+
+import pandas as pd
+import pytest
+
+from read_file_cache import ReadFileCache
+
+pytest.importorskip("pyarrow")
+
+
+def test_cache_round_trip(tmp_path):
+    """A cached frame comes back the same, until the data file changes."""
+    data_file = tmp_path / "test.stat"
+    data_file.write_text("header\nline\n")
+    file_frame = pd.DataFrame({'line_type': ['CTC', 'CNT'], 'total': [61, 62],
+                               'fcst_valid_beg': pd.to_datetime(['2012-04-09', '2012-04-10'])})
+
+    file_cache = ReadFileCache(str(tmp_path / "cache"))
+    stat_info = os.stat(data_file)
+    assert file_cache.read_frame(str(data_file), stat_info) is None
+    file_cache.write_frame(str(data_file), stat_info, file_frame)
+    pd.testing.assert_frame_equal(file_cache.read_frame(str(data_file), stat_info), file_frame)
+
+    # a different read_spec, or a changed file, is not found in the cache
+    assert file_cache.read_frame(str(data_file), stat_info, (['CTC'], [])) is None
+    data_file.write_text("header\nline\nline\n")
+    assert file_cache.read_frame(str(data_file), os.stat(data_file)) is None
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""Test reserving blocks of ids, and the files used to load tables."""
+
+# pylint:disable=import-error
+# imported modules exist
+
+import os
+import pandas as pd
+import pymysql
+import pytest
+
+import constants as CN
+from format_csv_data import FormatCsvData
+from run_sql import RunSql
+
+
+class SequenceCursor:
+    """Cursor that keeps the id sequence table in a dict."""
+
+    def __init__(self):
+        self.next_ids = {}
+        self.last_id = None
+        self.executed = []
+
+    def execute(self, query, args=None):
+        """Run the id sequence statements."""
+        self.executed.append(query)
+        if query == CN.INS_ID_SEQUENCE:
+            self.next_ids.setdefault((args[0], args[1]), args[2])
+        elif query == CN.UPD_ID_SEQUENCE:
+            self.next_ids[(args[1], args[2])] += args[0]
+            self.last_id = self.next_ids[(args[1], args[2])]
+
+    def fetchone(self):
+        """Result of SELECT LAST_INSERT_ID()."""
+        return [self.last_id]
+
+
+def test_reserve_ids(monkeypatch):
+    """Blocks of ids follow each other, starting from the first id."""
+    monkeypatch.setattr(RunSql, 'use_id_sequence', None)
+    monkeypatch.setattr(RunSql, 'synced_ids', set())
+    monkeypatch.setattr(RunSql, 'next_ids', {})
+    sql_cur = SequenceCursor()
+    RunSql.create_id_sequence(sql_cur)
+    assert RunSql.reserve_ids(CN.DATA_FILE, CN.DATA_FILE_ID, 3, sql_cur, first_id=1) == 1
+    assert RunSql.reserve_ids(CN.DATA_FILE, CN.DATA_FILE_ID, 2, sql_cur, first_id=1) == 4
+    assert RunSql.reserve_ids(CN.STAT_HEADER, CN.STAT_HEADER_ID, 2, sql_cur) == 0
+    assert sql_cur.next_ids[(CN.DATA_FILE, CN.DATA_FILE_ID)] == 6
+    assert sql_cur.executed.count(CN.CR_ID_SEQUENCE) == 1
+
+
+class DeniedCursor(SequenceCursor):
+    """Cursor whose user may not create tables."""
+
+    def execute(self, query, args=None):
+        """Refuse to create the id sequence table."""
+        super().execute(query, args)
+        if query == CN.CR_ID_SEQUENCE:
+            raise pymysql.OperationalError(1142, 'CREATE command denied')
+
+
+def test_no_id_sequence(monkeypatch):
+    """Without the id sequence table, ids are counted from the max id, with no DDL."""
+    monkeypatch.setattr(RunSql, 'use_id_sequence', None)
+    monkeypatch.setattr(RunSql, 'next_ids', {})
+    monkeypatch.setattr(RunSql, 'get_next_id', staticmethod(lambda table, field, sql_cur: 10))
+    sql_cur = DeniedCursor()
+    RunSql.create_id_sequence(sql_cur)
+    assert RunSql.use_id_sequence is False
+    assert RunSql.reserve_ids(CN.STAT_HEADER, CN.STAT_HEADER_ID, 2, sql_cur) == 10
+    assert RunSql.reserve_ids(CN.STAT_HEADER, CN.STAT_HEADER_ID, 2, sql_cur) == 12
+    assert sql_cur.executed == [CN.CR_ID_SEQUENCE]
+
+
+class LoadCursor:
+    """Cursor that keeps the contents of the files it is asked to load."""
+
+    def __init__(self):
+        self.loaded = []
+        self.rollbacks = 0
+
+    def execute(self, query, args=None):
+        """Read the file named in a LOAD DATA statement."""
+        if query == CN.SAVEPOINT:
+            return
+        if query == CN.ROLLBACK_SAVEPOINT:
+            self.rollbacks += 1
+            return
+        tmpfile = query.split("'")[1]
+        with open(tmpfile) as csv_file:
+            self.loaded.append((os.path.basename(tmpfile), csv_file.read()))
+
+
+def test_unique_tmp_files(tmp_path):
+    """Each load of a table uses its own file, which is removed after loading."""
+    raw_data = pd.DataFrame({CN.MODEL: ['WRF', 'GFS']})
+    sql_cur = LoadCursor()
+    for _ in range(2):
+        RunSql.write_to_sql(raw_data, [CN.MODEL], CN.STAT_HEADER, CN.INS_HEADER,
+                            str(tmp_path), sql_cur, 'ON')
+    assert sql_cur.loaded[0][0] != sql_cur.loaded[1][0]
+    assert sql_cur.loaded[0][0].startswith('METdbLoad_' + CN.STAT_HEADER)
+    assert sql_cur.loaded[0][1] == 'WRF\nGFS\n'
+    assert not os.listdir(str(tmp_path))
+
+
+class FailCursor:
+    """Cursor whose loads fail before reading the file."""
+
+    def execute(self, query, args=None):
+        """Fail the load."""
+        if query != CN.SAVEPOINT:
+            raise RuntimeError(query)
+
+
+def test_load_stream(monkeypatch):
+    """Streamed loads read the data from a pipe, which is removed afterwards."""
+    raw_data = pd.DataFrame({CN.MODEL: ['WRF', 'GFS'] * 50000})
+    monkeypatch.setattr(RunSql, 'load_stream', True)
+    sql_cur = LoadCursor()
+    RunSql.write_to_sql(raw_data, [CN.MODEL], CN.STAT_HEADER, CN.INS_HEADER,
+                        None, sql_cur, 'ON')
+    assert sql_cur.loaded[0][1] == 'WRF\nGFS\n' * 50000
+
+    # a failed load does not leave the writer waiting on the pipe
+    RunSql.write_to_sql(raw_data, [CN.MODEL], CN.STAT_HEADER, CN.INS_HEADER,
+                        None, FailCursor(), 'ON')
+
+
+def test_stream_write_error(monkeypatch):
+    """A load whose pipe writer fails part way is rolled back, and raises an error."""
+    def write_csv(raw_data, col_list, csv_file):
+        csv_file.write(b'WRF\n')
+        raise OSError('disk error')
+
+    monkeypatch.setattr(FormatCsvData, 'write_csv', staticmethod(write_csv))
+    raw_data = pd.DataFrame({CN.MODEL: ['WRF', 'GFS']})
+    sql_cur = LoadCursor()
+    with pytest.raises(RuntimeError):
+        RunSql.stream_to_sql(raw_data, [CN.MODEL], CN.STAT_HEADER, sql_cur)
+    assert sql_cur.loaded[0][1] == 'WRF\n'
+    assert sql_cur.rollbacks == 1
+
+
+class InsertCursor:
+    """Cursor that keeps the rows it is asked to insert."""
+
+    def __init__(self):
+        self.inserted = []
+        self.executed = []
+
+    def execute(self, query, args=None):
+        """Keep the savepoint statements."""
+        self.executed.append(query)
+
+    def executemany(self, query, args):
+        """Keep each batch of rows."""
+        self.inserted.append(args)
+
+
+def test_insert_batches(monkeypatch):
+    """Without local_infile, rows are inserted insert_size at a time, with no NaN values."""
+    raw_data = pd.DataFrame({CN.MODEL: ['WRF', 'GFS', None, 'NAM', 'RAP'],
+                             CN.ALPHA: [0.05, float('nan'), 0.1, 0.2, 0.3]})
+    monkeypatch.setattr(RunSql, 'insert_size', 2)
+    sql_cur = InsertCursor()
+    RunSql.write_to_sql(raw_data, [CN.MODEL, CN.ALPHA], CN.STAT_HEADER, CN.INS_HEADER,
+                        None, sql_cur, 'OFF')
+    assert [len(rows) for rows in sql_cur.inserted] == [2, 2, 1]
+    assert sql_cur.inserted[1] == [[CN.MV_NOTAV, 0.1], ['NAM', 0.2]]
+
+
+class TimeoutCursor(InsertCursor):
+    """Cursor whose first insert times out waiting for a lock."""
+
+    def executemany(self, query, args):
+        """Time out once, then keep the rows."""
+        if not self.executed.count(CN.ROLLBACK_SAVEPOINT):
+            raise pymysql.OperationalError(1205, 'Lock wait timeout exceeded')
+        super().executemany(query, args)
+
+
+def test_retry_write(monkeypatch):
+    """A write that times out is rolled back to its savepoint and written again."""
+    monkeypatch.setattr(CN, 'RETRY_WAIT', 0)
+    raw_data = pd.DataFrame({CN.MODEL: ['WRF', 'GFS']})
+    sql_cur = TimeoutCursor()
+    RunSql.write_to_sql(raw_data, [CN.MODEL], CN.STAT_HEADER, CN.INS_HEADER,
+                        None, sql_cur, 'OFF')
+    assert sql_cur.executed == [CN.SAVEPOINT, CN.ROLLBACK_SAVEPOINT, CN.SAVEPOINT]
+    assert sql_cur.inserted == [[['WRF'], ['GFS']]]
+
+
+def test_index_alters():
+    """Only missing indexes are added, and only existing indexes are dropped."""
+    index_columns = {CN.STAT_HEADER: [CN.MODEL, CN.FCST_VAR], 'line_data_rps': [CN.FCST_LEAD]}
+    db_tables = [CN.STAT_HEADER]
+    db_indexes = ['PRIMARY', 'stat_header_model_idx']
+    assert RunSql.index_alters(False, index_columns, db_tables, db_indexes) == \
+        {CN.STAT_HEADER: 'ALTER TABLE stat_header ADD INDEX stat_header_fcst_var_idx (fcst_var)'}
+    assert RunSql.index_alters(True, index_columns, db_tables, db_indexes) == \
+        {CN.STAT_HEADER: 'ALTER TABLE stat_header DROP INDEX stat_header_model_idx'}
+    db_indexes.append('stat_header_fcst_var_idx')
+    assert RunSql.index_alters(False, index_columns, db_tables, db_indexes) == {}
+
+
+class RowsCursor:
+    """Cursor that returns the rows of each table."""
+
+    def execute(self, query, args=None):
+        """Nothing to run."""
+
+    def fetchall(self):
+        """Result of the table rows query."""
+        return [('STAT_HEADER', 1000), ('line_data_cnt', 1000000), ('line_data_ctc', None)]
+
+
+def test_auto_drop_tables():
+    """Indexes are dropped for tables that get many lines for their size."""
+    table_lines = {CN.STAT_HEADER: 500, 'line_data_cnt': 1000, 'line_data_ctc': 10,
+                   'line_data_rps': 10}
+    assert RunSql.auto_drop_tables(table_lines, RowsCursor()) == \
+        [CN.STAT_HEADER, 'line_data_ctc', 'line_data_rps']
+
+
+class LockCursor:
+    """Cursor whose named lock is free or held by another load."""
+
+    def __init__(self, lock_free):
+        self.lock_free = lock_free
+        self.commits = 0
+        self.executed = []
+        self.connection = self
+
+    def execute(self, query, args=None):
+        """Keep the statements."""
+        self.executed.append(query)
+
+    def fetchone(self):
+        """Result of GET_LOCK."""
+        return [int(self.lock_free)]
+
+    def commit(self):
+        """Count the commits."""
+        self.commits += 1
+
+
+def test_set_locks(monkeypatch):
+    """Header locks are held without committing, until the set is committed."""
+    monkeypatch.setattr(RunSql, 'held_locks', [])
+    sql_cur = LockCursor(True)
+    RunSql.get_lock(CN.STAT_HEADER, sql_cur)
+    RunSql.get_lock(CN.STAT_HEADER, sql_cur)
+    RunSql.get_lock(CN.MODE_HEADER, sql_cur)
+    assert sql_cur.executed.count(CN.Q_GET_LOCK) == 2
+    assert sql_cur.commits == 0
+
+    sql_run = RunSql()
+    sql_run.conn = sql_cur
+    sql_run.cur = sql_cur
+    sql_run.commit_set()
+    assert sql_cur.commits == 1
+    assert sql_cur.executed.count(CN.Q_RELEASE_LOCK) == 2
+    assert not RunSql.held_locks
+
+
+def test_lock_timeout(monkeypatch):
+    """A load stops if it times out waiting for a lock, without committing."""
+    monkeypatch.setattr(RunSql, 'held_locks', [])
+    sql_cur = LockCursor(False)
+    with pytest.raises(SystemExit):
+        RunSql.get_lock(CN.STAT_HEADER, sql_cur)
+    assert sql_cur.commits == 0
+    assert not RunSql.held_locks
+
+
+class ClosedConnection:
+    """Connection the server closed while files were read."""
+
+    def __init__(self):
+        self.pings = 0
+
+    def commit(self):
+        """The connection is gone."""
+        raise pymysql.OperationalError(2013, 'Lost connection to MySQL server')
+
+    def ping(self, reconnect=False):
+        """Connect again."""
+        assert reconnect
+        self.pings += 1
+
+
+def test_check_connection():
+    """Checking the connection reconnects, without committing on the closed connection."""
+    sql_run = RunSql()
+    sql_run.conn = ClosedConnection()
+    sql_run.cur = LockCursor(True)
+    sql_run.check_connection()
+    assert sql_run.conn.pings == 1
+    assert sql_run.cur.executed == [CN.READ_COMMITTED]
+    with pytest.raises(SystemExit):
+        sql_run.commit_set()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""Test the memory mapped reader against the pandas reader."""
+
+# pylint:disable=import-error
+# imported modules exist
+
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import constants as CN
+from read_data_files import ReadDataFiles
+from scan_data_files import ScanDataFiles
+
+STAT_LINES = [
+    "VERSION MODEL DESC FCST_LEAD FCST_VALID_BEG FCST_VALID_END OBS_LEAD OBS_VALID_BEG "
+    "OBS_VALID_END FCST_VAR FCST_UNITS FCST_LEV OBS_VAR OBS_UNITS OBS_LEV OBTYPE VX_MASK "
+    "INTERP_MTHD INTERP_PNTS FCST_THRESH OBS_THRESH COV_THRESH ALPHA LINE_TYPE",
+    "V9.1 GFS NA 120000 20120409_120000 20120409_120000 000000 20120409_113000 "
+    "20120409_123000 TMP K P850 TMP K P850 ADPUPA FULL NEAREST 1 >273.0 >273.0 NA NA "
+    "CTC 61 17 9 4 31",
+    "V9.1 GFS NA 120000 20120409_120000 20120409_120000 000000 20120409_113000 "
+    "20120409_123000 TMP K P850 TMP K P850 ADPUPA NH NEAREST 1 NA NA NA NA "
+    "SL1L2 61 0.25 -1.5e-02 273.1 NA 12.5 13",
+    "V9.1 GFS NA 120000 20120409_120000 20120409_120000 000000 20120409_113000 "
+    "20120409_123000 RH % P500 RH % P500 ADPUPA SH NEAREST 1 NA NA NA 0.05 "
+    "CNT 61 NA 1.2 1.3 NA",
+]
+
+
+def read_both(tmp_path, lines):
+    """Read the same file with both engines."""
+    stat_file = tmp_path / "test.stat"
+    stat_file.write_text("\n".join(lines) + "\n")
+    hdr_names = CN.LONG_HEADER + CN.COL_NUMS
+
+    file_data = ReadDataFiles()
+    file_data.read_engine = CN.PANDAS_ENGINE
+    pandas_data = file_data.read_stat(str(stat_file), hdr_names)
+    file_data.read_engine = CN.MMAP_ENGINE
+    mmap_data = file_data.read_stat(str(stat_file), hdr_names)
+    return pandas_data, mmap_data
+
+
+def test_engines_match(tmp_path):
+    """Both engines give the same values and types."""
+    pandas_data, mmap_data = read_both(tmp_path, STAT_LINES)
+    assert mmap_data.shape[0] == 3
+    pd.testing.assert_frame_equal(pandas_data, mmap_data)
+
+
+def test_quoted_fallback(tmp_path):
+    """Quoted fields go to the pandas reader."""
+    lines = STAT_LINES[:2] + [STAT_LINES[2].replace(" NH ", ' "N H" ')]
+    pandas_data, mmap_data = read_both(tmp_path, lines)
+    pd.testing.assert_frame_equal(pandas_data, mmap_data)
+
+
+def test_vsdb_split(tmp_path):
+    """VSDB lines split on = and before negative numbers, with typed columns."""
+    vsdb_file = tmp_path / "test.vsdb"
+    vsdb_file.write_text("V01 GFS 24 2012040912 ADPUPA G2/NHX FHO>-5 T P850 = 100 0.5-0.3-0.4\n"
+                         "V01 GFS 48 2012040912 ADPUPA G2/NHX FHO>273 T P850=100 0.5 0.3 0.4\n")
+    file_data = ReadDataFiles()
+    file_data.read_engine = CN.MMAP_ENGINE
+    vsdb_data = file_data.read_vsdb(str(vsdb_file))
+    assert vsdb_data.columns.tolist() == CN.VSDB_HEADER + CN.COL_NUMS[:4]
+    assert vsdb_data.line_type.tolist() == ["FHO>-5", "FHO>273"]
+    assert vsdb_data.fcst_lead.tolist() == [24, 48]
+    assert vsdb_data.fcst_valid_beg[0] == pd.Timestamp("2012-04-09 12:00:00")
+    assert vsdb_data['2'].tolist() == [-0.3, 0.3]
+    assert vsdb_data['3'].tolist() == [-0.4, 0.4]
+
+
+def test_vsdb_quoted_types(tmp_path):
+    """VSDB files read by the scanner and as strings have the same column types."""
+    vsdb_lines = ["V01 GFS 24 2012040912 ADPUPA G2/NHX FHO>273 T P850 = 100 0.5 0.3 0.4",
+                  "V01 GFS 48 2012040912 ADPUPA G2/NHX FHO>273 T P850 = 100 0.5-0.3 0.4"]
+    plain_file = tmp_path / "plain.vsdb"
+    plain_file.write_text("\n".join(vsdb_lines) + "\n")
+    quoted_file = tmp_path / "quoted.vsdb"
+    quoted_file.write_text("\n".join(vsdb_lines).replace("P850", '"P850"') + "\n")
+
+    file_data = ReadDataFiles()
+    for engine in (CN.PANDAS_ENGINE, CN.MMAP_ENGINE):
+        file_data.read_engine = engine
+        plain_data = file_data.read_vsdb(str(plain_file))
+        quoted_data = file_data.read_vsdb(str(quoted_file))
+        assert plain_data.dtypes.tolist() == quoted_data.dtypes.tolist()
+        assert plain_data[CN.FCST_LEAD].tolist() == quoted_data[CN.FCST_LEAD].tolist()
+        assert plain_data['2'].tolist() == quoted_data['2'].tolist()
+    assert plain_data[CN.FCST_LEAD].tolist() == [24, 48]
+    assert plain_data[CN.FCST_VALID_BEG][0] == pd.Timestamp("2012-04-09 12:00:00")
+    assert plain_data['2'].tolist() == [0.3, -0.3]
+
+
+def test_line_type_filter(tmp_path):
+    """Filtered lines are never read, and kept lines keep their line numbers."""
+    stat_file = tmp_path / "test.stat"
+    stat_file.write_text("\n".join(STAT_LINES) + "\n")
+    hdr_names = CN.LONG_HEADER + CN.COL_NUMS
+
+    file_data = ReadDataFiles()
+    file_data.stat_line_types = (["SL1L2", "CNT"], [])
+    for engine in (CN.PANDAS_ENGINE, CN.MMAP_ENGINE):
+        file_data.read_engine = engine
+        stat_data = file_data.read_stat(str(stat_file), hdr_names)
+        assert stat_data.line_type.tolist() == ["SL1L2", "CNT"]
+        assert stat_data.index.tolist() == [1, 2]
+    assert ReadDataFiles.get_stat_line_types({'line_type_load': False, 'load_mpr': True,
+                                              'load_orank': True}, []) is None
+
+
+def test_skipped_middle_file(tmp_path):
+    """A file with none of the line types to load is dropped, and the files after it kept."""
+    load_files = []
+    for file_name, data_lines in (("a.stat", STAT_LINES[1:2] * 2), ("b.stat", STAT_LINES[2:]),
+                                  ("c.stat", STAT_LINES[1:2] * 2)):
+        stat_file = tmp_path / file_name
+        stat_file.write_text("\n".join(STAT_LINES[:1] + data_lines) + "\n")
+        load_files.append(str(stat_file))
+    load_flags = {'line_type_load': True, 'load_mpr': False, 'load_orank': False,
+                  'read_engine': CN.PANDAS_ENGINE, 'cache_dir': None}
+
+    file_data = ReadDataFiles()
+    file_data.read_data(load_flags, load_files, ["CTC"])
+
+    assert file_data.data_files[CN.FILENAME].tolist() == ["a.stat", "c.stat"]
+    assert file_data.stat_data[CN.FILE_ROW].unique().tolist() == \
+        file_data.data_files[CN.FILE_ROW].tolist()
+
+
+def test_cache_per_engine(tmp_path):
+    """Files cached by one read engine are not used by the other."""
+    pytest.importorskip("pyarrow")
+    stat_file = tmp_path / "test.stat"
+    stat_file.write_text("\n".join(STAT_LINES) + "\n")
+    load_flags = {'line_type_load': False, 'load_mpr': False, 'load_orank': False,
+                  'cache_dir': str(tmp_path / "cache")}
+
+    cache_hits = []
+    for engine in (CN.MMAP_ENGINE, CN.PANDAS_ENGINE, CN.PANDAS_ENGINE):
+        load_flags['read_engine'] = engine
+        file_data = ReadDataFiles()
+        file_data.read_data(load_flags, [str(stat_file)], [])
+        cache_hits.append(file_data.file_cache.hits)
+    assert cache_hits == [0, 0, 1]
+
+
+@pytest.mark.parametrize("values", [
+    ["nan", "1.5"], ["NaN", "nan"], ["TRUE", "false"], ["True", "False"], ["true", ""],
+    ["99999999999999999999", "1"], ["18446744073709551615", "1"],
+    ["-9999999999999999999", "1"], ["1_000", "2"], ["1e400", "1"], ["inf", "-Infinity"],
+    ["+5", "-3"], ["1", ""], ["NA", "1"]])
+def test_column_types(values):
+    """Columns get the same types and values pandas gives without NA conversion."""
+    text = "a b\n" + "".join("x {}\n".format(value) for value in values)
+    scan_data = ScanDataFiles.scan_buffer(np.frombuffer(text.encode(), dtype=np.uint8),
+                                          ['a', 'b'], [])
+    pandas_data = pd.read_csv(io.StringIO(text), delim_whitespace=True, names=['a', 'b'],
+                              skiprows=1, keep_default_na=False, na_values='')
+    pd.testing.assert_frame_equal(scan_data, pandas_data)
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""Test the transforms of stat header fields."""
+
+# pylint:disable=import-error
+# imported modules exist
+
+import pandas as pd
+
+import constants as CN
+from read_data_files import ReadDataFiles
+
+
+def test_normalize_stat():
+    """Percentiles come out of thresholds, and alpha and NA values are fixed."""
+    all_stat = pd.DataFrame({CN.FCST_THRESH: ['>=5(90)', 'NA', '>273.0'],
+                             CN.OBS_THRESH: ['NA', '<=2(10.5)', '>273.0'],
+                             CN.FCST_PERC: CN.MV_NOTAV, CN.OBS_PERC: CN.MV_NOTAV,
+                             CN.ALPHA: ['0.050', 'NA', 'NA'],
+                             CN.LINE_TYPE: ['CTS', 'CTC', 'SL1L2'],
+                             CN.COV_THRESH: ['NA', '>0', 'NA'],
+                             CN.FCST_LEAD: [120000, 'NA', 60000],
+                             CN.OBS_LEAD: [0, 0, 0],
+                             CN.INTERP_PNTS: ['1', 'NA', '9']})
+
+    ReadDataFiles.normalize_stat(all_stat)
+
+    assert all_stat.fcst_thresh.tolist() == ['>=5', 'NA', '>273.0']
+    assert all_stat.obs_thresh.tolist() == ['NA', '<=2', '>273.0']
+    assert all_stat.fcst_perc.tolist() == [90.0, CN.MV_NOTAV, CN.MV_NOTAV]
+    assert all_stat.obs_perc.tolist() == [CN.MV_NOTAV, 10.5, CN.MV_NOTAV]
+    assert all_stat.alpha.tolist() == ['0.05', '-9999', '-9999']
+    assert all_stat.cov_thresh.tolist() == [CN.MV_NOTAV, '>0', CN.MV_NOTAV]
+    assert all_stat.fcst_lead.tolist() == [120000, 0, 60000]
+    assert all_stat.interp_pnts.tolist() == [1, 0, 9]
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""Test expanding the repeating variables of variable length lines."""
+
+# pylint:disable=import-error
+# imported modules exist
+
+import pandas as pd
+
+import constants as CN
+from write_stat_sql import WriteStatSql
+
+
+def test_mctc_var_data():
+    """MCTC lines have n by n counts, with j counting faster than i."""
+    line_data = pd.DataFrame([['V9.1', 9, 2, 5, 6, 7, 8, 0.5, 10],
+                              ['V9.1', 9, 1, 4, 0.5, CN.MV_NOTAV, CN.MV_NOTAV, CN.MV_NOTAV, 11]],
+                             columns=[CN.VERSION, '0', '1', '2', '3', '4', '5', '6',
+                                      CN.LINE_DATA_ID])
+    var_data = WriteStatSql.get_var_data(CN.MCTC, line_data)
+    assert var_data.values.tolist() == [[10, 1, 1, 5], [10, 1, 2, 6], [10, 2, 1, 7],
+                                        [10, 2, 2, 8], [11, 1, 1, 4]]
+
+
+def test_pjc_var_data():
+    """PJC lines are one group short, and lines with no groups add no rows."""
+    line_data = pd.DataFrame([['V9.1', 9, 2] + list(range(7)) + [3],
+                              ['V9.1', 9, 1] + [CN.MV_NOTAV] * 7 + [4]],
+                             columns=[CN.VERSION, '0', '1'] + [str(col) for col in range(2, 9)] +
+                             [CN.LINE_DATA_ID])
+    var_data = WriteStatSql.get_var_data(CN.PJC, line_data)
+    assert var_data.values.tolist() == [[3, 1] + list(range(7))]
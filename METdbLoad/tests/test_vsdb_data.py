@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""Test the conversions that make VSDB lines look like stat lines."""
+
+# pylint:disable=import-error
+# imported modules exist
+
+import numpy as np
+import pandas as pd
+
+import constants as CN
+from read_data_files import ReadDataFiles
+
+
+def test_pct_mixed_n_var():
+    """PCT rows with different n_var get thresh, oy, on sets and a total."""
+    vsdb_data = pd.DataFrame(0.0, index=range(2), columns=CN.COL_NUMS[0:-2])
+    vsdb_data.iloc[0, 0:4] = [1, 2, 5, 6]
+    vsdb_data.iloc[1, 0:6] = [1, 2, 3, 4, 5, 6]
+    vsdb_data[CN.TOTAL_LC] = 0.0
+    vsdb_data[CN.N_VAR] = [2, 3]
+
+    ReadDataFiles.convert_vsdb_pct(vsdb_data)
+
+    assert vsdb_data[CN.TOTAL_LC].tolist() == [11, 15]
+    np.testing.assert_allclose(vsdb_data.iloc[0, 0:6], [0, 1, 4, 1, 2, 4])
+    np.testing.assert_allclose(vsdb_data.iloc[1, 0:9], [0, 1, 3, 0.5, 2, 3, 1, 3, 3])
+
+
+def test_ranks_mixed_n_var():
+    """RHIST rows keep their own n_var values, times 100, and the rest are blank."""
+    vsdb_data = pd.DataFrame({'0': [1, 1], '1': [2, 2], '2': [3, np.nan], CN.N_VAR: [3, 2]})
+
+    n_max = ReadDataFiles.convert_vsdb_ranks(vsdb_data, 100)
+
+    assert n_max == 3
+    assert vsdb_data.iloc[0, 0:3].tolist() == [100, 200, 300]
+    assert vsdb_data.iloc[1, 0:3].tolist() == [100, 200, CN.MV_NOTAV]
+
+
+def test_eclv_mixed_n_var():
+    """ECON values are paired with the x points, for each row's n_var."""
+    vsdb_data = pd.DataFrame({'0': [0.5, 0.6], '1': [0.7, np.nan], CN.N_VAR: [2, 1]})
+
+    n_max = ReadDataFiles.convert_vsdb_eclv(vsdb_data)
+
+    assert n_max == 2
+    assert vsdb_data[CN.COL_NUMS[0:4]].iloc[0].tolist() == \
+        [CN.X_POINTS_ECON[0], 0.5, CN.X_POINTS_ECON[1], 0.7]
+    assert vsdb_data[CN.COL_NUMS[0:4]].iloc[1].tolist() == \
+        [CN.X_POINTS_ECON[0], 0.6, float(CN.MV_NOTAV), float(CN.MV_NOTAV)]
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""Test looking up data files already in the database."""
+
+# pylint:disable=import-error
+# imported modules exist
+
+import pandas as pd
+
+import constants as CN
+from write_file_sql import WriteFileSql
+
+
+class FileCursor:
+    """Cursor with a data_file table whose collation ignores case."""
+
+    def __init__(self):
+        self.data_files = {('/data/GFS', 'a.stat'): 3, ('/data/gfs', 'B.STAT'): 5}
+        self.queries = 0
+        self.args = None
+
+    def execute(self, query, args=None):
+        """Keep the arguments of the lookup."""
+        self.queries += 1
+        self.args = args
+
+    def fetchall(self):
+        """Ids of the files in the last query, compared without case, as MySQL does."""
+        data_files = {(path.lower(), filename.lower()): data_file_id
+                      for (path, filename), data_file_id in self.data_files.items()}
+        return [(row_num, data_files.get((path.lower(), filename.lower())))
+                for row_num, path, filename in zip(*[iter(self.args)] * 3)]
+
+
+def test_file_ids(monkeypatch):
+    """Files match the rows the database finds for them, even when the case differs."""
+    monkeypatch.setattr(CN, 'FILE_QUERY_SIZE', 2)
+    data_files = pd.DataFrame({CN.FILEPATH: ['/data/gfs', '/data/nam', '/data/GFS'],
+                               CN.FILENAME: ['A.stat', 'a.stat', 'b.stat']},
+                              index=[4, 5, 6])
+    sql_cur = FileCursor()
+    file_ids = WriteFileSql.get_file_ids(data_files, sql_cur)
+    assert file_ids.tolist() == [3, CN.NO_KEY, 5]
+    assert file_ids.index.tolist() == [4, 5, 6]
+    assert sql_cur.queries == 2
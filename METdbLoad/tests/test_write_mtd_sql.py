@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""Test writing MTD headers and objects."""
+
+# pylint:disable=import-error
+# imported modules exist
+
+import pandas as pd
+
+import constants as CN
+from run_sql import RunSql
+from write_mtd_sql import WriteMtdSql
+
+
+def test_revision_headers(monkeypatch):
+    """Revision headers get revision ids from a reserved block, and all lines are written."""
+    written = {}
+
+    def write_to_sql(raw_data, col_list, sql_table, *_):
+        written[sql_table] = raw_data[col_list].copy()
+
+    monkeypatch.setattr(RunSql, 'write_to_sql', staticmethod(write_to_sql))
+    monkeypatch.setattr(RunSql, 'use_id_sequence', False)
+    monkeypatch.setattr(RunSql, 'next_ids',
+                        {CN.MTD_HEADER + '.' + CN.MTD_HEADER_ID: 10,
+                         CN.MTD_HEADER + '.' + CN.REVISION_ID: 5})
+
+    m_2d_data = pd.DataFrame({CN.REVISION_ID: [CN.MV_NULL, CN.MV_NULL, 0, 1],
+                              CN.FCST_VAR: ['APCP', 'APCP', 'REV_APCP', 'REV_APCP'],
+                              CN.OBJECT_ID: ['F001', 'F002', 'F001', 'F001'],
+                              CN.OBJECT_CAT: ['CF001', 'CF002', 'CF001', 'CF001'],
+                              CN.LINENUMBER: [2, 3, 0, 0]})
+    for mtd_col in CN.MTD_HEADER_FIELDS[1:] + CN.MTD_2D_OBJ_FIELDS:
+        if mtd_col not in m_2d_data:
+            m_2d_data[mtd_col] = 1
+
+    WriteMtdSql.write_mtd_data({'mtd_header_db_check': False}, m_2d_data, pd.DataFrame(),
+                               pd.DataFrame(), None, None, 'ON')
+
+    assert written[CN.MTD_HEADER][CN.REVISION_ID].tolist() == [CN.MV_NULL, 5, 6]
+    assert written[CN.MTD_HEADER][CN.MTD_HEADER_ID].tolist() == [10, 11, 12]
+    assert written[CN.MTD_2D_T][CN.MTD_HEADER_ID].tolist() == [10, 10, 11, 12]
+    assert RunSql.next_ids[CN.MTD_HEADER + '.' + CN.REVISION_ID] == 7
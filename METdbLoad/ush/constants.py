@@ -28,6 +28,15 @@ CB = "cb"
 # default port for MySQL
 SQL_PORT = 3306
 
+# Readers for whitespace delimited files - pandas read_csv, or memory mapped NumPy scanner
+PANDAS_ENGINE = "pandas"
+MMAP_ENGINE = "mmap"
+READ_ENGINES = [PANDAS_ENGINE, MMAP_ENGINE]
+
+# Files that were read are cached as parquet. Change the version when read_data output changes
+CACHE_SUFFIX = ".parquet"
+CACHE_VERSION = "1"
+
 # Lower Case true and false
 LC_TRUE = "true"
 LC_FALSE = "false"
@@ -59,6 +68,9 @@ L_PAREN = '('
 # Right paren for searching
 R_PAREN = ')'
 
+# Percentile thresh like >=5(90) - thresh before the left paren, percentile inside the parens
+THRESH_PERC = r'^([^(]*)\(([^()]*)'
+
 # Triple zero for tests for MODE files
 T_ZERO = '000'
 
@@ -244,14 +256,83 @@ TCST_HEADER_KEYS = [VERSION, AMODEL, BMODEL, DESCR, STORM_ID, BASIN, CYCLONE,
 VSDB_HEADER = [VERSION, MODEL, FCST_LEAD, FCST_VALID_BEG, OBTYPE,
                VX_MASK, LINE_TYPE, FCST_VAR, FCST_LEV]
 
-Q_FILE = "SELECT data_file_id FROM data_file WHERE " + \
-         "path=%s AND filename=%s"
-
-Q_HEADER = "SELECT stat_header_id FROM stat_header WHERE " + \
-           "=%s AND ".join(STAT_HEADER_KEYS[1:]) + "=%s"
-
-Q_HEADER_TCST = "SELECT tcst_header_id FROM tcst_header WHERE " + \
-                "=%s AND ".join(TCST_HEADER_KEYS[1:]) + "=%s"
+# id of an existing data file, with its row number in the batch. One for each file of a
+# chunk is sent, joined by UNION ALL
+Q_FILE_ID = "(SELECT %s, MIN(data_file_id) FROM data_file WHERE path=%s AND filename=%s)"
+
+# number of files to look up with each query
+FILE_QUERY_SIZE = 1000
+
+# Find existing headers for a batch in one query. The headers go into a temporary table
+# with the column types of the header table, and are joined with NULL safe comparisons
+CR_TMP_HEADER = "CREATE TEMPORARY TABLE {0} AS SELECT CAST(0 AS UNSIGNED) AS row_num, {1} " + \
+                "FROM (SELECT 1) AS one LEFT JOIN {2} ON FALSE LIMIT 0"
+INS_TMP_HEADER = "INSERT INTO {0} (row_num, {1}) VALUES ({2})"
+Q_TMP_HEADER = "SELECT {0}.row_num, MIN({1}.{2}) FROM {0} JOIN {1} ON {3} GROUP BY {0}.row_num"
+DROP_TMP_HEADER = "DROP TEMPORARY TABLE IF EXISTS {0}"
+TMP_PREFIX = "tmp_"
+# without the CREATE TEMPORARY TABLES privilege, look up each header with its own SELECT,
+# HEADER_QUERY_SIZE of them in each UNION ALL query
+Q_HEADER_ID = "(SELECT %s, MIN({1}) FROM {0} WHERE {2})"
+HEADER_QUERY_SIZE = 100
+
+# Check that a saved header cache still matches a header table
+Q_HEADER_STATS = "SELECT MAX({1}), COUNT(*) FROM {0}"
+Q_HEADER_ROW = "SELECT * FROM {0} WHERE {1}=%s"
+HEADER_CACHE_VERSION = 1
+
+# Headers are found by a 64 bit hash of their keys. A second hash checks for collisions
+HASH_CHECK_KEY = "METdbLoadHeaders"
+
+# Blocks of ids are reserved in a sequence table, so loads running at the same time do not
+# use the same ids. MyISAM does not hold the row lock until the load commits, so loads do not
+# wait for each other. Reservations are not rolled back, and a set that is not loaded leaves a
+# gap in the ids. Created when connecting, as CREATE TABLE commits.
+ID_SEQUENCE = 'id_sequence'
+CR_ID_SEQUENCE = "CREATE TABLE IF NOT EXISTS id_sequence (table_name VARCHAR(64) NOT NULL, " + \
+                 "field_name VARCHAR(64) NOT NULL, next_id BIGINT UNSIGNED NOT NULL, " + \
+                 "PRIMARY KEY (table_name, field_name)) ENGINE=MyISAM"
+INS_ID_SEQUENCE = "INSERT IGNORE INTO id_sequence (table_name, field_name, next_id) " + \
+                  "VALUES (%s, %s, %s)"
+# the first time a table is used in a run, move the sequence past ids loaded without it
+SYNC_ID_SEQUENCE = "UPDATE id_sequence SET next_id = GREATEST(next_id, " + \
+                   "(SELECT COALESCE(MAX({1}) + 1, 0) FROM {0})) " + \
+                   "WHERE table_name=%s AND field_name=%s"
+UPD_ID_SEQUENCE = "UPDATE id_sequence SET next_id = LAST_INSERT_ID(next_id + %s) " + \
+                  "WHERE table_name=%s AND field_name=%s"
+Q_LAST_ID = "SELECT LAST_INSERT_ID()"
+
+# Named locks for writing headers, shared by all loads into a database
+Q_GET_LOCK = "SELECT GET_LOCK(CONCAT('METdbLoad.', DATABASE(), '.', %s), %s)"
+Q_RELEASE_LOCK = "SELECT RELEASE_LOCK(CONCAT('METdbLoad.', DATABASE(), '.', %s))"
+# seconds to wait for another load to commit the set it is writing headers for
+LOCK_TIMEOUT = 600
+# header lookups read the headers other loads have committed, not a snapshot from the
+# start of the transaction
+READ_COMMITTED = "SET SESSION TRANSACTION ISOLATION LEVEL READ COMMITTED"
+
+# When local_infile is off, rows are inserted with multi-row INSERT statements. If insert_size
+# is 1, rows are converted INSERT_ROWS at a time, and each statement is as long as fits in
+# max_allowed_packet, up to MAX_STMT_LENGTH bytes
+Q_MAX_PACKET = "SHOW VARIABLES LIKE 'max_allowed_packet'"
+INSERT_ROWS = 10000
+MAX_STMT_LENGTH = 16777216
+PACKET_MARGIN = 1024
+
+# Connections and writes that fail for a reason that may go away are tried again, after a
+# wait of RETRY_WAIT seconds that doubles for each retry, up to MAX_RETRY_WAIT seconds
+SQL_RETRIES = 5
+RETRY_WAIT = 1
+MAX_RETRY_WAIT = 60
+# lock wait timeout. It rolls back only the statement, so the write can be done again
+RETRY_ERRORS = (1205,)
+SAVEPOINT = "SAVEPOINT METdbLoad_write"
+ROLLBACK_SAVEPOINT = "ROLLBACK TO SAVEPOINT METdbLoad_write"
+# Session settings for bulk loads, used if bulk_session is set. They end with the session.
+# Duplicate headers are found by the header lookups, and tables are written in the order of
+# their foreign keys, so the checks are not needed
+BULK_SESSION = "SET SESSION unique_checks=0, foreign_key_checks=0, " + \
+               "bulk_insert_buffer_size=268435456"
 
 Q_METADATA = "SELECT category, description FROM metadata"
 
@@ -841,17 +922,6 @@ MODE_PAIR_FIELDS = [MODE_OBJ_OBS_ID, MODE_OBJ_FCST_ID, MODE_HEADER_ID, OBJECT_ID
                     'intersection_over_area', CURV_RATIO, 'complexity_ratio',
                     'percentile_intensity_ratio', 'interest', SIMPLE_FLAG, MATCHED_FLAG]
 
-Q_MHEADER = "SELECT mode_header_id FROM mode_header WHERE " + \
-            "=%s AND ".join(MODE_HEADER_KEYS) + "=%s"
-
-QN_MHEADER = "SELECT mode_header_id FROM mode_header WHERE " + \
-             "version=%s AND model=%s AND n_valid is NULL AND grid_res is NULL " + \
-             "AND descr=%s AND fcst_lead=%s AND fcst_valid=%s AND fcst_accum=%s " + \
-             "AND fcst_init=%s AND obs_lead=%s AND obs_valid=%s AND obs_accum=%s " + \
-             "AND fcst_rad=%s AND fcst_thr=%s AND obs_rad=%s AND obs_thr=%s " + \
-             "AND fcst_var=%s AND fcst_units=%s AND fcst_lev=%s AND obs_var=%s " + \
-             "AND obs_units=%s AND obs_lev=%s"
-
 INS_MHEADER = "INSERT INTO mode_header (" + ",".join(MODE_HEADER_FIELDS) + \
               ") VALUES (" + VALUE_SLOTS + ")"
 
@@ -910,6 +980,11 @@ MTD_2D_OBJ_FIELDS = [MTD_HEADER_ID, OBJECT_ID, OBJECT_CAT, TIME_INDEX, AREA,
 MTD_2D_REV_FIELDS = [MODEL, DESCR, FCST_VALID, OBS_VALID, FCST_RAD, FCST_THR,
                      OBS_RAD, OBS_THR, FCST_LEV, OBS_LEV]
 
+# Columns that are differences between lines in 2D revision lines
+MTD_2D_REV_DIFF_FIELDS = [AREA, CENTROID_X, CENTROID_Y, CENTROID_LAT, CENTROID_LON,
+                          INTENSITY_10, INTENSITY_25, INTENSITY_50, INTENSITY_75,
+                          INTENSITY_90]
+
 MTD_3D_OBJ_SINGLE_FIELDS = [MTD_HEADER_ID, OBJECT_ID, OBJECT_CAT,
                             CENTROID_X, CENTROID_Y, CENTROID_T, CENTROID_LAT, CENTROID_LON,
                             'x_dot', 'y_dot', AXIS_ANG, 'volume',
@@ -924,9 +999,6 @@ MTD_3D_OBJ_PAIR_FIELDS = [MTD_HEADER_ID, OBJECT_ID, OBJECT_CAT,
                           'intersection_volume', 'duration_diff', 'interest',
                           SIMPLE_FLAG, MATCHED_FLAG]
 
-Q_MTDHEADER = "SELECT mtd_header_id FROM mtd_header WHERE " + \
-              "=%s AND ".join(MTD_HEADER_KEYS) + "=%s"
-
 INS_MTDHEADER = "INSERT INTO mtd_header (" + ",".join(MTD_HEADER_FIELDS) + \
                 ") VALUES (" + VALUE_SLOTS + ")"
 
@@ -948,215 +1020,34 @@ P_VALUE_SLOTS = P_VALUE_SLOTS[:-2]
 INS_M3PHEADER = "INSERT INTO mtd_3d_obj_pair (" + ",".join(MTD_3D_OBJ_PAIR_FIELDS) + \
                 ") VALUES (" + P_VALUE_SLOTS + ")"
 
-DROP_INDEXES_QUERIES = ["DROP INDEX stat_header_model_idx ON stat_header",
-                        "DROP INDEX stat_header_fcst_var_idx ON stat_header",
-                        "DROP INDEX stat_header_fcst_lev_idx ON stat_header",
-                        "DROP INDEX stat_header_obtype_idx ON stat_header",
-                        "DROP INDEX stat_header_vx_mask_idx ON stat_header",
-                        "DROP INDEX stat_header_interp_mthd_idx ON stat_header",
-                        "DROP INDEX stat_header_interp_pnts_idx ON stat_header",
-                        "DROP INDEX stat_header_fcst_thresh_idx ON stat_header",
-                        "DROP INDEX mode_header_model_idx ON mode_header",
-                        "DROP INDEX mode_header_fcst_lead_idx ON mode_header",
-                        "DROP INDEX mode_header_fcst_valid_idx ON mode_header",
-                        "DROP INDEX mode_header_fcst_init_idx ON mode_header",
-                        "DROP INDEX mode_header_fcst_rad_idx ON mode_header",
-                        "DROP INDEX mode_header_fcst_thr_idx ON mode_header",
-                        "DROP INDEX mode_header_fcst_var_idx ON mode_header",
-                        "DROP INDEX mode_header_fcst_lev_idx ON mode_header",
-                        "DROP INDEX mtd_header_model_idx ON mtd_header",
-                        "DROP INDEX mtd_header_fcst_lead_idx ON mtd_header",
-                        "DROP INDEX mtd_header_fcst_valid_idx ON mtd_header",
-                        "DROP INDEX mtd_header_fcst_init_idx ON mtd_header",
-                        "DROP INDEX mtd_header_fcst_rad_idx ON mtd_header",
-                        "DROP INDEX mtd_header_fcst_thr_idx ON mtd_header",
-                        "DROP INDEX mtd_header_fcst_var_idx ON mtd_header",
-                        "DROP INDEX mtd_header_fcst_lev_idx ON mtd_header",
-                        "DROP INDEX line_data_fho_fcst_lead_idx ON line_data_fho",
-                        "DROP INDEX line_data_fho_fcst_valid_beg_idx ON line_data_fho",
-                        "DROP INDEX line_data_fho_fcst_init_beg_idx ON line_data_fho",
-                        "DROP INDEX line_data_ctc_fcst_lead_idx ON line_data_ctc",
-                        "DROP INDEX line_data_ctc_fcst_valid_beg_idx ON line_data_ctc",
-                        "DROP INDEX line_data_ctc_fcst_init_beg_idx ON line_data_ctc",
-                        "DROP INDEX line_data_cts_fcst_lead_idx ON line_data_cts",
-                        "DROP INDEX line_data_cts_fcst_valid_beg_idx ON line_data_cts",
-                        "DROP INDEX line_data_cts_fcst_init_beg_idx ON line_data_cts",
-                        "DROP INDEX line_data_cnt_fcst_lead_idx ON line_data_cnt",
-                        "DROP INDEX line_data_cnt_fcst_valid_beg_idx ON line_data_cnt",
-                        "DROP INDEX line_data_cnt_fcst_init_beg_idx ON line_data_cnt",
-                        "DROP INDEX line_data_pct_fcst_lead_idx ON line_data_pct",
-                        "DROP INDEX line_data_pct_fcst_valid_beg_idx ON line_data_pct",
-                        "DROP INDEX line_data_pct_fcst_init_beg_idx ON line_data_pct",
-                        "DROP INDEX line_data_pstd_fcst_lead_idx ON line_data_pstd",
-                        "DROP INDEX line_data_pstd_fcst_valid_beg_idx ON line_data_pstd",
-                        "DROP INDEX line_data_pstd_fcst_init_beg_idx ON line_data_pstd",
-                        "DROP INDEX line_data_pjc_fcst_lead_idx ON line_data_pjc",
-                        "DROP INDEX line_data_pjc_fcst_valid_beg_idx ON line_data_pjc",
-                        "DROP INDEX line_data_pjc_fcst_init_beg_idx ON line_data_pjc",
-                        "DROP INDEX line_data_prc_fcst_lead_idx ON line_data_prc",
-                        "DROP INDEX line_data_prc_fcst_valid_beg_idx ON line_data_prc",
-                        "DROP INDEX line_data_prc_fcst_init_beg_idx ON line_data_prc",
-                        "DROP INDEX line_data_sl1l2_fcst_lead_idx ON line_data_sl1l2",
-                        "DROP INDEX line_data_sl1l2_fcst_valid_beg_idx ON line_data_sl1l2",
-                        "DROP INDEX line_data_sl1l2_fcst_init_beg_idx ON line_data_sl1l2",
-                        "DROP INDEX line_data_sal1l2_fcst_lead_idx ON line_data_sal1l2",
-                        "DROP INDEX line_data_sal1l2_fcst_valid_beg_idx ON line_data_sal1l2",
-                        "DROP INDEX line_data_sal1l2_fcst_init_beg_idx ON line_data_sal1l2",
-                        "DROP INDEX line_data_vl1l2_fcst_lead_idx ON line_data_vl1l2",
-                        "DROP INDEX line_data_vl1l2_fcst_valid_beg_idx ON line_data_vl1l2",
-                        "DROP INDEX line_data_vl1l2_fcst_init_beg_idx ON line_data_vl1l2",
-                        "DROP INDEX line_data_val1l2_fcst_lead_idx ON line_data_val1l2",
-                        "DROP INDEX line_data_val1l2_fcst_valid_beg_idx ON line_data_val1l2",
-                        "DROP INDEX line_data_val1l2_fcst_init_beg_idx ON line_data_val1l2",
-                        "DROP INDEX line_data_mpr_fcst_lead_idx ON line_data_mpr",
-                        "DROP INDEX line_data_mpr_fcst_valid_beg_idx ON line_data_mpr",
-                        "DROP INDEX line_data_mpr_fcst_init_beg_idx ON line_data_mpr",
-                        "DROP INDEX line_data_nbrctc_fcst_lead_idx ON line_data_nbrctc",
-                        "DROP INDEX line_data_nbrctc_fcst_valid_beg_idx ON line_data_nbrctc",
-                        "DROP INDEX line_data_nbrctc_fcst_init_beg_idx ON line_data_nbrctc",
-                        "DROP INDEX line_data_nbrcts_fcst_lead_idx ON line_data_nbrcts",
-                        "DROP INDEX line_data_nbrcts_fcst_valid_beg_idx ON line_data_nbrcts",
-                        "DROP INDEX line_data_nbrcts_fcst_init_beg_idx ON line_data_nbrcts",
-                        "DROP INDEX line_data_nbrcnt_fcst_lead_idx ON line_data_nbrcnt",
-                        "DROP INDEX line_data_nbrcnt_fcst_valid_beg_idx ON line_data_nbrcnt",
-                        "DROP INDEX line_data_nbrcnt_fcst_init_beg_idx ON line_data_nbrcnt",
-                        "DROP INDEX line_data_isc_fcst_lead_idx ON line_data_isc",
-                        "DROP INDEX line_data_isc_fcst_valid_beg_idx ON line_data_isc",
-                        "DROP INDEX line_data_isc_fcst_init_beg_idx ON line_data_isc",
-                        "DROP INDEX line_data_mctc_fcst_lead_idx ON line_data_mctc",
-                        "DROP INDEX line_data_mctc_fcst_valid_beg_idx ON line_data_mctc",
-                        "DROP INDEX line_data_mctc_fcst_init_beg_idx ON line_data_mctc",
-                        "DROP INDEX line_data_rhist_fcst_lead_idx ON line_data_rhist",
-                        "DROP INDEX line_data_rhist_fcst_valid_beg_idx ON line_data_rhist",
-                        "DROP INDEX line_data_rhist_fcst_init_beg_idx ON line_data_rhist",
-                        "DROP INDEX line_data_orank_fcst_lead_idx ON line_data_orank",
-                        "DROP INDEX line_data_orank_fcst_valid_beg_idx ON line_data_orank",
-                        "DROP INDEX line_data_orank_fcst_init_beg_idx ON line_data_orank",
-                        "DROP INDEX line_data_relp_fcst_lead_idx ON line_data_relp",
-                        "DROP INDEX line_data_relp_fcst_valid_beg_idx ON line_data_relp",
-                        "DROP INDEX line_data_relp_fcst_init_beg_idx ON line_data_relp",
-                        "DROP INDEX line_data_eclv_fcst_lead_idx ON line_data_eclv",
-                        "DROP INDEX line_data_eclv_fcst_valid_beg_idx ON line_data_eclv",
-                        "DROP INDEX line_data_eclv_fcst_init_beg_idx ON line_data_eclv",
-                        "DROP INDEX line_data_ssvar_fcst_lead_idx ON line_data_ssvar",
-                        "DROP INDEX line_data_ssvar_fcst_valid_beg_idx ON line_data_ssvar",
-                        "DROP INDEX line_data_ssvar_fcst_init_beg_idx ON line_data_ssvar",
-                        "DROP INDEX line_data_enscnt_fcst_lead_idx ON line_data_enscnt",
-                        "DROP INDEX line_data_enscnt_fcst_valid_beg_idx ON line_data_enscnt",
-                        "DROP INDEX line_data_enscnt_fcst_init_beg_idx ON line_data_enscnt",
-                        "DROP INDEX line_data_grad_fcst_lead_idx ON line_data_grad",
-                        "DROP INDEX line_data_grad_fcst_valid_beg_idx ON line_data_grad",
-                        "DROP INDEX line_data_grad_fcst_init_beg_idx ON line_data_grad",
-                        "DROP INDEX line_data_dmap_fcst_lead_idx ON line_data_dmap",
-                        "DROP INDEX line_data_dmap_fcst_valid_beg_idx ON line_data_dmap",
-                        "DROP INDEX line_data_dmap_fcst_init_beg_idx ON line_data_dmap",
-                        "DROP INDEX line_data_rps_fcst_lead_idx ON line_data_rps",
-                        "DROP INDEX line_data_rps_fcst_valid_beg_idx ON line_data_rps",
-                        "DROP INDEX line_data_rps_fcst_init_beg_idx ON line_data_rps"]
-
-CREATE_INDEXES_QUERIES = \
-    ["CREATE INDEX stat_header_model_idx ON stat_header (model)",
-     "CREATE INDEX stat_header_fcst_var_idx ON stat_header (fcst_var)",
-     "CREATE INDEX stat_header_fcst_lev_idx ON stat_header (fcst_lev)",
-     "CREATE INDEX stat_header_obtype_idx ON stat_header (obtype)",
-     "CREATE INDEX stat_header_vx_mask_idx ON stat_header (vx_mask)",
-     "CREATE INDEX stat_header_interp_mthd_idx ON stat_header (interp_mthd)",
-     "CREATE INDEX stat_header_interp_pnts_idx ON stat_header (interp_pnts)",
-     "CREATE INDEX stat_header_fcst_thresh_idx ON stat_header (fcst_thresh)",
-     "CREATE INDEX mode_header_model_idx ON mode_header (model)",
-     "CREATE INDEX mode_header_fcst_lead_idx ON mode_header (fcst_lead)",
-     "CREATE INDEX mode_header_fcst_valid_idx ON mode_header (fcst_valid)",
-     "CREATE INDEX mode_header_fcst_init_idx ON mode_header (fcst_init)",
-     "CREATE INDEX mode_header_fcst_rad_idx ON mode_header (fcst_rad)",
-     "CREATE INDEX mode_header_fcst_thr_idx ON mode_header (fcst_thr)",
-     "CREATE INDEX mode_header_fcst_var_idx ON mode_header (fcst_var)",
-     "CREATE INDEX mode_header_fcst_lev_idx ON mode_header (fcst_lev)",
-     "CREATE INDEX mtd_header_model_idx ON mtd_header (model)",
-     "CREATE INDEX mtd_header_fcst_lead_idx ON mtd_header (fcst_lead)",
-     "CREATE INDEX mtd_header_fcst_valid_idx ON mtd_header (fcst_valid)",
-     "CREATE INDEX mtd_header_fcst_init_idx ON mtd_header (fcst_init)",
-     "CREATE INDEX mtd_header_fcst_rad_idx ON mtd_header (fcst_rad)",
-     "CREATE INDEX mtd_header_fcst_thr_idx ON mtd_header (fcst_thr)",
-     "CREATE INDEX mtd_header_fcst_var_idx ON mtd_header (fcst_var)",
-     "CREATE INDEX mtd_header_fcst_lev_idx ON mtd_header (fcst_lev)",
-     "CREATE INDEX line_data_fho_fcst_lead_idx ON line_data_fho (fcst_lead)",
-     "CREATE INDEX line_data_fho_fcst_valid_beg_idx ON line_data_fho (fcst_valid_beg)",
-     "CREATE INDEX line_data_fho_fcst_init_beg_idx ON line_data_fho (fcst_init_beg)",
-     "CREATE INDEX line_data_ctc_fcst_lead_idx ON line_data_ctc (fcst_lead)",
-     "CREATE INDEX line_data_ctc_fcst_valid_beg_idx ON line_data_ctc (fcst_valid_beg)",
-     "CREATE INDEX line_data_ctc_fcst_init_beg_idx ON line_data_ctc (fcst_init_beg)",
-     "CREATE INDEX line_data_cts_fcst_lead_idx ON line_data_cts (fcst_lead)",
-     "CREATE INDEX line_data_cts_fcst_valid_beg_idx ON line_data_cts (fcst_valid_beg)",
-     "CREATE INDEX line_data_cts_fcst_init_beg_idx ON line_data_cts (fcst_init_beg)",
-     "CREATE INDEX line_data_cnt_fcst_lead_idx ON line_data_cnt (fcst_lead)",
-     "CREATE INDEX line_data_cnt_fcst_valid_beg_idx ON line_data_cnt (fcst_valid_beg)",
-     "CREATE INDEX line_data_cnt_fcst_init_beg_idx ON line_data_cnt (fcst_init_beg)",
-     "CREATE INDEX line_data_pct_fcst_lead_idx ON line_data_pct (fcst_lead)",
-     "CREATE INDEX line_data_pct_fcst_valid_beg_idx ON line_data_pct (fcst_valid_beg)",
-     "CREATE INDEX line_data_pct_fcst_init_beg_idx ON line_data_pct (fcst_init_beg)",
-     "CREATE INDEX line_data_pstd_fcst_lead_idx ON line_data_pstd (fcst_lead)",
-     "CREATE INDEX line_data_pstd_fcst_valid_beg_idx ON line_data_pstd (fcst_valid_beg)",
-     "CREATE INDEX line_data_pstd_fcst_init_beg_idx ON line_data_pstd (fcst_init_beg)",
-     "CREATE INDEX line_data_pjc_fcst_lead_idx ON line_data_pjc (fcst_lead)",
-     "CREATE INDEX line_data_pjc_fcst_valid_beg_idx ON line_data_pjc (fcst_valid_beg)",
-     "CREATE INDEX line_data_pjc_fcst_init_beg_idx ON line_data_pjc (fcst_init_beg)",
-     "CREATE INDEX line_data_prc_fcst_lead_idx ON line_data_prc (fcst_lead)",
-     "CREATE INDEX line_data_prc_fcst_valid_beg_idx ON line_data_prc (fcst_valid_beg)",
-     "CREATE INDEX line_data_prc_fcst_init_beg_idx ON line_data_prc (fcst_init_beg)",
-     "CREATE INDEX line_data_sl1l2_fcst_lead_idx ON line_data_sl1l2 (fcst_lead)",
-     "CREATE INDEX line_data_sl1l2_fcst_valid_beg_idx ON line_data_sl1l2 (fcst_valid_beg)",
-     "CREATE INDEX line_data_sl1l2_fcst_init_beg_idx ON line_data_sl1l2 (fcst_init_beg)",
-     "CREATE INDEX line_data_sal1l2_fcst_lead_idx ON line_data_sal1l2 (fcst_lead)",
-     "CREATE INDEX line_data_sal1l2_fcst_valid_beg_idx ON line_data_sal1l2 (fcst_valid_beg)",
-     "CREATE INDEX line_data_sal1l2_fcst_init_beg_idx ON line_data_sal1l2 (fcst_init_beg)",
-     "CREATE INDEX line_data_vl1l2_fcst_lead_idx ON line_data_vl1l2 (fcst_lead)",
-     "CREATE INDEX line_data_vl1l2_fcst_valid_beg_idx ON line_data_vl1l2 (fcst_valid_beg)",
-     "CREATE INDEX line_data_vl1l2_fcst_init_beg_idx ON line_data_vl1l2 (fcst_init_beg)",
-     "CREATE INDEX line_data_val1l2_fcst_lead_idx ON line_data_val1l2 (fcst_lead)",
-     "CREATE INDEX line_data_val1l2_fcst_valid_beg_idx ON line_data_val1l2 (fcst_valid_beg)",
-     "CREATE INDEX line_data_val1l2_fcst_init_beg_idx ON line_data_val1l2 (fcst_init_beg)",
-     "CREATE INDEX line_data_mpr_fcst_lead_idx ON line_data_mpr (fcst_lead)",
-     "CREATE INDEX line_data_mpr_fcst_valid_beg_idx ON line_data_mpr (fcst_valid_beg)",
-     "CREATE INDEX line_data_mpr_fcst_init_beg_idx ON line_data_mpr (fcst_init_beg)",
-     "CREATE INDEX line_data_nbrctc_fcst_lead_idx ON line_data_nbrctc (fcst_lead)",
-     "CREATE INDEX line_data_nbrctc_fcst_valid_beg_idx ON line_data_nbrctc (fcst_valid_beg)",
-     "CREATE INDEX line_data_nbrctc_fcst_init_beg_idx ON line_data_nbrctc (fcst_init_beg)",
-     "CREATE INDEX line_data_nbrcts_fcst_lead_idx ON line_data_nbrcts (fcst_lead)",
-     "CREATE INDEX line_data_nbrcts_fcst_valid_beg_idx ON line_data_nbrcts (fcst_valid_beg)",
-     "CREATE INDEX line_data_nbrcts_fcst_init_beg_idx ON line_data_nbrcts (fcst_init_beg)",
-     "CREATE INDEX line_data_nbrcnt_fcst_lead_idx ON line_data_nbrcnt (fcst_lead)",
-     "CREATE INDEX line_data_nbrcnt_fcst_valid_beg_idx ON line_data_nbrcnt (fcst_valid_beg)",
-     "CREATE INDEX line_data_nbrcnt_fcst_init_beg_idx ON line_data_nbrcnt (fcst_init_beg)",
-     "CREATE INDEX line_data_isc_fcst_lead_idx ON line_data_isc (fcst_lead)",
-     "CREATE INDEX line_data_isc_fcst_valid_beg_idx ON line_data_isc (fcst_valid_beg)",
-     "CREATE INDEX line_data_isc_fcst_init_beg_idx ON line_data_isc (fcst_init_beg)",
-     "CREATE INDEX line_data_mctc_fcst_lead_idx ON line_data_mctc (fcst_lead)",
-     "CREATE INDEX line_data_mctc_fcst_valid_beg_idx ON line_data_mctc (fcst_valid_beg)",
-     "CREATE INDEX line_data_mctc_fcst_init_beg_idx ON line_data_mctc (fcst_init_beg)",
-     "CREATE INDEX line_data_rhist_fcst_lead_idx ON line_data_rhist (fcst_lead)",
-     "CREATE INDEX line_data_rhist_fcst_valid_beg_idx ON line_data_rhist (fcst_valid_beg)",
-     "CREATE INDEX line_data_rhist_fcst_init_beg_idx ON line_data_rhist (fcst_init_beg)",
-     "CREATE INDEX line_data_orank_fcst_lead_idx ON line_data_orank (fcst_lead)",
-     "CREATE INDEX line_data_orank_fcst_valid_beg_idx ON line_data_orank (fcst_valid_beg)",
-     "CREATE INDEX line_data_orank_fcst_init_beg_idx ON line_data_orank (fcst_init_beg)",
-     "CREATE INDEX line_data_relp_fcst_lead_idx ON line_data_relp (fcst_lead)",
-     "CREATE INDEX line_data_relp_fcst_valid_beg_idx ON line_data_relp (fcst_valid_beg)",
-     "CREATE INDEX line_data_relp_fcst_init_beg_idx ON line_data_relp (fcst_init_beg)",
-     "CREATE INDEX line_data_eclv_fcst_lead_idx ON line_data_eclv (fcst_lead)",
-     "CREATE INDEX line_data_eclv_fcst_valid_beg_idx ON line_data_eclv (fcst_valid_beg)",
-     "CREATE INDEX line_data_eclv_fcst_init_beg_idx ON line_data_eclv (fcst_init_beg)",
-     "CREATE INDEX line_data_ssvar_fcst_lead_idx ON line_data_ssvar (fcst_lead)",
-     "CREATE INDEX line_data_ssvar_fcst_valid_beg_idx ON line_data_ssvar (fcst_valid_beg)",
-     "CREATE INDEX line_data_ssvar_fcst_init_beg_idx ON line_data_ssvar (fcst_init_beg)",
-     "CREATE INDEX line_data_enscnt_fcst_lead_idx ON line_data_enscnt (fcst_lead)",
-     "CREATE INDEX line_data_enscnt_fcst_valid_beg_idx ON line_data_enscnt (fcst_valid_beg)",
-     "CREATE INDEX line_data_enscnt_fcst_init_beg_idx ON line_data_enscnt (fcst_init_beg)",
-     "CREATE INDEX line_data_grad_fcst_lead_idx ON line_data_grad (fcst_lead)",
-     "CREATE INDEX line_data_grad_fcst_valid_beg_idx ON line_data_grad (fcst_valid_beg)",
-     "CREATE INDEX line_data_grad_fcst_init_beg_idx ON line_data_grad (fcst_init_beg)",
-     "CREATE INDEX line_data_dmap_fcst_lead_idx ON line_data_dmap (fcst_lead)",
-     "CREATE INDEX line_data_dmap_fcst_valid_beg_idx ON line_data_dmap (fcst_valid_beg)",
-     "CREATE INDEX line_data_dmap_fcst_init_beg_idx ON line_data_dmap (fcst_init_beg)",
-     "CREATE INDEX line_data_rps_fcst_lead_idx ON line_data_rps (fcst_lead)",
-     "CREATE INDEX line_data_rps_fcst_valid_beg_idx ON line_data_rps (fcst_valid_beg)",
-     "CREATE INDEX line_data_rps_fcst_init_beg_idx ON line_data_rps (fcst_init_beg)"]
+# Indexes dropped before loading and made after loading, if asked for. Each index is on one
+# column of a table, and is named <table>_<column>_idx
+INDEX_LINE_TYPES = [FHO, CTC, CTS, CNT, PCT, PSTD, PJC, PRC, SL1L2, SAL1L2, VL1L2, VAL1L2,
+                    MPR, NBRCTC, NBRCTS, NBRCNT, ISC, MCTC, RHIST, ORANK, RELP, ECLV,
+                    SSVAR, ENSCNT, GRAD, DMAP, RPS]
+MODE_INDEX_COLUMNS = [MODEL, FCST_LEAD, FCST_VALID, FCST_INIT, FCST_RAD, FCST_THR,
+                      FCST_VAR, FCST_LEV]
+INDEX_COLUMNS = dict()
+INDEX_COLUMNS[STAT_HEADER] = [MODEL, FCST_VAR, FCST_LEV, OBTYPE, VX_MASK, INTERP_MTHD,
+                              INTERP_PNTS, FCST_THRESH]
+INDEX_COLUMNS[MODE_HEADER] = MODE_INDEX_COLUMNS
+INDEX_COLUMNS[MTD_HEADER] = MODE_INDEX_COLUMNS
+for index_type in INDEX_LINE_TYPES:
+    INDEX_COLUMNS['line_data_' + index_type.lower()] = [FCST_LEAD, FCST_VALID_BEG, FCST_INIT_BEG]
+
+INDEX_NAME = "{0}_{1}_idx"
+ADD_INDEX = "ADD INDEX {0} ({1})"
+DROP_INDEX = "DROP INDEX {0}"
+# all the indexes of a table are added or dropped with one statement
+ALTER_INDEXES = "ALTER TABLE {0} {1}"
+Q_TABLES = "SELECT table_name FROM information_schema.tables WHERE table_schema = DATABASE()"
+Q_INDEXES = "SELECT DISTINCT table_name, index_name FROM information_schema.statistics " + \
+            "WHERE table_schema = DATABASE()"
+# number of tables whose indexes are added or dropped at the same time, each on a connection
+INDEX_THREADS = 4
+# drop_indexes and apply_indexes can be auto. Then the indexes of a table are dropped if the
+# lines loaded into it are at least AUTO_DROP_FRACTION of its rows, and made again after loading
+AUTO_INDEXES = "auto"
+AUTO_DROP_FRACTION = 0.2
+Q_TABLE_ROWS = "SELECT table_name, table_rows FROM information_schema.tables " + \
+               "WHERE table_schema = DATABASE()"
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+
+"""
+Program Name: format_csv_data.py
+Contact(s): Venita Hagerty
+Abstract:
+History Log:  Initial version
+Usage: Fast writer for the CSV files loaded into a SQL database with LOAD DATA.
+Parameters: N/A
+Input Files: dataframe of headers or line data
+Output Files: CSV file separated by CN.SEP
+Copyright 2020 UCAR/NCAR/RAL, CSU/CIRES, Regents of the University of Colorado, NOAA/OAR/ESRL/GSD
+"""
+
+# pylint:disable=no-member
+# constants exist in constants.py
+
+import numpy as np
+import pandas as pd
+
+import constants as CN
+
+# byte values used while writing
+NEW_LINE = 10
+SEP_BYTE = ord(CN.SEP)
+NA_BYTES = CN.MV_NOTAV.encode()
+
+# characters that pandas would quote, which LOAD DATA would then load with the quotes
+QUOTE_CHARS = np.frombuffer(CN.SEP.encode() + b'"\r\n', dtype=np.uint8)
+
+# number of rows joined into lines at a time
+CHUNK_ROWS = 100000
+
+
+class FormatCsvData:
+    """! Class to write dataframes as CSV with NumPy. Each column is converted to an array
+         of byte strings from its NumPy values, and the bytes of a chunk of rows are copied
+         into one buffer, without a Python object per field.
+        Returns:
+           N/A
+    """
+
+    @staticmethod
+    def write_csv(raw_data, col_list, csv_file):
+        """ Write the columns of a dataframe to a binary file or named pipe, with missing
+            values written as MV_NOTAV. If a value has a character that pandas would quote,
+            the lines are made with pandas to_csv, as before.
+            Returns:
+               N/A
+        """
+        col_strings = FormatCsvData.format_columns(raw_data, col_list)
+        if col_strings is None:
+            csv_file.write(raw_data[col_list].to_csv(None, na_rep=CN.MV_NOTAV, index=False,
+                                                     header=False, sep=CN.SEP).encode())
+            return
+
+        for chunk_start in range(0, len(raw_data.index), CHUNK_ROWS):
+            csv_file.write(FormatCsvData.join_rows(col_strings, chunk_start,
+                                                   chunk_start + CHUNK_ROWS))
+
+    @staticmethod
+    def format_columns(raw_data, col_list):
+        """ Convert each column to byte strings.
+            Returns:
+               list of byte string arrays, or None if a value needs quoting
+        """
+        col_strings = []
+        for col_name in col_list:
+            strings = FormatCsvData.format_column(raw_data[col_name].to_numpy())
+            if strings is None:
+                return None
+            col_strings.append(strings)
+        return col_strings
+
+    @staticmethod
+    def format_column(values):
+        """ Convert the values of one column to byte strings, as pandas to_csv writes them.
+            Dates are always written with their time, as YYYY-MM-DD HH:MM:SS. A file has few
+            distinct dates and strings, so each of them is converted once.
+            Returns:
+               byte string array, or None if a value needs quoting or is of another type
+        """
+        if values.dtype.kind in 'iub':
+            return values.astype('S')
+
+        if values.dtype.kind == 'f':
+            strings = values.astype('S')
+            missing = np.isnan(values)
+            if missing.any():
+                strings = strings.astype('S' + str(max(strings.dtype.itemsize, len(NA_BYTES))))
+                strings[missing] = NA_BYTES
+            return strings
+
+        if values.dtype.kind not in 'MO':
+            return None
+
+        # numbers in a column of strings are converted one by one, as 4 and 4.0 are one value
+        if values.dtype.kind == 'O' and pd.api.types.infer_dtype(values) != 'string':
+            value_codes = np.where(pd.isna(values), -1, np.arange(len(values)))
+            uniques = values
+        else:
+            # missing values have a code of -1, which takes MV_NOTAV from the end
+            value_codes, uniques = pd.factorize(values)
+        if values.dtype.kind == 'M':
+            strings = np.datetime_as_string(uniques, unit='s').astype('S19')
+            # ISO dates have a T between the date and the time
+            strings.view(np.uint8).reshape(len(strings), 19)[:, 10] = ord(' ')
+        else:
+            strings = uniques.astype(str)
+            try:
+                strings = strings.astype('S')
+            except UnicodeEncodeError:
+                strings = np.char.encode(strings, 'utf-8')
+            if np.isin(strings.view(np.uint8), QUOTE_CHARS).any():
+                return None
+
+        return np.append(strings, NA_BYTES)[value_codes]
+
+    @staticmethod
+    def join_rows(col_strings, row_start, row_end):
+        """ Join rows row_start to row_end of the columns into lines of the CSV file. The
+            fields are copied into a matrix of bytes with one row per line, and the zero
+            bytes that pad the shorter fields are removed.
+            Returns:
+               bytes of the lines
+        """
+        col_strings = [strings[row_start:row_end] for strings in col_strings]
+        n_rows = len(col_strings[0])
+        widths = [strings.dtype.itemsize for strings in col_strings]
+        csv_bytes = np.zeros((n_rows, sum(widths) + len(widths)), dtype=np.uint8)
+
+        # each field is followed by a separator, or a new line after the last field
+        field_start = 0
+        for strings, width in zip(col_strings, widths):
+            csv_bytes[:, field_start:field_start + width] = \
+                strings.view(np.uint8).reshape(n_rows, width)
+            field_start += width
+            csv_bytes[:, field_start] = SEP_BYTE
+            field_start += 1
+        csv_bytes[:, -1] = NEW_LINE
+
+        return csv_bytes[csv_bytes != 0].tobytes()
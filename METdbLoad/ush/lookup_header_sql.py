@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+
+"""
+Program Name: lookup_header_sql.py
+Contact(s): Venita Hagerty
+Abstract:
+History Log:  Initial version
+Usage: Find the ids of headers (stat, tcst, mode, MTD) that are already in a SQL database.
+Parameters: N/A
+Input Files: N/A
+Output Files: N/A
+Copyright 2020 UCAR/NCAR/RAL, CSU/CIRES, Regents of the University of Colorado, NOAA/OAR/ESRL/GSD
+"""
+
+# pylint:disable=no-member
+# constants exist in constants.py
+
+import sys
+import os
+import json
+import hashlib
+import logging
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import pymysql
+
+import constants as CN
+
+from run_sql import RunSql
+
+
+class LookupHeaderSql:
+    """ Class to give ids to the headers of a load, using ids of headers already in the database
+        Returns:
+           N/A
+    """
+
+    # hashes of header keys and ids already seen in this run, for each header table
+    header_cache = {}
+    # hashes and ids of new headers in the set being loaded, kept once the set is committed
+    pending_headers = {}
+    # id field of each header table in the cache
+    header_id_fields = {}
+    # whether headers are looked up with a temporary table, which needs the
+    # CREATE TEMPORARY TABLES privilege
+    use_tmp_table = True
+
+    @staticmethod
+    def set_header_ids(headers, table, id_field, key_fields, db_check, sql_cur):
+        """ Fill in the id field of the unique headers of a load. Headers found in the database
+            keep their ids, and the others get new ids from a reserved block, in order.
+            Headers seen earlier in this run are not looked up in the database again.
+            New headers are only added to the cache once their set has been committed.
+            Returns:
+               first new header id
+        """
+        header_ids = np.full(len(headers.index), CN.NO_KEY)
+
+        # if the flag is set to check for duplicate headers, get ids from existing headers
+        if db_check:
+            table_cache = LookupHeaderSql.header_cache.setdefault(table, {})
+            LookupHeaderSql.header_id_fields[table] = id_field
+            key_values = LookupHeaderSql.get_key_values(headers[key_fields])
+            header_keys = [LookupHeaderSql.hash_values(key) for key in key_values.values.tolist()]
+            header_ids = np.array([table_cache.get(key, CN.NO_KEY) for key in header_keys],
+                                  dtype=np.int64)
+
+            # only ask the database about headers that have not been seen yet
+            unseen = header_ids == CN.NO_KEY
+            if unseen.any():
+                header_ids[unseen] = \
+                    LookupHeaderSql.get_header_ids(key_values[unseen], table, id_field,
+                                                   key_fields, sql_cur)
+
+        # When new headers, reserve a block of ids for them
+        new_rows = header_ids == CN.NO_KEY
+        next_header_id = RunSql.reserve_ids(table, id_field, new_rows.sum(), sql_cur)
+        header_ids[new_rows] = np.arange(new_rows.sum()) + next_header_id
+        headers[id_field] = header_ids
+
+        if db_check:
+            pending_cache = LookupHeaderSql.pending_headers.setdefault(table, {})
+            for key, header_id, new_row in zip(header_keys, header_ids.tolist(),
+                                               new_rows.tolist()):
+                if new_row:
+                    pending_cache[key] = header_id
+                else:
+                    table_cache[key] = header_id
+
+        return next_header_id
+
+    @staticmethod
+    def drop_new_headers(table):
+        """ Forget the new headers of a table in the set being loaded, when they could not be
+            written, so their ids are not given to headers of later sets.
+            Returns:
+               N/A
+        """
+        LookupHeaderSql.pending_headers.pop(table, None)
+
+    @staticmethod
+    def keep_new_headers():
+        """ Add the new headers of a set that has been committed to the header cache.
+            Returns:
+               N/A
+        """
+        for table, new_headers in LookupHeaderSql.pending_headers.items():
+            LookupHeaderSql.header_cache.setdefault(table, {}).update(new_headers)
+        LookupHeaderSql.pending_headers.clear()
+
+    @staticmethod
+    def get_header_ids(key_values, table, id_field, key_fields, sql_cur):
+        """ Look up all of the headers at once. The headers are put in a temporary table that is
+            joined with the header table, with NULL safe comparisons of the key fields.
+            If the temporary table cannot be used, such as when the user does not have the
+            CREATE TEMPORARY TABLES privilege, the headers are looked up with SELECTs instead.
+            Returns:
+               array of ids of headers found in the database, NO_KEY if not found
+        """
+        header_ids = np.full(len(key_values.index), CN.NO_KEY)
+        if key_values.empty:
+            return header_ids
+
+        if not LookupHeaderSql.use_tmp_table:
+            return LookupHeaderSql.select_header_ids(key_values, table, id_field, key_fields,
+                                                     sql_cur)
+
+        tmp_table = CN.TMP_PREFIX + table
+
+        try:
+            tmp_values = key_values.copy()
+            tmp_values.insert(0, 'row_num', range(len(tmp_values.index)))
+
+            sql_cur.execute(CN.DROP_TMP_HEADER.format(tmp_table))
+            sql_cur.execute(CN.CR_TMP_HEADER.format(tmp_table,
+                                                    ", ".join(table + "." + key
+                                                              for key in key_fields),
+                                                    table))
+            sql_cur.executemany(CN.INS_TMP_HEADER.format(tmp_table, ", ".join(key_fields),
+                                                         ", ".join(["%s"] * (len(key_fields) + 1))),
+                                tmp_values.values.tolist())
+
+            key_match = " AND ".join(table + "." + key + " <=> " + tmp_table + "." + key
+                                     for key in key_fields)
+            sql_cur.execute(CN.Q_TMP_HEADER.format(tmp_table, table, id_field, key_match))
+            for row_num, header_id in sql_cur.fetchall():
+                header_ids[row_num] = header_id
+
+            sql_cur.execute(CN.DROP_TMP_HEADER.format(tmp_table))
+
+        except pymysql.Error as sql_err:
+            logging.warning("!!! Not using a temporary table to look up headers: %s",
+                            str(sql_err))
+            LookupHeaderSql.use_tmp_table = False
+            return LookupHeaderSql.select_header_ids(key_values, table, id_field, key_fields,
+                                                     sql_cur)
+
+        except (RuntimeError, TypeError, NameError, KeyError):
+            logging.error("*** %s in get_header_ids ***", sys.exc_info()[0])
+
+        return header_ids
+
+    @staticmethod
+    def select_header_ids(key_values, table, id_field, key_fields, sql_cur):
+        """ Look up the headers without a temporary table, HEADER_QUERY_SIZE at a time.
+            Each header has its own SELECT, with NULL safe comparisons of the key fields,
+            and the SELECTs of a chunk are sent as one query joined by UNION ALL.
+            Returns:
+               array of ids of headers found in the database, NO_KEY if not found
+        """
+        header_ids = np.full(len(key_values.index), CN.NO_KEY)
+
+        key_match = " AND ".join(key + " <=> %s" for key in key_fields)
+        row_query = CN.Q_HEADER_ID.format(table, id_field, key_match)
+        key_rows = key_values.values.tolist()
+
+        try:
+            for first_row in range(0, len(key_rows), CN.HEADER_QUERY_SIZE):
+                chunk = key_rows[first_row:first_row + CN.HEADER_QUERY_SIZE]
+                query_args = []
+                for row_num, key_row in enumerate(chunk, first_row):
+                    query_args += [row_num] + key_row
+                sql_cur.execute(" UNION ALL ".join([row_query] * len(chunk)), query_args)
+                for row_num, header_id in sql_cur.fetchall():
+                    if header_id is not None:
+                        header_ids[row_num] = header_id
+
+        except (RuntimeError, TypeError, NameError, KeyError):
+            logging.error("*** %s in select_header_ids ***", sys.exc_info()[0])
+
+        return header_ids
+
+    @staticmethod
+    def hash_headers(key_data):
+        """ Find the unique headers of the lines, by a hash of the header keys of each line.
+            If two different headers have the same hash, the keys themselves are grouped.
+            Returns:
+               header number of each line, and row of the first line of each header
+        """
+        header_hash = pd.util.hash_pandas_object(key_data, index=False).values
+        header_codes = pd.factorize(header_hash)[0]
+        first_rows = np.unique(header_codes, return_index=True)[1]
+
+        # lines with the same hash must also have the same check hash
+        check_hash = pd.util.hash_pandas_object(key_data, index=False,
+                                                hash_key=CN.HASH_CHECK_KEY).values
+        if not np.array_equal(check_hash, check_hash[first_rows][header_codes]):
+            logging.warning("!!! Header hash collision, grouping header keys instead")
+            header_codes = key_data.groupby(list(key_data.columns), sort=False,
+                                            dropna=False).ngroup().values
+            first_rows = np.unique(header_codes, return_index=True)[1]
+
+        return header_codes, first_rows
+
+    @staticmethod
+    def add_header_ids(line_data, header_ids, header_codes, id_field):
+        """ Put the header id on each line. Lines are grouped in the order of their headers,
+            the same as a merge of the headers with the lines.
+            Returns:
+               line data with header ids
+        """
+        line_order = np.argsort(header_codes, kind='stable')
+        line_data = line_data.iloc[line_order].reset_index(drop=True)
+        line_data[id_field] = header_ids[header_codes[line_order]]
+        return line_data
+
+    @staticmethod
+    def get_key_values(key_data):
+        """ Make the header keys ready to send to the database. Dates become strings, and
+            MySQL nulls and missing values become None.
+            Returns:
+               dataframe of python objects
+        """
+        key_values = key_data.astype(object)
+
+        for key in key_values.columns:
+            if pd.api.types.is_datetime64_any_dtype(key_data[key]):
+                key_values[key] = key_data[key].dt.strftime("%Y-%m-%d %H:%M:%S")
+            elif key_data[key].dtype == object:
+                key_values[key] = key_data[key].map(
+                    lambda value: value.strftime("%Y-%m-%d %H:%M:%S")
+                    if isinstance(value, datetime) else value)
+
+        return key_values.where(key_values.notna() & (key_values != CN.MV_NULL), None)
+
+    @staticmethod
+    def hash_values(values):
+        """ Hash a list of header values, to use as a key in the header cache.
+            Returns:
+               hex digest
+        """
+        return hashlib.sha1(json.dumps(values, default=str).encode()).hexdigest()
+
+    @staticmethod
+    def cache_file(cache_dir, connection):
+        """ Name of the header cache file for a database.
+            Returns:
+               path of json file
+        """
+        return os.path.join(cache_dir, "{}_{}_{}.json".format(connection['db_host'],
+                                                              connection['db_port'],
+                                                              connection['db_database']))
+
+    @staticmethod
+    def get_table_check(table, id_field, check_id, sql_cur):
+        """ Get values that show whether a header table has been rebuilt: the max id,
+            the number of rows, and a hash of the row with id check_id.
+            Returns:
+               max id, row count, hash of row or None if there is no row
+        """
+        sql_cur.execute(CN.Q_HEADER_STATS.format(table, id_field))
+        max_id, row_count = sql_cur.fetchone()
+        if check_id is None:
+            check_id = max_id
+        sql_cur.execute(CN.Q_HEADER_ROW.format(table, id_field), [check_id])
+        check_row = sql_cur.fetchone()
+        if check_row is not None:
+            check_row = LookupHeaderSql.hash_values(list(check_row))
+        return max_id, row_count, check_row
+
+    @staticmethod
+    def read_cache(cache_file, sql_cur):
+        """ Read header ids saved by an earlier run. A table's headers are used only if the
+            table still has at least as many rows, and its row at the saved max id is unchanged.
+            Returns:
+               N/A
+        """
+        if not os.path.isfile(cache_file):
+            return
+
+        try:
+            with open(cache_file) as cache_json:
+                saved_cache = json.load(cache_json)
+
+            if saved_cache.get('version') != CN.HEADER_CACHE_VERSION:
+                logging.warning("!!! Header cache %s is an old version, not using it", cache_file)
+                return
+
+            for table, saved in saved_cache['tables'].items():
+                max_id, row_count, check_row = \
+                    LookupHeaderSql.get_table_check(table, saved['id_field'],
+                                                    saved['max_id'], sql_cur)
+                if max_id is None or row_count < saved['row_count'] or \
+                        max_id < saved['max_id'] or check_row != saved['check_row']:
+                    logging.warning("!!! Header cache for %s does not match database", table)
+                    continue
+                LookupHeaderSql.header_cache[table] = saved['headers']
+                LookupHeaderSql.header_id_fields[table] = saved['id_field']
+                logging.info("Header cache for %s: %s headers", table, len(saved['headers']))
+
+        except (RuntimeError, TypeError, NameError, KeyError, ValueError, OSError):
+            logging.error("*** %s in read_cache ***", sys.exc_info()[0])
+
+    @staticmethod
+    def write_cache(cache_file, sql_cur):
+        """ Save the header ids of this run, to use in later runs.
+            Returns:
+               N/A
+        """
+        saved_cache = {'version': CN.HEADER_CACHE_VERSION, 'tables': {}}
+
+        try:
+            for table, table_cache in LookupHeaderSql.header_cache.items():
+                if not table_cache:
+                    continue
+                id_field = LookupHeaderSql.header_id_fields[table]
+                max_id, row_count, check_row = \
+                    LookupHeaderSql.get_table_check(table, id_field, None, sql_cur)
+                saved_cache['tables'][table] = {'id_field': id_field, 'max_id': max_id,
+                                                'row_count': row_count, 'check_row': check_row,
+                                                'headers': table_cache}
+
+            # write a temporary file and rename it, so a partial file is never read
+            with open(cache_file + '.tmp', 'w') as cache_json:
+                json.dump(saved_cache, cache_json)
+            os.replace(cache_file + '.tmp', cache_file)
+
+        except (RuntimeError, TypeError, NameError, KeyError, OSError):
+            logging.error("*** %s in write_cache ***", sys.exc_info()[0])
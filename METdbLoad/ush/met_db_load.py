@@ -31,6 +31,7 @@ import constants as CN
 from read_load_xml import XmlLoadFile
 from read_data_files import ReadDataFiles
 from run_sql import RunSql
+from lookup_header_sql import LookupHeaderSql
 from write_file_sql import WriteFileSql
 from write_stat_sql import WriteStatSql
 from write_mode_sql import WriteModeSql
@@ -199,11 +200,38 @@ def main():
                 # for the first set of files, connect to the database
                 if set_count == 1:
                     sql_run = RunSql()
+                    RunSql.bulk_session = xml_loadfile.flags["bulk_session"]
                     sql_run.sql_on(xml_loadfile.connection)
-
-                    #  if drop_indexes is set to true, drop the indexes
-                    if xml_loadfile.flags["drop_indexes"]:
-                        sql_run.apply_indexes(True, sql_run.cur)
+                    RunSql.load_stream = xml_loadfile.flags["load_stream"]
+                    RunSql.insert_size = xml_loadfile.insert_size
+
+                    # use header ids saved by earlier runs, if they still match the database
+                    if xml_loadfile.flags["header_cache_dir"]:
+                        LookupHeaderSql.read_cache(
+                            LookupHeaderSql.cache_file(xml_loadfile.flags["header_cache_dir"],
+                                                       xml_loadfile.connection),
+                            sql_run.cur)
+                else:
+                    # connect again if the connection was lost while this set was read
+                    sql_run.check_connection()
+
+                # tables with indexes that this set of files is the first to write to
+                set_lines = {sql_table: line_count
+                             for sql_table, line_count in index_rows(file_data).items()
+                             if sql_table not in sql_run.index_tables}
+                sql_run.index_tables.update(set_lines)
+
+                #  if drop_indexes is set to true, drop the indexes of those tables
+                #  if it is auto, drop them for the tables that get many lines for their size
+                if not set_lines or not xml_loadfile.flags["drop_indexes"]:
+                    drop_tables = []
+                elif xml_loadfile.flags["drop_indexes"] == CN.AUTO_INDEXES:
+                    drop_tables = sql_run.auto_drop_tables(set_lines, sql_run.cur)
+                else:
+                    drop_tables = list(set_lines)
+                if drop_tables:
+                    sql_run.drop_tables.update(drop_tables)
+                    sql_run.apply_indexes(True, sql_run.cur, drop_tables)
 
                 # write the data file records out. put data file ids into other dataframes
                 write_file = WriteFileSql()
@@ -281,6 +309,11 @@ def main():
                                              sql_run.cur,
                                              sql_run.local_infile)
 
+                # commit this set of files before the next set is read, while the
+                # connection is still open. Its new headers can then be used by later sets
+                sql_run.commit_set()
+                LookupHeaderSql.keep_new_headers()
+
                 # Processing for the last set of data
                 if mid_file >= last_file:
                     # If any data was written, write to the metadata and instance_info tables
@@ -295,9 +328,23 @@ def main():
                                                       sql_run.cur,
                                                       sql_run.local_infile)
 
-                    #  if apply_indexes is set to true, load the indexes
-                    if xml_loadfile.flags["apply_indexes"]:
-                        sql_run.apply_indexes(False, sql_run.cur)
+                    # save the header ids for later runs
+                    if xml_loadfile.flags["header_cache_dir"]:
+                        LookupHeaderSql.write_cache(
+                            LookupHeaderSql.cache_file(xml_loadfile.flags["header_cache_dir"],
+                                                       xml_loadfile.connection),
+                            sql_run.cur)
+
+                    #  if apply_indexes is set to true, load the indexes of the tables written to
+                    #  if it is auto, load the indexes that were dropped
+                    if xml_loadfile.flags["apply_indexes"] == CN.AUTO_INDEXES:
+                        apply_tables = sql_run.drop_tables
+                    elif xml_loadfile.flags["apply_indexes"]:
+                        apply_tables = sql_run.index_tables
+                    else:
+                        apply_tables = set()
+                    if apply_tables:
+                        sql_run.apply_indexes(False, sql_run.cur, apply_tables)
 
                     if sql_run.conn.open:
                         sql_run.sql_off(sql_run.conn, sql_run.cur)
@@ -356,6 +403,31 @@ def next_set(mid_file, last_file):
     return first_file, mid_file, last_file
 
 
+def index_rows(file_data):
+    """ count the lines read for each table with indexes
+        Returns:
+           dictionary of line counts by table
+    """
+    table_rows = {}
+
+    if not file_data.stat_data.empty:
+        table_rows[CN.STAT_HEADER] = len(file_data.stat_data.index)
+        for line_type, line_count in file_data.stat_data[CN.LINE_TYPE].value_counts().items():
+            table_rows['line_data_' + line_type.lower()] = line_count
+
+    mode_count = len(file_data.mode_cts_data.index) + len(file_data.mode_obj_data.index)
+    if mode_count:
+        table_rows[CN.MODE_HEADER] = mode_count
+
+    mtd_count = len(file_data.mtd_2d_data.index) + len(file_data.mtd_3d_single_data.index) + \
+        len(file_data.mtd_3d_pair_data.index)
+    if mtd_count:
+        table_rows[CN.MTD_HEADER] = mtd_count
+
+    return {sql_table: line_count for sql_table, line_count in table_rows.items()
+            if sql_table in CN.INDEX_COLUMNS}
+
+
 def purge_files(load_files, xml_flags):
     """ remove any files from load list that user has disallowed in XML tags
         Returns:
@@ -17,6 +17,7 @@ Copyright 2020 UCAR/NCAR/RAL, CSU/CIRES, Regents of the University of Colorado,
 
 import sys
 import os
+import re
 from pathlib import Path
 import logging
 import time
@@ -27,6 +28,9 @@ import pandas as pd
 
 import constants as CN
 
+from scan_data_files import ScanDataFiles
+from read_file_cache import ReadFileCache
+
 
 class ReadDataFiles:
     """! Class to read in data files given in load_spec file
@@ -36,6 +40,9 @@ class ReadDataFiles:
 
     def __init__(self):
         self.cache = {}
+        self.read_engine = CN.PANDAS_ENGINE
+        self.stat_line_types = None
+        self.file_cache = None
         self.stat_data = pd.DataFrame()
         self.mode_cts_data = pd.DataFrame()
         self.mode_obj_data = pd.DataFrame()
@@ -85,6 +92,25 @@ class ReadDataFiles:
         # keep track of each set of revisions
         rev_ctr = 0
 
+        # use the reader for whitespace delimited files that was chosen in the XML
+        self.read_engine = load_flags['read_engine']
+
+        # line types to load or skip, applied while reading stat files
+        self.stat_line_types = self.get_stat_line_types(load_flags, line_types)
+
+        # files that do not have any lines to load
+        skipped_rows = []
+
+        # files that were read on an earlier load can come from the cache
+        if load_flags['cache_dir']:
+            self.file_cache = ReadFileCache(load_flags['cache_dir'])
+
+        # where the frame from each kind of file goes
+        file_lists = {CN.STAT: list_frames, CN.VSDB_POINT_STAT: list_vsdb,
+                      CN.MODE_CTS: list_cts, CN.MODE_OBJ: list_obj, CN.TCST: list_tcst,
+                      CN.MTD_2D: list_2d, CN.MTD_3D_SS: list_single, CN.MTD_3D_SC: list_single,
+                      CN.MTD_3D_PS: list_pair, CN.MTD_3D_PC: list_pair}
+
         try:
 
             # Put the list of files into a dataframe to collect info to write to database
@@ -130,12 +156,32 @@ class ReadDataFiles:
                                              time.localtime(stat_info.st_mtime))
                     self.data_files.at[row_num, CN.MOD_DATE] = mod_date
 
+                    # files are cached for the engine that read them, as the engines can give
+                    # different column types, and stat files for their line type filters
+                    read_spec = (self.read_engine,
+                                 self.stat_line_types if lu_id == CN.STAT else None)
+
+                    # use the frame from an earlier read of the same file, if it is cached
+                    if self.file_cache is not None:
+                        cache_file = self.file_cache.read_frame(filename, stat_info, read_spec)
+                        if cache_file is not None:
+                            cache_file[CN.FILE_ROW] = row_num
+                            # revisions are numbered across files, so they are not cached
+                            if lu_id == CN.MTD_2D and self.is_mtd_revision(cache_file):
+                                cache_file, rev_ctr = self.add_mtd_revisions(cache_file, rev_ctr)
+                            file_lists[lu_id].append(cache_file)
+                            logging.debug("Lines in %s: %s", filename,
+                                          str(len(cache_file.index)))
+                            continue
+
                     #
                     # Process stat files
                     #
                     if lu_id == CN.STAT:
                         # Get the first line of the .stat file that has the headers
-                        file_hdr = pd.read_csv(filename, delim_whitespace=True,
+                        # the python engine pads the line to MAX_COL columns, where newer
+                        # versions of the C engine fail on a line with fewer columns
+                        file_hdr = pd.read_csv(filename, sep=r'\s+', engine='python',
                                                names=range(CN.MAX_COL), nrows=1)
 
                         # MET file has no headers or no text - it's empty
@@ -143,6 +189,14 @@ class ReadDataFiles:
                             logging.warning("!!! Stat file %s is empty", filename)
                             continue
 
+                        # skip files that can not have any of the line types to load
+                        if self.stat_line_types is not None and \
+                                not ScanDataFiles.has_line_types(filename,
+                                                                 self.stat_line_types[0]):
+                            logging.debug("No line types to load in %s", filename)
+                            skipped_rows.append(row_num)
+                            continue
+
                         # Add a DESC column if the data file does not have one
                         if not file_hdr.iloc[0].str.contains(CN.UC_DESC).any():
                             hdr_names = CN.SHORT_HEADER + CN.COL_NUMS
@@ -165,6 +219,12 @@ class ReadDataFiles:
                             hdr_names = CN.LONG_HEADER + CN.COL_NUMS
                             one_file = self.read_stat(filename, hdr_names)
 
+                        # all of the lines had line types that are not loaded
+                        if one_file.empty and self.stat_line_types is not None:
+                            logging.debug("No line types to load in %s", filename)
+                            skipped_rows.append(row_num)
+                            continue
+
                         # add line numbers and count the header line, for stat files
                         one_file[CN.LINE_NUM] = one_file.index + 2
 
@@ -183,32 +243,8 @@ class ReadDataFiles:
                             logging.warning("!!! Vsdb file %s is empty", filename)
                             continue
 
-                        # read each line in as 1 column so some fixes can be made
-                        vsdb_file = pd.read_csv(filename, sep=CN.SEP, header=None)
-
-                        if vsdb_file.iloc[:, 0].str.contains('=').any():
-
-                            # split vsdb data into 2 columns - before the =, and after
-                            # this protects from changing weird variable names, and removes =
-                            split_file = vsdb_file.iloc[:, 0].str.split('=', expand=True)
-
-                            # put space in front of hyphen between numbers in case space is missing
-                            # FHO can have negative thresh - fix with regex, only between numbers
-                            split_file.iloc[:, 1] = \
-                                split_file.iloc[:, 1].str.replace(r'(\d)-(\d)', r'\1 -\2')
-
-                            # merge the two halves together again
-                            vsdb_file = split_file.iloc[:, 0] + ' ' + split_file.iloc[:, 1]
-
-                        else:
-                            vsdb_file = vsdb_file.iloc[:, 0]
-
-                        # break fields out, separated by 1 or more spaces
-                        vsdb_file = vsdb_file.str.split(' +', expand=True)
-
-                        # add column names
-                        hdr_names = CN.VSDB_HEADER + CN.COL_NUMS
-                        vsdb_file.columns = hdr_names[:len(vsdb_file.columns)]
+                        # read the vsdb file into typed columns
+                        vsdb_file = self.read_vsdb(filename)
 
                         # add line numbers, starting at 1
                         vsdb_file.insert(9, CN.LINE_NUM, vsdb_file.index + 1)
@@ -285,6 +321,9 @@ class ReadDataFiles:
                         # initially, match line data to the index of the file names
                         mode_file[CN.FILE_ROW] = row_num
 
+                        if self.file_cache is not None:
+                            self.file_cache.write_frame(filename, stat_info, mode_file)
+
                         # determine which types of records are in the file
                         if lu_id == CN.MODE_CTS:
                             # mode_cts
@@ -297,7 +336,9 @@ class ReadDataFiles:
                     #
                     elif lu_id == CN.TCST:
                         # Get the first line of the .tcst file that has the headers
-                        file_hdr = pd.read_csv(filename, delim_whitespace=True,
+                        # the python engine pads the line to MAX_COL columns, where newer
+                        # versions of the C engine fail on a line with fewer columns
+                        file_hdr = pd.read_csv(filename, sep=r'\s+', engine='python',
                                                names=range(CN.MAX_COL), nrows=1)
                         # TCST file has no headers or no text - it's empty
                         if file_hdr.empty or stat_info.st_size == 0:
@@ -397,6 +438,9 @@ class ReadDataFiles:
                         # initially, match line data to the index of the file names
                         mtd_file[CN.FILE_ROW] = row_num
 
+                        if self.file_cache is not None:
+                            self.file_cache.write_frame(filename, stat_info, mtd_file)
+
                         # determine which types of records are in the file
                         if lu_id in (CN.MTD_3D_SS, CN.MTD_3D_SC):
                             # MTD single
@@ -406,57 +450,8 @@ class ReadDataFiles:
                             list_pair.append(mtd_file)
                         # MTD 2D
                         else:
-                            # This is an MTD 2D Revision file if 10 columns each have a single value
-                            mtd_rev = True
-                            for mtd_col in CN.MTD_2D_REV_FIELDS:
-                                if not (mtd_file[mtd_col] == mtd_file[mtd_col][0]).all():
-                                    mtd_rev = False
-                            if mtd_rev:
-                                rev_lines = []
-                                obj_id = 'new'
-                                obj_ct = 1
-                                # Create new rows by subtracting a previous row from a row by object
-                                # Unique sequential id is assigned to items with the same object id
-                                # Only object ids with more than 2 lines count and create lines
-                                for row_num, mtd_row in mtd_file.iterrows():
-                                    if mtd_row[CN.OBJECT_ID] == obj_id:
-                                        obj_ct += 1
-                                        if obj_ct == 3:
-                                            rev_ctr += 1
-                                        if obj_ct > 2:
-                                            new_line = mtd_file.iloc[row_num - 1].to_dict()
-                                            new_line[CN.FCST_VAR] = 'REV_' + new_line[CN.FCST_VAR]
-                                            new_line[CN.OBS_VAR] = 'REV_' + new_line[CN.OBS_VAR]
-                                            new_line[CN.AREA] -= mtd_file[CN.AREA][row_num - 2]
-                                            new_line[CN.CENTROID_X] -= \
-                                                mtd_file[CN.CENTROID_X][row_num - 2]
-                                            new_line[CN.CENTROID_Y] -= \
-                                                mtd_file[CN.CENTROID_Y][row_num - 2]
-                                            new_line[CN.CENTROID_LAT] -= \
-                                                mtd_file[CN.CENTROID_LAT][row_num - 2]
-                                            new_line[CN.CENTROID_LON] -= \
-                                                mtd_file[CN.CENTROID_LON][row_num - 2]
-                                            new_line[CN.AXIS_ANG] = CN.MV_NOTAV
-                                            new_line[CN.INTENSITY_10] -= \
-                                                mtd_file[CN.INTENSITY_10][row_num - 2]
-                                            new_line[CN.INTENSITY_25] -= \
-                                                mtd_file[CN.INTENSITY_25][row_num - 2]
-                                            new_line[CN.INTENSITY_50] -= \
-                                                mtd_file[CN.INTENSITY_50][row_num - 2]
-                                            new_line[CN.INTENSITY_75] -= \
-                                                mtd_file[CN.INTENSITY_75][row_num - 2]
-                                            new_line[CN.INTENSITY_90] -= \
-                                                mtd_file[CN.INTENSITY_90][row_num - 2]
-                                            new_line[CN.REVISION_ID] = rev_ctr
-                                            new_line[CN.LINENUMBER] = 0
-                                            rev_lines.append(new_line)
-                                    else:
-                                        obj_id = mtd_row[CN.OBJECT_ID]
-                                        obj_ct = 1
-                                rev_df = pd.DataFrame(rev_lines)
-                                mtd_file = pd.concat([mtd_file, rev_df], ignore_index=True,
-                                                     sort=False)
-                                rev_df = rev_df.iloc[0:0]
+                            if self.is_mtd_revision(mtd_file):
+                                mtd_file, rev_ctr = self.add_mtd_revisions(mtd_file, rev_ctr)
                             # concat new rows with mtd_file
                             list_2d.append(mtd_file)
 
@@ -467,6 +462,8 @@ class ReadDataFiles:
                     if not one_file.empty:
                         # initially, match line data to the index of the file names
                         one_file[CN.FILE_ROW] = row_num
+                        if self.file_cache is not None:
+                            self.file_cache.write_frame(filename, stat_info, one_file, read_spec)
                         # keep the dataframes from each file in a list
                         list_frames.append(one_file)
                         logging.debug("Lines in %s: %s", filename,
@@ -476,6 +473,8 @@ class ReadDataFiles:
                             file_hdr = file_hdr.iloc[0:0]
                     elif not vsdb_file.empty:
                         vsdb_file.insert(10, CN.FILE_ROW, row_num)
+                        if self.file_cache is not None:
+                            self.file_cache.write_frame(filename, stat_info, vsdb_file)
                         list_vsdb.append(vsdb_file)
                         logging.debug("Lines in %s: %s", filename,
                                       str(len(vsdb_file.index)))
@@ -489,6 +488,8 @@ class ReadDataFiles:
                     elif not tcst_file.empty:
                         # initially, match line data to the index of the file names
                         tcst_file[CN.FILE_ROW] = row_num
+                        if self.file_cache is not None:
+                            self.file_cache.write_frame(filename, stat_info, tcst_file)
                         # keep the dataframes from each file in a list
                         list_tcst.append(tcst_file)
                         logging.debug("Lines in %s: %s", filename,
@@ -511,6 +512,15 @@ class ReadDataFiles:
 
             # end for row
 
+            if self.file_cache is not None and self.file_cache.cache_dir is not None:
+                logging.info("Files read from cache: %s, files parsed: %s",
+                             self.file_cache.hits, self.file_cache.misses)
+
+            # remove files that were skipped because they have no lines to load
+            if skipped_rows:
+                self.data_files.drop(skipped_rows, inplace=True)
+                self.data_files.reset_index(drop=True, inplace=True)
+
         except (RuntimeError, TypeError, NameError, KeyError):
             logging.error("*** %s in read_data upper ***", sys.exc_info()[0])
 
@@ -522,79 +532,8 @@ class ReadDataFiles:
                 all_stat = pd.concat(list_frames, ignore_index=True, sort=False)
                 list_frames = []
 
-                # if a fcst percentage thresh is used, it is in parens in fcst_thresh
-                if all_stat.fcst_thresh.str.contains(CN.L_PAREN, regex=False).any():
-                    # save the value in parens
-                    all_stat.loc[all_stat.fcst_thresh.str.contains(CN.L_PAREN, regex=False) &
-                                 all_stat.fcst_thresh.str.contains(CN.R_PAREN, regex=False),
-                                 CN.FCST_PERC] = \
-                        all_stat.loc[all_stat.fcst_thresh.str.contains(CN.L_PAREN, regex=False) &
-                                     all_stat.fcst_thresh.str.contains(CN.R_PAREN, regex=False),
-                                     CN.FCST_THRESH].str.split(CN.L_PAREN).str[1]. \
-                        str.split(CN.R_PAREN).str[0].astype(float)
-                    # remove the percentage from fcst_thresh
-                    all_stat.loc[all_stat.fcst_thresh.str.contains(CN.L_PAREN, regex=False) &
-                                 all_stat.fcst_thresh.str.contains(CN.R_PAREN, regex=False),
-                                 CN.FCST_THRESH] = \
-                        all_stat.loc[all_stat.fcst_thresh.str.contains(CN.L_PAREN, regex=False) &
-                                     all_stat.fcst_thresh.str.contains(CN.R_PAREN, regex=False),
-                                     CN.FCST_THRESH].str.split(CN.L_PAREN).str[0]
-
-                # if an obs percentage thresh is used, it is in parens in obs_thresh
-                if all_stat.obs_thresh.str.contains(CN.L_PAREN, regex=False).any():
-                    # save the value in parens
-                    all_stat.loc[all_stat.obs_thresh.str.contains(CN.L_PAREN, regex=False) &
-                                 all_stat.obs_thresh.str.contains(CN.R_PAREN, regex=False),
-                                 CN.OBS_PERC] = \
-                        all_stat.loc[all_stat.obs_thresh.str.contains(CN.L_PAREN, regex=False) &
-                                     all_stat.obs_thresh.str.contains(CN.R_PAREN, regex=False),
-                                     CN.OBS_THRESH].str.split(CN.L_PAREN).str[1]. \
-                        str.split(CN.R_PAREN).str[0].astype(float)
-                    all_stat.loc[all_stat.obs_thresh.str.contains(CN.L_PAREN, regex=False) &
-                                 all_stat.obs_thresh.str.contains(CN.R_PAREN, regex=False),
-                                 CN.OBS_THRESH] = \
-                        all_stat.loc[all_stat.obs_thresh.str.contains(CN.L_PAREN, regex=False) &
-                                     all_stat.obs_thresh.str.contains(CN.R_PAREN, regex=False),
-                                     CN.OBS_THRESH].str.split(CN.L_PAREN).str[0]
-
-                # These warnings and transforms only apply to stat files
-                # Give a warning message with data if value of alpha for an alpha line type is NA
-                # Do not check CNT and PSTD, even though they are alpha line types
-                alpha_lines = all_stat[(all_stat.line_type.isin(CN.ALPHA_LINE_TYPES[:-2])) &
-                                       (all_stat.alpha == CN.NOTAV)].line_type
-                if not alpha_lines.empty:
-                    logging.warning("!!! ALPHA line_type has ALPHA value of NA:\r\n %s",
-                                    str(alpha_lines))
-
-                # give a warning message with data if non-alpha line type has float value
-                non_alpha_lines = all_stat[(~all_stat.line_type.isin(CN.ALPHA_LINE_TYPES)) &
-                                           (all_stat.alpha != CN.NOTAV)].line_type
-                if not non_alpha_lines.empty:
-                    logging.warning("!!! non-ALPHA line_type has ALPHA float value:\r\n %s",
-                                    str(non_alpha_lines))
-
-                # Change ALL items in column ALPHA to '-9999' if they are 'NA'
-                all_stat.loc[all_stat.alpha == CN.NOTAV, CN.ALPHA] = CN.MV_NOTAV
-
-                # Make ALPHA column into a decimal with no trailing zeroes after the decimal
-                all_stat.alpha = all_stat.alpha.astype(float).map('{0:g}'.format)
-
-                # Change ALL items in column COV_THRESH to '-9999' if they are 'NA'
-                all_stat.loc[all_stat.cov_thresh == CN.NOTAV, CN.COV_THRESH] = CN.MV_NOTAV
-
-                # Change ALL items in column FCST_LEAD to 0 if they are 'NA'
-                # Added for tc_gen files
-                if not all_stat.fcst_lead.dtypes == 'int':
-                    all_stat.loc[all_stat.fcst_lead == CN.NOTAV, CN.FCST_LEAD] = 0
-
-                # Change ALL items in column OBS_LEAD to 0 if they are 'NA'
-                if not all_stat.obs_lead.dtypes == 'int':
-                    all_stat.loc[all_stat.obs_lead == CN.NOTAV, CN.OBS_LEAD] = 0
-
-                # Change 'NA' values in column INTERP_PNTS to 0 if present
-                if not all_stat.interp_pnts.dtypes == 'int':
-                    all_stat.loc[all_stat.interp_pnts == CN.NOTAV, CN.INTERP_PNTS] = 0
-                    all_stat.interp_pnts = all_stat.interp_pnts.astype(int)
+                # split percentiles out of thresholds, and fix alpha, leads, and NA values
+                self.normalize_stat(all_stat)
 
                 # PCT lines in stat files are short one row, subtract 1 from n_thresh
                 if all_stat[CN.LINE_TYPE].eq(CN.PCT).any():
@@ -765,13 +704,11 @@ class ReadDataFiles:
                                              CN.COL_NAS[:93] + [CN.LINE_NUM, CN.FILE_ROW]]
 
                     elif vsdb_type == CN.RHIST:
-                        # rhist ranks need to be multiplied by 100. First convert to float.
-                        vsdb_data[CN.COL_NUMS[0:vsdb_data[CN.N_VAR][1]]] = \
-                            vsdb_data[CN.COL_NUMS[0:vsdb_data[CN.N_VAR][1]]].astype(float)
-                        vsdb_data[CN.COL_NUMS[0:vsdb_data[CN.N_VAR][1]]] *= 100
+                        # rhist ranks need to be multiplied by 100
+                        n_max = self.convert_vsdb_ranks(vsdb_data, 100)
                         one_file = vsdb_data[CN.LONG_HEADER + [CN.TOTAL_LC, CN.N_VAR] +
-                                             CN.COL_NUMS[0:vsdb_data[CN.N_VAR][1]] +
-                                             CN.COL_NAS[:(99 - vsdb_data[CN.N_VAR][1])] +
+                                             CN.COL_NUMS[0:n_max] +
+                                             CN.COL_NAS[:(99 - n_max)] +
                                              [CN.LINE_NUM, CN.FILE_ROW]]
 
                     elif vsdb_type == CN.PCT:
@@ -789,64 +726,28 @@ class ReadDataFiles:
                         # all 3 sets of columns need to be float
                         vsdb_data[CN.COL_NUMS[0:-2]] = \
                             vsdb_data[CN.COL_NUMS[0:-2]].astype(float)
-                        # the total in line_data_pct is the total of all of the subtotals
-                        # calculated per row as there may be rows with different values of n_var
-                        col_total = vsdb_data.columns.get_loc(CN.TOTAL_LC)
                         # calculate thresh and re-order values to be
                         # in sets of thresh_i, oy_i, and on_i (which is subtotal - oy_i)
-                        for index, row in vsdb_data.iterrows():
-                            var_values = []
-                            n_var = row[CN.N_VAR]
-                            col_start = zero_col + n_var
-                            col_end = col_start + n_var
-                            vsdb_data.iloc[index, col_total] = row[col_start:col_end].sum()
-                            for i in range(n_var):
-                                var_values = var_values + [i/(n_var - 1)]
-                                var_values = var_values + [row[str(i)]]
-                                var_values = var_values + [row[str(i+n_var)] - row[str(i)]]
-                            df_values = pd.DataFrame([var_values])
-                            # put calculated and re-ordered values back into vsdb_data
-                            vsdb_data.iloc[index, zero_col:zero_col + (n_var * 3)] = \
-                                df_values.iloc[0, 0:n_var * 3].values
+                        self.convert_vsdb_pct(vsdb_data)
                         one_file = vsdb_data[CN.LONG_HEADER + [CN.TOTAL_LC, CN.N_VAR] +
                                              CN.COL_NUMS[0:-2] +
                                              [CN.LINE_NUM, CN.FILE_ROW]]
 
                     elif vsdb_type == CN.RELP:
+                        n_max = self.convert_vsdb_ranks(vsdb_data)
                         one_file = vsdb_data[CN.LONG_HEADER + [CN.TOTAL_LC, CN.N_VAR] +
-                                             CN.COL_NUMS[0:vsdb_data[CN.N_VAR][1]] +
-                                             CN.COL_NAS[:(99 - vsdb_data[CN.N_VAR][1])] +
+                                             CN.COL_NUMS[0:n_max] +
+                                             CN.COL_NAS[:(99 - n_max)] +
                                              [CN.LINE_NUM, CN.FILE_ROW]]
 
                     elif vsdb_type == CN.ECLV:
-                        n_var = vsdb_data.loc[0, CN.N_VAR]
-                        # first data column
-                        zero_col = vsdb_data.columns.get_loc('0')
-                        # new last data column after data is doubled
-                        last_col = zero_col + (n_var * 2) - 1
-                        # current last data column
-                        mid_col = zero_col + n_var - 1
-                        # counter for constants that will be added to double the data
-                        last_point = n_var - 1
-                        n_var_col = vsdb_data.columns.get_loc(CN.N_VAR)
-                        top_col = int(vsdb_data.columns[n_var_col - 1])
-                        # add extra columns to vsdb_data if needed for doubling of columns
-                        if top_col < last_col:
-                            vsdb_data = \
-                                vsdb_data.reindex(columns=[*vsdb_data.columns.tolist()[0:n_var_col],
-                                                           *CN.COL_NUMS[top_col + 1: last_col + 1],
-                                                           *vsdb_data.columns.tolist()[n_var_col:]],
-                                                  fill_value=CN.MV_NOTAV)
-                        for i in range(n_var):
-                            vsdb_data.iloc[:, last_col] = vsdb_data.iloc[:, mid_col]
-                            vsdb_data.iloc[:, last_col - 1] = CN.X_POINTS_ECON[last_point]
-                            last_col = last_col - 2
-                            mid_col = mid_col - 1
-                            last_point = last_point - 1
+                        # values are doubled up, with constants for the x points
+                        n_max = self.convert_vsdb_eclv(vsdb_data)
                         one_file = vsdb_data[CN.LONG_HEADER + [CN.TOTAL_LC] +
                                              CN.COL_NAS[:2] + [CN.N_VAR] +
-                                             CN.COL_NUMS[0:36] +
-                                             CN.COL_NAS[:61] + [CN.LINE_NUM, CN.FILE_ROW]]
+                                             CN.COL_NUMS[0:n_max * 2] +
+                                             CN.COL_NAS[:(97 - n_max * 2)] +
+                                             [CN.LINE_NUM, CN.FILE_ROW]]
 
                     elif vsdb_type == CN.PSTD:
                         one_file = vsdb_data[CN.LONG_HEADER + [CN.TOTAL_LC] +
@@ -1013,7 +914,7 @@ class ReadDataFiles:
                 all_stat.reset_index(drop=True, inplace=True)
 
                 # if all lines from a stat or vsdb file were deleted, remove filename
-                files_to_drop = ~self.data_files.index.isin(all_stat[CN.FILE_ROW])
+                files_to_drop = ~self.data_files[CN.FILE_ROW].isin(all_stat[CN.FILE_ROW])
                 files_stat = self.data_files[CN.DATA_FILE_LU_ID].isin([CN.VSDB_POINT_STAT,
                                                                        CN.STAT])
                 self.data_files.drop(self.data_files[files_to_drop & files_stat].index,
@@ -1061,7 +962,7 @@ class ReadDataFiles:
                 all_tcst.reset_index(drop=True, inplace=True)
 
                 # if all lines from a tcst file were deleted, remove filename
-                files_to_drop = ~self.data_files.index.isin(all_tcst[CN.FILE_ROW])
+                files_to_drop = ~self.data_files[CN.FILE_ROW].isin(all_tcst[CN.FILE_ROW])
                 files_tcsp = self.data_files[CN.DATA_FILE_LU_ID] == CN.TCST
                 self.data_files.drop(self.data_files[files_to_drop & files_tcsp].index,
                                      inplace=True)
@@ -1161,29 +1062,46 @@ class ReadDataFiles:
 
     def read_stat(self, filename, hdr_names):
         """ Read in all of the lines except the header of a stat file.
+            Lines with line types that are not loaded are skipped while reading.
             Returns:
                all the stat lines in a dataframe, with dates converted to datetime
         """
+        date_cols = [CN.FCST_VALID_BEG, CN.FCST_VALID_END, CN.OBS_VALID_BEG, CN.OBS_VALID_END]
+        stat_file = self.scan_file(filename, hdr_names, date_cols, self.stat_line_types)
+        if stat_file is not None:
+            return stat_file
+
+        # give pandas only the lines to load, and keep the line numbers of the whole file
+        stat_source = filename
+        kept_rows = None
+        if self.stat_line_types is not None:
+            filtered = ScanDataFiles.filter_file(filename, hdr_names, self.stat_line_types)
+            if filtered is not None:
+                stat_source, kept_rows = filtered
+
         # added the low_memory=False option when getting a DtypeWarning
-        return pd.read_csv(filename, delim_whitespace=True,
-                           names=hdr_names, skiprows=1,
-                           parse_dates=[CN.FCST_VALID_BEG,
-                                        CN.FCST_VALID_END,
-                                        CN.OBS_VALID_BEG,
-                                        CN.OBS_VALID_END],
-                           date_parser=self.cached_date_parser,
-                           keep_default_na=False, na_values='', low_memory=False)
+        stat_file = pd.read_csv(stat_source, delim_whitespace=True,
+                                names=hdr_names, skiprows=1,
+                                parse_dates=date_cols,
+                                date_parser=self.cached_date_parser,
+                                keep_default_na=False, na_values='', low_memory=False)
+        if kept_rows is not None:
+            stat_file.index = kept_rows
+        return stat_file
 
     def read_tcst(self, filename, hdr_names):
         """ Read in all of the lines except the header of a tcst file.
             Returns:
                all the tcst lines in a dataframe, with dates converted to datetime
         """
+        date_cols = [CN.INIT, CN.VALID]
+        tcst_file = self.scan_file(filename, hdr_names, date_cols)
+        if tcst_file is not None:
+            return tcst_file
         # added the low_memory=False option when getting a DtypeWarning
         return pd.read_csv(filename, delim_whitespace=True,
                            names=hdr_names, skiprows=1,
-                           parse_dates=[CN.INIT,
-                                        CN.VALID],
+                           parse_dates=date_cols,
                            date_parser=self.cached_date_parser,
                            keep_default_na=False, na_values='', low_memory=False)
 
@@ -1208,10 +1126,297 @@ class ReadDataFiles:
             Returns:
                all the mode lines in a dataframe, with dates converted to datetime
         """
+        date_cols = [CN.FCST_VALID, CN.OBS_VALID]
+        mode_file = self.scan_file(filename, hdr_names, date_cols)
+        if mode_file is not None:
+            return mode_file
         # added the low_memory=False option when getting a DtypeWarning
         return pd.read_csv(filename, delim_whitespace=True,
                            names=hdr_names, skiprows=1,
-                           parse_dates=[CN.FCST_VALID,
-                                        CN.OBS_VALID],
+                           parse_dates=date_cols,
                            date_parser=self.cached_date_parser,
                            keep_default_na=False, na_values='', low_memory=False)
+
+    def scan_file(self, filename, hdr_names, date_cols, line_types=None):
+        """ If the mmap read engine was chosen, read a file with the NumPy scanner.
+            Returns:
+               dataframe of the lines in the file, or None if pandas should read the file
+        """
+        if self.read_engine != CN.MMAP_ENGINE:
+            return None
+        scan_data = ScanDataFiles.read_file(filename, hdr_names, date_cols, line_types)
+        if scan_data is None:
+            logging.debug("Reading %s with pandas instead of the scanner", filename)
+        return scan_data
+
+    def read_vsdb(self, filename):
+        """ Read in all of the lines of a VSDB file, which has no header line.
+            With the mmap read engine, the columns are typed the same way whether or not
+            the scanner could read the file. Otherwise, all of the columns are strings.
+            Returns:
+               all the vsdb lines in a dataframe, with names from VSDB_HEADER and COL_NUMS
+        """
+        hdr_names = CN.VSDB_HEADER + CN.COL_NUMS
+        # header fields other than lead and valid time stay strings
+        str_cols = [hdr for hdr in CN.VSDB_HEADER
+                    if hdr not in (CN.FCST_LEAD, CN.FCST_VALID_BEG)]
+        if self.read_engine == CN.MMAP_ENGINE:
+            vsdb_file = ScanDataFiles.read_vsdb(filename, hdr_names, [CN.FCST_VALID_BEG],
+                                                str_cols)
+            if vsdb_file is not None:
+                return vsdb_file
+            logging.debug("Reading %s as strings instead of with the scanner", filename)
+
+        # read each line in as 1 column so some fixes can be made
+        vsdb_file = pd.read_csv(filename, sep=CN.SEP, header=None)
+
+        if vsdb_file.iloc[:, 0].str.contains('=').any():
+
+            # split vsdb data into 2 columns - before the =, and after
+            # this protects from changing weird variable names, and removes =
+            split_file = vsdb_file.iloc[:, 0].str.split('=', expand=True)
+
+            # put space in front of hyphen between numbers in case space is missing
+            # FHO can have negative thresh - fix with regex, only between numbers
+            split_file.iloc[:, 1] = \
+                split_file.iloc[:, 1].str.replace(r'(\d)-(\d)', r'\1 -\2')
+
+            # merge the two halves together again
+            vsdb_file = split_file.iloc[:, 0] + ' ' + split_file.iloc[:, 1]
+
+        else:
+            vsdb_file = vsdb_file.iloc[:, 0]
+
+        # break fields out, separated by 1 or more spaces
+        vsdb_file = vsdb_file.str.split(' +', expand=True)
+
+        # add column names
+        vsdb_file.columns = hdr_names[:len(vsdb_file.columns)]
+
+        # give the columns the types the scanner gives them, so files read either way
+        # have the same types when they are put together
+        if self.read_engine == CN.MMAP_ENGINE:
+            for col_name in vsdb_file.columns:
+                if col_name in str_cols:
+                    continue
+                try:
+                    if col_name == CN.FCST_VALID_BEG:
+                        vsdb_file[col_name] = pd.to_datetime(vsdb_file[col_name],
+                                                             format='%Y%m%d%H')
+                    else:
+                        vsdb_file[col_name] = pd.to_numeric(vsdb_file[col_name])
+                except ValueError:
+                    # like the scanner, leave columns that are not numbers as strings
+                    pass
+        return vsdb_file
+
+    @staticmethod
+    def convert_vsdb_pct(vsdb_data):
+        """ For VSDB PCT lines, the first set of n_var columns are oy_i and the second
+            set are subtotals. Replace them with sets of thresh_i, oy_i, and on_i,
+            and set the total to the sum of the subtotals. There may be rows with
+            different values of n_var, so all of the rows with the same n_var are done together.
+            Returns:
+               N/A
+        """
+        data_cols = CN.COL_NUMS[0:-2]
+        values = vsdb_data[data_cols].to_numpy(dtype=float)
+        totals = vsdb_data[CN.TOTAL_LC].to_numpy(dtype=float)
+        n_vars = vsdb_data[CN.N_VAR].to_numpy()
+
+        for n_var in np.unique(n_vars):
+            rows = np.flatnonzero(n_vars == n_var)
+            oy_values = values[rows, 0:n_var]
+            subtotals = values[rows, n_var:n_var * 2]
+            totals[rows] = np.nansum(subtotals, axis=1)
+            var_values = np.empty((rows.size, n_var, 3))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                var_values[:, :, 0] = np.arange(n_var) / (n_var - 1)
+            var_values[:, :, 1] = oy_values
+            var_values[:, :, 2] = subtotals - oy_values
+            values[rows, 0:n_var * 3] = var_values.reshape(rows.size, n_var * 3)
+
+        vsdb_data[CN.TOTAL_LC] = totals
+        vsdb_data[data_cols] = values
+
+    @staticmethod
+    def convert_vsdb_ranks(vsdb_data, multiplier=None):
+        """ For VSDB RHIST and RELP lines, keep the first n_var values of each row,
+            multiplied if needed, and set the rest to not available.
+            Rows can have different values of n_var.
+            Returns:
+               the largest n_var
+        """
+        n_vars = vsdb_data[CN.N_VAR].to_numpy()
+        n_max = n_vars.max()
+        rank_cols = CN.COL_NUMS[0:n_max]
+        rank_values = vsdb_data[rank_cols]
+        if multiplier is not None:
+            rank_values = rank_values.astype(float) * multiplier
+        vsdb_data[rank_cols] = rank_values.mask(np.arange(n_max) >= n_vars[:, None],
+                                                CN.MV_NOTAV)
+        return n_max
+
+    @staticmethod
+    def convert_vsdb_eclv(vsdb_data):
+        """ For VSDB ECON lines, turn the n_var values of each row into n_var pairs
+            of the constant x point and the value. Past n_var pairs, the row is set
+            to not available. Rows can have different values of n_var.
+            Returns:
+               the largest n_var
+        """
+        n_vars = vsdb_data[CN.N_VAR].to_numpy()
+        n_max = n_vars.max()
+        pairs = np.empty((len(vsdb_data.index), n_max, 2))
+        pairs[:, :, 0] = CN.X_POINTS_ECON[0:n_max]
+        pairs[:, :, 1] = vsdb_data[CN.COL_NUMS[0:n_max]].astype(float)
+        pairs[np.arange(n_max) >= n_vars[:, None]] = CN.MV_NOTAV
+        pair_cols = CN.COL_NUMS[0:n_max * 2]
+        vsdb_data[pair_cols] = pairs.reshape(len(vsdb_data.index), n_max * 2)
+        return n_max
+
+    @staticmethod
+    def is_mtd_revision(mtd_file):
+        """ An MTD 2D file is a revision file if 10 columns each have a single value.
+            Returns:
+               True if the file gets revision lines
+        """
+        for mtd_col in CN.MTD_2D_REV_FIELDS:
+            if not (mtd_file[mtd_col] == mtd_file[mtd_col][0]).all():
+                return False
+        return True
+
+    @staticmethod
+    def add_mtd_revisions(mtd_file, rev_ctr):
+        """ Add revision lines to an MTD 2D revision file. Lines with the same object id
+            in a row make a run, and each line after the second one in a run makes a new
+            line: the line before it minus the line 2 before it, in the difference fields.
+            Each run with new lines gets the next revision id.
+            Returns:
+               the file with revision lines added at the end, and the last revision id used
+        """
+        obj_ids = mtd_file[CN.OBJECT_ID].to_numpy()
+        run_starts = np.concatenate(([True], obj_ids[1:] != obj_ids[:-1]))
+        run_nums = np.cumsum(run_starts) - 1
+        run_pos = np.arange(obj_ids.size) - np.flatnonzero(run_starts)[run_nums] + 1
+
+        # only object ids with more than 2 lines create lines
+        rev_rows = np.flatnonzero(run_pos > 2)
+        if rev_rows.size == 0:
+            return mtd_file, rev_ctr
+
+        rev_df = mtd_file.iloc[rev_rows - 1].reset_index(drop=True)
+        for mtd_col in CN.MTD_2D_REV_DIFF_FIELDS:
+            col_values = mtd_file[mtd_col].to_numpy()
+            rev_df[mtd_col] = col_values[rev_rows - 1] - col_values[rev_rows - 2]
+        rev_df[CN.FCST_VAR] = 'REV_' + rev_df[CN.FCST_VAR]
+        rev_df[CN.OBS_VAR] = 'REV_' + rev_df[CN.OBS_VAR]
+        rev_df[CN.AXIS_ANG] = CN.MV_NOTAV
+        rev_df[CN.LINENUMBER] = 0
+
+        # unique sequential id is assigned to lines from the same run
+        rev_runs = pd.factorize(run_nums[rev_rows])[0]
+        rev_df[CN.REVISION_ID] = rev_ctr + rev_runs + 1
+        rev_ctr += int(rev_runs.max()) + 1
+
+        mtd_file = pd.concat([mtd_file, rev_df], ignore_index=True, sort=False)
+        return mtd_file, rev_ctr
+
+    @staticmethod
+    def map_unique(column, func):
+        """ Apply a function once to each distinct value of a column, instead of to every row.
+            Returns:
+               NumPy array of the function values for every row
+        """
+        codes, uniques = pd.factorize(column)
+        # missing values have a code of -1, which picks the last value
+        mapped = [func(value) for value in uniques] + [func(np.nan)]
+        return np.array(mapped, dtype=object)[codes]
+
+    @staticmethod
+    def normalize_stat(all_stat):
+        """ Transforms of header fields that only apply to stat files. Percentiles in
+            parens in fcst_thresh and obs_thresh go in fcst_perc and obs_perc, alpha is
+            formatted, and NA is replaced in cov_thresh, leads, and interp_pnts.
+            Work is done once per distinct value, and masks are only made once.
+            Returns:
+               N/A
+        """
+        thresh_perc = re.compile(CN.THRESH_PERC)
+
+        def split_perc(thresh):
+            if isinstance(thresh, str) and CN.R_PAREN in thresh:
+                return thresh_perc.match(thresh)
+            return None
+
+        # if a percentage thresh is used, it is in parens in the thresh
+        for thresh_col, perc_col in ((CN.FCST_THRESH, CN.FCST_PERC),
+                                     (CN.OBS_THRESH, CN.OBS_PERC)):
+            codes, uniques = pd.factorize(all_stat[thresh_col])
+            # missing values have a code of -1, which picks the last match
+            matches = [split_perc(thresh) for thresh in uniques] + [None]
+            perc_rows = np.array([match is not None for match in matches])[codes]
+            if perc_rows.any():
+                perc_codes = codes[perc_rows]
+                # save the value in parens, and remove it from the thresh
+                percs = np.array([float(match.group(2)) if match else np.nan
+                                  for match in matches])
+                threshs = np.array([match.group(1) if match else None
+                                    for match in matches], dtype=object)
+                all_stat.loc[perc_rows, perc_col] = percs[perc_codes]
+                all_stat.loc[perc_rows, thresh_col] = threshs[perc_codes]
+
+        # Give a warning message with data if value of alpha for an alpha line type is NA
+        # Do not check CNT and PSTD, even though they are alpha line types
+        alpha_na = (all_stat.alpha == CN.NOTAV).to_numpy()
+        alpha_lines = all_stat.line_type[alpha_na &
+                                         all_stat.line_type.isin(CN.ALPHA_LINE_TYPES[:-2])]
+        if not alpha_lines.empty:
+            logging.warning("!!! ALPHA line_type has ALPHA value of NA:\r\n %s",
+                            str(alpha_lines))
+
+        # give a warning message with data if non-alpha line type has float value
+        non_alpha_lines = all_stat.line_type[~alpha_na &
+                                             ~all_stat.line_type.isin(CN.ALPHA_LINE_TYPES)]
+        if not non_alpha_lines.empty:
+            logging.warning("!!! non-ALPHA line_type has ALPHA float value:\r\n %s",
+                            str(non_alpha_lines))
+
+        # Change NA in ALPHA to '-9999', and make ALPHA into a decimal
+        # with no trailing zeroes after the decimal
+        all_stat[CN.ALPHA] = ReadDataFiles.map_unique(
+            all_stat.alpha,
+            lambda alpha: '{0:g}'.format(float(CN.MV_NOTAV if alpha == CN.NOTAV else alpha)))
+
+        # Change ALL items in column COV_THRESH to '-9999' if they are 'NA'
+        all_stat.loc[all_stat.cov_thresh == CN.NOTAV, CN.COV_THRESH] = CN.MV_NOTAV
+
+        # Change ALL items in FCST_LEAD (added for tc_gen files), OBS_LEAD,
+        # and INTERP_PNTS to 0 if they are 'NA'
+        for na_col in (CN.FCST_LEAD, CN.OBS_LEAD, CN.INTERP_PNTS):
+            if not all_stat[na_col].dtypes == 'int':
+                all_stat.loc[all_stat[na_col] == CN.NOTAV, na_col] = 0
+        if not all_stat.interp_pnts.dtypes == 'int':
+            all_stat.interp_pnts = all_stat.interp_pnts.astype(int)
+
+    @staticmethod
+    def get_stat_line_types(load_flags, line_types):
+        """ From the XML flags, get the line types to load and the line types to skip
+            in stat files.
+            Returns:
+               line types to keep (None for all) and line types to skip, or
+               None if all line types are loaded
+        """
+        drop_types = []
+        if not load_flags['load_mpr']:
+            drop_types.append(CN.MPR)
+        if not load_flags['load_orank']:
+            drop_types.append(CN.ORANK)
+
+        keep_types = None
+        if load_flags['line_type_load']:
+            keep_types = [line_type for line_type in line_types if line_type not in drop_types]
+
+        if keep_types is None and not drop_types:
+            return None
+        return keep_types, drop_types
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+"""
+Program Name: read_file_cache.py
+Contact(s): Venita Hagerty
+Abstract:
+History Log:  Initial version
+Usage: Keep data files that have been read, so loading them again does not parse them again.
+Parameters: N/A
+Input Files: parquet files in the cache directory
+Output Files: parquet files in the cache directory
+Copyright 2020 UCAR/NCAR/RAL, CSU/CIRES, Regents of the University of Colorado, NOAA/OAR/ESRL/GSD
+"""
+
+# pylint:disable=no-member
+# constants exist in constants.py
+
+import sys
+import os
+import hashlib
+import logging
+import tempfile
+import pandas as pd
+
+import constants as CN
+
+
+class ReadFileCache:
+    """! Class to store and retrieve the dataframe read from each data file.
+         Entries are keyed by absolute path, size, and modification time of the file,
+         so a file that changes is read again.
+        Returns:
+           N/A
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = None
+        self.hits = 0
+        self.misses = 0
+
+        try:
+            # parquet needs pyarrow, which is optional
+            import pyarrow  # pylint:disable=import-outside-toplevel,unused-import
+        except ImportError:
+            logging.warning("!!! pyarrow is not installed, not using cache_dir %s", cache_dir)
+            return
+
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            self.cache_dir = cache_dir
+        except OSError:
+            logging.warning("!!! Can not make cache_dir %s, not using it", cache_dir)
+
+    @staticmethod
+    def cache_key(filename, stat_info, read_spec=None):
+        """! Make the name of the cache entry for a data file.
+             read_spec is anything else that changes what is read from the file.
+            Returns:
+               hex digest to use as a file name
+        """
+        key_parts = [CN.CACHE_VERSION, os.path.abspath(filename),
+                     str(stat_info.st_size), str(stat_info.st_mtime_ns), repr(read_spec)]
+        return hashlib.sha1("|".join(key_parts).encode()).hexdigest()
+
+    def cache_file(self, key):
+        """! Full path of the cache entry with this key.
+            Returns:
+               path of parquet file
+        """
+        return os.path.join(self.cache_dir, key + CN.CACHE_SUFFIX)
+
+    def read_frame(self, filename, stat_info, read_spec=None):
+        """! Get the dataframe for a data file, if it has been cached.
+            Returns:
+               dataframe, or None if not cached
+        """
+        if self.cache_dir is None:
+            return None
+
+        cache_file = self.cache_file(self.cache_key(filename, stat_info, read_spec))
+        if not os.path.isfile(cache_file):
+            self.misses += 1
+            return None
+
+        try:
+            file_frame = pd.read_parquet(cache_file)
+        except (OSError, ValueError, TypeError):
+            logging.warning("!!! Could not read cache of %s: %s", filename, sys.exc_info()[1])
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        logging.debug("Read %s from cache", filename)
+        return file_frame
+
+    def write_frame(self, filename, stat_info, file_frame, read_spec=None):
+        """! Store the dataframe for a data file.
+             Frames that parquet can not store, like object columns of mixed types,
+             are not cached.
+            Returns:
+               N/A
+        """
+        if self.cache_dir is None or file_frame.empty:
+            return
+
+        cache_file = self.cache_file(self.cache_key(filename, stat_info, read_spec))
+        tmp_file = None
+        try:
+            # write a temporary file and rename it, so a partial file is never read
+            tmp_fd, tmp_file = tempfile.mkstemp(suffix=CN.CACHE_SUFFIX, dir=self.cache_dir)
+            os.close(tmp_fd)
+            file_frame.to_parquet(tmp_file)
+            os.replace(tmp_file, cache_file)
+            tmp_file = None
+        except (OSError, ValueError, TypeError, ImportError, NotImplementedError):
+            logging.debug("Not caching %s: %s", filename, sys.exc_info()[1])
+        finally:
+            if tmp_file is not None and os.path.isfile(tmp_file):
+                os.remove(tmp_file)
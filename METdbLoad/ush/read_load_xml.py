@@ -66,6 +66,11 @@ class XmlLoadFile:
         self.flags['drop_indexes'] = False
         self.flags['apply_indexes'] = False
         self.flags['load_xml'] = True
+        self.flags['read_engine'] = CN.PANDAS_ENGINE
+        self.flags['cache_dir'] = None
+        self.flags['header_cache_dir'] = None
+        self.flags['load_stream'] = False
+        self.flags['bulk_session'] = False
 
         self.load_files = []
         self.line_types = []
@@ -139,8 +144,8 @@ class XmlLoadFile:
                     for subchild in list(child):
                         date_list[subchild.tag.lower()] = subchild.text
                 # Handle flags with a default of False
-                elif child.tag.lower() in ("verbose", "drop_indexes", "apply_indexes",
-                                           "load_mpr", "load_orank", "force_dup_file"):
+                elif child.tag.lower() in ("verbose", "load_mpr", "load_orank", "force_dup_file",
+                                           "load_stream", "bulk_session"):
                     if child.text.lower() == CN.LC_TRUE:
                         self.flags[child.tag.lower()] = True
                 # Handle flags with a default of True
@@ -149,6 +154,25 @@ class XmlLoadFile:
                                            "load_stat", "load_mode", "load_mtd", "load_xml"):
                     if child.text.lower() == CN.LC_FALSE:
                         self.flags[child.tag.lower()] = False
+                # Handle index flags, which can also be auto to decide for each table
+                elif child.tag.lower() in ("drop_indexes", "apply_indexes"):
+                    if child.text.lower() == CN.LC_TRUE:
+                        self.flags[child.tag.lower()] = True
+                    elif child.text.lower() == CN.AUTO_INDEXES:
+                        self.flags[child.tag.lower()] = CN.AUTO_INDEXES
+                # reader to use for stat, tcst, MODE, and MTD files
+                elif child.tag.lower() == "read_engine":
+                    if child.text.lower() in CN.READ_ENGINES:
+                        self.flags['read_engine'] = child.text.lower()
+                    else:
+                        logging.warning("!!! Unknown read_engine %s, using %s",
+                                        child.text, CN.PANDAS_ENGINE)
+                # directory to keep files that were read, to load them again without parsing
+                elif child.tag.lower() == "cache_dir":
+                    self.flags['cache_dir'] = child.text
+                # directory to keep header ids between runs, for each database
+                elif child.tag.lower() == "header_cache_dir":
+                    self.flags['header_cache_dir'] = child.text
                 elif child.tag.lower() == "insert_size":
                     if child.text.isdigit():
                         self.insert_size = int(child.text)
@@ -19,11 +19,16 @@ import sys
 import os
 import logging
 import time
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import timedelta
 import pymysql
 
 import constants as CN
 
+from format_csv_data import FormatCsvData
+
 
 class RunSql:
     """ Class to connect and disconnect to/from a SQL database
@@ -31,10 +36,29 @@ class RunSql:
            N/A
     """
 
+    # whether ids are reserved in the id sequence table, None until it is first used
+    use_id_sequence = None
+    # table.field of ids whose sequence has been checked against the table in this run
+    synced_ids = set()
+    # next id of each table.field, when ids are not reserved in the id sequence table
+    next_ids = {}
+    # whether LOAD DATA reads from a named pipe that the data is written to as it loads
+    load_stream = False
+    # rows in each INSERT statement when local_infile is off, or 1 to size them to the packet
+    insert_size = 1
+    # whether connections use the session settings for bulk loads
+    bulk_session = False
+    # named locks held until the set of files is committed
+    held_locks = []
+
     def __init__(self):
         # Default to False since it requires extra permission
         self.local_infile = False
+        self.connection = None
         self.conn = None
+        # tables with indexes that this load writes to, and whose indexes it dropped
+        self.index_tables = set()
+        self.drop_tables = set()
         self.cur = None
 
     def sql_on(self, connection):
@@ -43,19 +67,28 @@ class RunSql:
                N/A
         """
 
-        try:
-
-            # Connect to the database using connection info from XML file
-            self.conn = pymysql.connect(host=connection['db_host'],
-                                        port=connection['db_port'],
-                                        user=connection['db_user'],
-                                        passwd=connection['db_password'],
-                                        db=connection['db_database'],
-                                        local_infile=True)
-
-        except pymysql.OperationalError as pop_err:
-            logging.error("*** %s in run_sql ***", str(pop_err))
-            sys.exit("*** Error when connecting to database")
+        self.connection = connection
+        # run on each connect, so the settings are kept when connecting again
+        init_command = CN.BULK_SESSION if RunSql.bulk_session else None
+
+        for attempt in range(CN.SQL_RETRIES + 1):
+            try:
+
+                # Connect to the database using connection info from XML file
+                self.conn = pymysql.connect(host=connection['db_host'],
+                                            port=connection['db_port'],
+                                            user=connection['db_user'],
+                                            passwd=connection['db_password'],
+                                            db=connection['db_database'],
+                                            local_infile=True,
+                                            init_command=init_command)
+                break
+
+            except pymysql.OperationalError as pop_err:
+                if attempt == CN.SQL_RETRIES:
+                    logging.error("*** %s in run_sql ***", str(pop_err))
+                    sys.exit("*** Error when connecting to database")
+                RunSql.retry_wait(attempt, pop_err)
 
         try:
 
@@ -65,12 +98,88 @@ class RunSql:
             logging.error("*** %s in run_sql ***", sys.exc_info()[0])
             sys.exit("*** Error when creating cursor")
 
+        # read what other loads have committed, such as their new headers
+        self.cur.execute(CN.READ_COMMITTED)
+
+        # DDL commits, so the id sequence table is made before any set is written
+        RunSql.create_id_sequence(self.cur)
+
         # look at database to see whether we can use the local infile method
         self.cur.execute("SHOW GLOBAL VARIABLES LIKE 'local_infile';")
         result = self.cur.fetchall()
         self.local_infile = result[0][1]
         logging.debug("local_infile is %s", result[0][1])
 
+        # make the multi-row INSERT statements as long as the database accepts
+        self.cur.execute(CN.Q_MAX_PACKET)
+        result = self.cur.fetchall()
+        self.cur.max_stmt_length = min(int(result[0][1]) - CN.PACKET_MARGIN,
+                                       CN.MAX_STMT_LENGTH)
+        logging.debug("max_allowed_packet is %s", result[0][1])
+
+    def commit_set(self):
+        """ commit what has been written for a set of files, before the next set is read,
+            so nothing is lost if the connection is closed while the load is reading.
+            This is the only commit for the set, so a set is either all loaded or not at all.
+            The header locks are released once the set is committed.
+            Returns:
+               N/A
+        """
+        try:
+            self.conn.commit()
+            RunSql.release_locks(self.cur)
+        except pymysql.OperationalError as pop_err:
+            logging.error("*** %s in run_sql commit_set ***", str(pop_err))
+            sys.exit("*** Lost connection to database before committing")
+
+    def check_connection(self):
+        """ connect again if the connection was lost, such as after waiting longer than
+            wait_timeout while files were read. The last set was committed before it was
+            closed, so nothing is lost when connecting again.
+            Returns:
+               N/A
+        """
+        for attempt in range(CN.SQL_RETRIES + 1):
+            try:
+                self.conn.ping(reconnect=True)
+                # a new connection starts with the default isolation level
+                self.cur.execute(CN.READ_COMMITTED)
+                return
+            except pymysql.OperationalError as pop_err:
+                if attempt == CN.SQL_RETRIES:
+                    logging.error("*** %s in run_sql check_connection ***", str(pop_err))
+                    sys.exit("*** Error when connecting to database again")
+                RunSql.retry_wait(attempt, pop_err)
+
+    @staticmethod
+    def retry_wait(attempt, sql_err):
+        """ log an error that will be tried again, and wait longer for each attempt.
+            Returns:
+               N/A
+        """
+        wait = min(CN.RETRY_WAIT * 2 ** attempt, CN.MAX_RETRY_WAIT)
+        logging.warning("!!! %s, trying again in %s seconds", str(sql_err), wait)
+        time.sleep(wait)
+
+    @staticmethod
+    def retry_write(sql_cur, sql_write, *write_args):
+        """ call sql_write with write_args after a savepoint. If it fails with a lock wait
+            timeout, roll back to the savepoint, so no rows are written twice, and call it
+            again after a wait.
+            Returns:
+               N/A
+        """
+        for attempt in range(CN.SQL_RETRIES + 1):
+            sql_cur.execute(CN.SAVEPOINT)
+            try:
+                sql_write(*write_args)
+                return
+            except pymysql.OperationalError as sql_err:
+                if sql_err.args[0] not in CN.RETRY_ERRORS or attempt == CN.SQL_RETRIES:
+                    raise
+                sql_cur.execute(CN.ROLLBACK_SAVEPOINT)
+                RunSql.retry_wait(attempt, sql_err)
+
     @staticmethod
     def sql_off(conn, cur):
         """ method to commit data and disconnect from a SQL database
@@ -79,7 +188,6 @@ class RunSql:
         """
 
         conn.commit()
-
         cur.close()
         conn.close()
 
@@ -102,72 +210,239 @@ class RunSql:
         except (RuntimeError, TypeError, NameError, KeyError, AttributeError):
             logging.error("*** %s in write_sql_data get_next_id ***", sys.exc_info()[0])
 
+    @staticmethod
+    def create_id_sequence(sql_cur):
+        """ create the id sequence table if it is not there, when connecting. CREATE TABLE
+            commits, so it must not be run while a set of files is being written.
+            If it cannot be created, ids are counted from the max id in each table.
+            Returns:
+               N/A
+        """
+        if RunSql.use_id_sequence is not None:
+            return
+        try:
+            sql_cur.execute(CN.CR_ID_SEQUENCE)
+            RunSql.use_id_sequence = True
+        except pymysql.Error as sql_err:
+            logging.warning("!!! Not using %s table: %s", CN.ID_SEQUENCE, str(sql_err))
+            RunSql.use_id_sequence = False
+
+    @staticmethod
+    def reserve_ids(table, field, count, sql_cur, first_id=0):
+        """ reserve a block of count ids for a field in a table, in the id sequence table.
+            The table is MyISAM, so a reservation is not undone when the set is rolled
+            back; the ids of a set that is not loaded are skipped, leaving a gap.
+            If the id sequence table cannot be used, the max id is found once, and ids are
+            counted from it for the rest of the run.
+            Returns:
+               first id of the block
+        """
+        id_key = table + '.' + field
+
+        try:
+            if RunSql.use_id_sequence:
+                if id_key not in RunSql.synced_ids:
+                    sql_cur.execute(CN.INS_ID_SEQUENCE, [table, field, first_id])
+                    sql_cur.execute(CN.SYNC_ID_SEQUENCE.format(table, field), [table, field])
+                    RunSql.synced_ids.add(id_key)
+                sql_cur.execute(CN.UPD_ID_SEQUENCE, [int(count), table, field])
+                sql_cur.execute(CN.Q_LAST_ID)
+                return sql_cur.fetchone()[0] - int(count)
+
+        except pymysql.Error as sql_err:
+            logging.warning("!!! Not using %s table: %s", CN.ID_SEQUENCE, str(sql_err))
+            RunSql.use_id_sequence = False
+
+        if id_key not in RunSql.next_ids:
+            RunSql.next_ids[id_key] = max(RunSql.get_next_id(table, field, sql_cur), first_id)
+        next_id = RunSql.next_ids[id_key]
+        RunSql.next_ids[id_key] = next_id + int(count)
+        return next_id
+
+    @staticmethod
+    def get_lock(lock_name, sql_cur):
+        """ wait for a named lock that is shared by all loads into the database, and hold it
+            until the set of files is committed, so the next load to get it sees the headers
+            written while it was held. Nothing is committed while waiting for it.
+            The load stops if the lock is not free within LOCK_TIMEOUT seconds, rather than
+            looking up and writing headers without it.
+            Returns:
+               N/A
+        """
+        if lock_name in RunSql.held_locks:
+            return
+        sql_cur.execute(CN.Q_GET_LOCK, [lock_name, CN.LOCK_TIMEOUT])
+        if not sql_cur.fetchone()[0]:
+            logging.error("*** Timed out waiting for lock on %s ***", lock_name)
+            sys.exit("*** Timed out waiting for lock on " + lock_name)
+        RunSql.held_locks.append(lock_name)
+
+    @staticmethod
+    def release_locks(sql_cur):
+        """ release the named locks held for a set of files, once it has been committed.
+            Returns:
+               N/A
+        """
+        while RunSql.held_locks:
+            sql_cur.execute(CN.Q_RELEASE_LOCK, [RunSql.held_locks.pop()])
+
+    @staticmethod
+    def stream_to_sql(raw_data, col_list, sql_table, sql_cur):
+        """ load a dataframe with LOAD DATA from a named pipe. A thread writes the data to
+            the pipe while the database client reads it, so no data is written to disk.
+            If writing to the pipe fails, the rows loaded are rolled back and RuntimeError
+            is raised.
+            Returns:
+               N/A
+        """
+        fifo_dir = tempfile.mkdtemp(prefix='METdbLoad_')
+        fifo_file = os.path.join(fifo_dir, sql_table + '.csv')
+        os.mkfifo(fifo_file)
+        write_errors = []
+        writer = threading.Thread(target=RunSql.write_fifo,
+                                  args=(raw_data, col_list, fifo_file, write_errors))
+        writer.start()
+
+        try:
+            sql_cur.execute(CN.LD_TABLE.format(fifo_file, sql_table, CN.SEP))
+        finally:
+            # if the load failed before reading the pipe, open and close it to stop the writer
+            while writer.is_alive():
+                fifo_fd = os.open(fifo_file, os.O_RDONLY | os.O_NONBLOCK)
+                writer.join(0.1)
+                os.close(fifo_fd)
+            os.remove(fifo_file)
+            os.rmdir(fifo_dir)
+
+        # the load ended when the writer closed the pipe, so only part of the data was loaded.
+        # Roll back to the savepoint retry_write set before the load, so none of it is kept
+        if write_errors:
+            sql_cur.execute(CN.ROLLBACK_SAVEPOINT)
+            raise RuntimeError("{} writing {} to pipe".format(write_errors[0].__name__,
+                                                               sql_table))
+
+    @staticmethod
+    def write_fifo(raw_data, col_list, fifo_file, write_errors):
+        """ write a dataframe as CSV to a named pipe, for stream_to_sql.
+            Returns:
+               N/A
+        """
+        try:
+            with open(fifo_file, 'wb') as fifo:
+                FormatCsvData.write_csv(raw_data, col_list, fifo)
+        except (OSError, RuntimeError, TypeError, ValueError, KeyError):
+            write_errors.append(sys.exc_info()[0])
+
     @staticmethod
     def write_to_sql(raw_data, col_list, sql_table, sql_query, tmp_dir, sql_cur, local_infile):
         """ given a dataframe of raw_data with specific columns to write to a sql_table,
             write to a csv file and use local data infile for speed if allowed.
             otherwise, do an executemany to use a SQL insert statement to write data
+            Returns:
+               True if the data was written, False if there was an error
         """
 
         try:
-            if local_infile == 'ON':
-                # later in development, may wish to delete these files to clean up when done
-                tmpfile = tmp_dir + '/METdbLoad_' + sql_table + '.csv'
-                # write the data out to a csv file, use local data infile to load to database
-                raw_data[col_list].to_csv(tmpfile, na_rep=CN.MV_NOTAV,
-                                          index=False, header=False, sep=CN.SEP)
-                sql_cur.execute(CN.LD_TABLE.format(tmpfile, sql_table, CN.SEP))
-                # delete the temporary CSV file
-                os.remove(tmpfile)
+            if local_infile == 'ON' and RunSql.load_stream and hasattr(os, 'mkfifo'):
+                RunSql.retry_write(sql_cur, RunSql.stream_to_sql,
+                                   raw_data, col_list, sql_table, sql_cur)
+            elif local_infile == 'ON':
+                # a unique file name, so loads running at the same time do not share a file
+                tmp_fd, tmpfile = tempfile.mkstemp(prefix='METdbLoad_' + sql_table + '_',
+                                                   suffix='.csv', dir=tmp_dir)
+                os.close(tmp_fd)
+                try:
+                    # write the data out to a csv file, use local data infile to load to database
+                    with open(tmpfile, 'wb') as csv_file:
+                        FormatCsvData.write_csv(raw_data, col_list, csv_file)
+                    RunSql.retry_write(sql_cur, sql_cur.execute,
+                                       CN.LD_TABLE.format(tmpfile, sql_table, CN.SEP))
+                finally:
+                    # delete the temporary CSV file
+                    os.remove(tmpfile)
             else:
                 # fewer permissions required, but slower
-                # Make sure there are no NaN values
-                raw_data = raw_data.fillna(CN.MV_NOTAV)
-
-                # only line_data has timestamps in dataframe - change to strings
-                if 'line_data' in sql_table:
-                    raw_data['fcst_valid_beg'] = raw_data['fcst_valid_beg'].astype(str)
-                    raw_data['fcst_valid_end'] = raw_data['fcst_valid_end'].astype(str)
-                    raw_data['fcst_init_beg'] = raw_data['fcst_init_beg'].astype(str)
-                    raw_data['obs_valid_beg'] = raw_data['obs_valid_beg'].astype(str)
-                    raw_data['obs_valid_end'] = raw_data['obs_valid_end'].astype(str)
-                elif sql_table in (CN.MODE_HEADER, CN.MTD_HEADER):
-                    raw_data['fcst_valid'] = raw_data['fcst_valid_beg'].astype(str)
-                    raw_data['fcst_init'] = raw_data['fcst_valid_end'].astype(str)
-                    raw_data['obs_valid'] = raw_data['fcst_init_beg'].astype(str)
-                # make a copy of the dataframe that is a list of lists and write to database
-                dfile = raw_data[col_list].values.tolist()
-                sql_cur.executemany(sql_query, dfile)
+                # executemany writes each batch of rows with multi-row INSERT statements
+                for insert_rows in RunSql.insert_batches(raw_data, col_list, sql_table):
+                    RunSql.retry_write(sql_cur, sql_cur.executemany, sql_query, insert_rows)
+            return True
 
         except (RuntimeError, TypeError, NameError, KeyError, AttributeError):
             logging.error("*** %s in run_sql write_to_sql ***", sys.exc_info()[0])
+            return False
 
     @staticmethod
-    def apply_indexes(drop, sql_cur):
+    def insert_batches(raw_data, col_list, sql_table):
+        """ given a dataframe of raw_data, make lists of rows to insert into a sql_table, of
+            insert_size rows, or of INSERT_ROWS rows if insert_size is 1. Only one batch of
+            rows is converted to a list at a time.
+            Returns:
+               generator of lists of rows
+        """
+        batch_size = RunSql.insert_size if RunSql.insert_size > 1 else CN.INSERT_ROWS
+
+        for batch_start in range(0, len(raw_data.index), batch_size):
+            # Make sure there are no NaN values
+            batch_data = raw_data.iloc[batch_start:batch_start + batch_size].fillna(CN.MV_NOTAV)
+
+            # only line_data has timestamps in dataframe - change to strings
+            if 'line_data' in sql_table:
+                batch_data['fcst_valid_beg'] = batch_data['fcst_valid_beg'].astype(str)
+                batch_data['fcst_valid_end'] = batch_data['fcst_valid_end'].astype(str)
+                batch_data['fcst_init_beg'] = batch_data['fcst_init_beg'].astype(str)
+                batch_data['obs_valid_beg'] = batch_data['obs_valid_beg'].astype(str)
+                batch_data['obs_valid_end'] = batch_data['obs_valid_end'].astype(str)
+            elif sql_table in (CN.MODE_HEADER, CN.MTD_HEADER):
+                batch_data['fcst_valid'] = batch_data['fcst_valid_beg'].astype(str)
+                batch_data['fcst_init'] = batch_data['fcst_valid_end'].astype(str)
+                batch_data['obs_valid'] = batch_data['fcst_init_beg'].astype(str)
+
+            yield batch_data[col_list].values.tolist()
+
+    def apply_indexes(self, drop, sql_cur, tables=None):
         """
         If user sets tag apply_indexes to true, try to create all indexes
         If user sets tag drop_indexes to true, try to drop all indexes
+        If a list of tables is given, only the indexes of those tables are changed.
+        Only the indexes that are missing are created, and only those that exist are dropped.
+        The indexes of each table are changed with one statement, and several tables are
+        changed at the same time, each on its own connection.
         """
         logging.debug("[--- Start apply_indexes ---]")
 
         apply_time_start = time.perf_counter()
 
-        try:
-            if drop:
-                sql_array = CN.DROP_INDEXES_QUERIES
-                logging.info("--- *** --- Dropping Indexes --- *** ---")
-            else:
-                sql_array = CN.CREATE_INDEXES_QUERIES
-                logging.info("--- *** --- Loading Indexes --- *** ---")
-
-            for sql_cmd in sql_array:
-                sql_cur.execute(sql_cmd)
+        if drop:
+            logging.info("--- *** --- Dropping Indexes --- *** ---")
+        else:
+            logging.info("--- *** --- Loading Indexes --- *** ---")
 
-        except (pymysql.OperationalError, pymysql.InternalError):
-            if drop:
-                logging.error("*** Index to drop does not exist in run_sql apply_indexes ***")
-            else:
-                logging.error("*** Index to add already exists in run_sql apply_indexes ***")
+        try:
+            # commit, so this connection does not hold locks that the changes would wait on
+            sql_cur.connection.commit()
+            sql_cur.execute(CN.Q_TABLES)
+            db_tables = [row[0] for row in sql_cur.fetchall()]
+            sql_cur.execute(CN.Q_INDEXES)
+            db_indexes = [row[1] for row in sql_cur.fetchall()]
+            sql_cur.connection.commit()
+
+            index_columns = {sql_table: columns for sql_table, columns in CN.INDEX_COLUMNS.items()
+                             if tables is None or sql_table in tables}
+            index_alters = RunSql.index_alters(drop, index_columns, db_tables, db_indexes)
+
+            with ThreadPoolExecutor(max_workers=CN.INDEX_THREADS) as executor:
+                alter_futures = {executor.submit(RunSql.alter_indexes, self.connection,
+                                                 sql_alter): sql_table
+                                 for sql_table, sql_alter in index_alters.items()}
+                for alter_future in as_completed(alter_futures):
+                    try:
+                        alter_future.result()
+                    except pymysql.Error as sql_err:
+                        logging.error("*** %s in run_sql apply_indexes on %s ***",
+                                      str(sql_err), alter_futures[alter_future])
+
+        except (pymysql.OperationalError, pymysql.InternalError) as sql_err:
+            logging.error("*** %s in run_sql apply_indexes ***", str(sql_err))
 
         apply_time_end = time.perf_counter()
         apply_time = timedelta(seconds=apply_time_end - apply_time_start)
@@ -175,3 +450,72 @@ class RunSql:
         logging.info("    >>> Apply time: %s", str(apply_time))
 
         logging.debug("[--- End apply_indexes ---]")
+
+    @staticmethod
+    def auto_drop_tables(table_lines, sql_cur):
+        """ given the number of lines to load into each table, decide which tables to drop
+            the indexes of: those whose lines are at least AUTO_DROP_FRACTION of the rows
+            already in the table, as rebuilding the indexes is then faster than updating them.
+            Returns:
+               list of tables
+        """
+        sql_cur.execute(CN.Q_TABLE_ROWS)
+        table_rows = {row[0].lower(): row[1] or 0 for row in sql_cur.fetchall()}
+        drop_tables = []
+
+        for sql_table, line_count in table_lines.items():
+            if line_count >= CN.AUTO_DROP_FRACTION * table_rows.get(sql_table, 0):
+                drop_tables.append(sql_table)
+                logging.info("Dropping indexes of %s: loading %s lines into about %s rows",
+                             sql_table, line_count, table_rows.get(sql_table, 0))
+            else:
+                logging.info("Keeping indexes of %s: loading %s lines into about %s rows",
+                             sql_table, line_count, table_rows.get(sql_table, 0))
+
+        return drop_tables
+
+    @staticmethod
+    def index_alters(drop, index_columns, db_tables, db_indexes):
+        """ given the columns to index in each table, and the tables and index names in the
+            database, make a statement for each table to drop the indexes that exist, or to
+            add the indexes that are missing. Tables not in the database are skipped.
+            Returns:
+               dictionary of ALTER TABLE statements by table
+        """
+        db_tables = {table.lower() for table in db_tables}
+        db_indexes = {index.lower() for index in db_indexes}
+        index_alters = {}
+
+        for sql_table, columns in index_columns.items():
+            if sql_table not in db_tables:
+                logging.debug("Table %s is not in the database, no indexes", sql_table)
+                continue
+            alter_list = []
+            for column in columns:
+                index_name = CN.INDEX_NAME.format(sql_table, column)
+                if drop and index_name in db_indexes:
+                    alter_list.append(CN.DROP_INDEX.format(index_name))
+                elif not drop and index_name not in db_indexes:
+                    alter_list.append(CN.ADD_INDEX.format(index_name, column))
+            if alter_list:
+                index_alters[sql_table] = CN.ALTER_INDEXES.format(sql_table, ", ".join(alter_list))
+
+        return index_alters
+
+    @staticmethod
+    def alter_indexes(connection, sql_alter):
+        """ run an ALTER TABLE statement for the indexes of a table on a new connection.
+            Returns:
+               N/A
+        """
+        index_conn = pymysql.connect(host=connection['db_host'],
+                                     port=connection['db_port'],
+                                     user=connection['db_user'],
+                                     passwd=connection['db_password'],
+                                     db=connection['db_database'])
+        try:
+            logging.debug("Running %s", sql_alter)
+            with index_conn.cursor() as index_cur:
+                index_cur.execute(sql_alter)
+        finally:
+            index_conn.close()
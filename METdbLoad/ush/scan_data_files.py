@@ -0,0 +1,490 @@
+#!/usr/bin/env python3
+
+"""
+Program Name: scan_data_files.py
+Contact(s): Venita Hagerty
+Abstract:
+History Log:  Initial version
+Usage: Fast reader for whitespace delimited MET files (stat, tcst, MODE, MTD), and VSDB files.
+Parameters: N/A
+Input Files: data files of type MET, VSDB, MODE, MTD, TCST
+Output Files: N/A
+Copyright 2020 UCAR/NCAR/RAL, CSU/CIRES, Regents of the University of Colorado, NOAA/OAR/ESRL/GSD
+"""
+
+# pylint:disable=no-member
+# constants exist in constants.py
+
+import io
+import sys
+import mmap
+import logging
+import numpy as np
+import pandas as pd
+
+import constants as CN
+
+# byte values used while scanning
+SPACE = 32
+TAB = 9
+NEW_LINE = 10
+RETURN = 13
+EQUALS = 61
+HYPHEN = 45
+ZERO = 48
+NINE = 57
+QUOTE = b'"'
+
+# characters that keep a numeric column from being read as integers
+NOT_INT_CHARS = np.frombuffer(b'.eEnNiI', dtype=np.uint8)
+# characters of inf and infinity, which both NumPy and pandas read as numbers
+INF_CHARS = np.frombuffer(b'iI', dtype=np.uint8)
+# NumPy reads 1_000 as a number, pandas does not
+UNDERSCORE = 95
+# values pandas reads as booleans, when they are all a column has
+TRUE_VALUES = np.array([b'True', b'TRUE', b'true'])
+FALSE_VALUES = np.array([b'False', b'FALSE', b'false'])
+
+# MET dates look like 20120409_120000, VSDB dates look like 2012040912.
+# For each length, the byte positions used to build ISO dates, and the ISO separators.
+MET_DATE_LEN = 15
+VSDB_DATE_LEN = 10
+ISO_DATE_LAYOUTS = {MET_DATE_LEN: ([0, 1, 2, 3, -1, 4, 5, -1, 6, 7, -1, 9, 10, -1,
+                                    11, 12, -1, 13, 14], b'    -  -  T  :  :  '),
+                    VSDB_DATE_LEN: ([0, 1, 2, 3, -1, 4, 5, -1, 6, 7, -1, 8, 9],
+                                    b'    -  -  T  ')}
+
+
+class ScanDataFiles:
+    """! Class to read whitespace delimited MET files with a memory map and NumPy.
+         Line and field boundaries are found in bulk on the raw bytes, and each column
+         is converted to a NumPy array without creating a Python object per field.
+        Returns:
+           N/A
+    """
+
+    @staticmethod
+    def read_file(filename, hdr_names, date_cols, line_types=None):
+        """ Read in all of the lines except the header of a whitespace delimited file.
+            If line_types is given, only read lines with line types to load.
+            Returns:
+               all the lines in a dataframe, with dates converted to datetime, or
+               None if the file has something the scanner does not handle, in which
+               case the caller should use the pandas reader instead
+        """
+        try:
+            with open(filename, 'rb') as file_obj:
+                with mmap.mmap(file_obj.fileno(), 0, access=mmap.ACCESS_READ) as file_map:
+                    # quoted fields need the full pandas tokenizer
+                    if file_map.find(QUOTE) != -1:
+                        return None
+                    buf = np.frombuffer(file_map, dtype=np.uint8)
+                    try:
+                        return ScanDataFiles.scan_buffer(buf, hdr_names, date_cols, line_types)
+                    finally:
+                        # release the view before the map is closed
+                        del buf
+
+        except ValueError:
+            # an empty file can not be memory mapped
+            return None
+        except (RuntimeError, TypeError, NameError, KeyError, OSError):
+            logging.error("*** %s in scan_data_files read_file ***", sys.exc_info()[0])
+            return None
+
+    @staticmethod
+    def read_vsdb(filename, hdr_names, date_cols, str_cols):
+        """ Read in all of the lines of a VSDB file, which has no header line.
+            Fields are separated by spaces or =, and a hyphen between two digits
+            after the = starts a new field, for negative numbers with no space before them.
+            Returns:
+               the lines in a dataframe, with only as many columns as the longest line,
+               or None if the file should be read as strings instead
+        """
+        try:
+            with open(filename, 'rb') as file_obj:
+                with mmap.mmap(file_obj.fileno(), 0, access=mmap.ACCESS_READ) as file_map:
+                    if file_map.find(QUOTE) != -1:
+                        return None
+                    buf = np.frombuffer(file_map, dtype=np.uint8)
+                    try:
+                        starts, ends, token_lines = ScanDataFiles.find_tokens(buf, True)
+                        return ScanDataFiles.build_frame(buf, starts, ends, token_lines,
+                                                         hdr_names, date_cols,
+                                                         str_cols=str_cols,
+                                                         date_len=VSDB_DATE_LEN,
+                                                         trim_cols=True)
+                    finally:
+                        del buf
+
+        except ValueError:
+            return None
+        except (RuntimeError, TypeError, NameError, KeyError, OSError):
+            logging.error("*** %s in scan_data_files read_vsdb ***", sys.exc_info()[0])
+            return None
+
+    @staticmethod
+    def has_line_types(filename, keep_types):
+        """ Check whether a file can have any of the line types to load, by looking for
+            each of them in the bytes of the file.
+            Returns:
+               False if none of the line types are in the file, otherwise True
+        """
+        if keep_types is None:
+            return True
+        try:
+            with open(filename, 'rb') as file_obj:
+                with mmap.mmap(file_obj.fileno(), 0, access=mmap.ACCESS_READ) as file_map:
+                    return any(file_map.find(line_type.encode()) != -1
+                               for line_type in keep_types)
+
+        except ValueError:
+            return True
+        except (RuntimeError, TypeError, NameError, KeyError, OSError):
+            logging.error("*** %s in scan_data_files has_line_types ***", sys.exc_info()[0])
+            return True
+
+    @staticmethod
+    def filter_file(filename, hdr_names, line_types):
+        """ Make a copy of a file with only the header line and the lines with line types
+            to load, for the pandas reader.
+            Returns:
+               the copy as a BytesIO and the row number of each line kept, or
+               None if all lines are kept or the file can not be filtered
+        """
+        try:
+            with open(filename, 'rb') as file_obj:
+                with mmap.mmap(file_obj.fileno(), 0, access=mmap.ACCESS_READ) as file_map:
+                    if file_map.find(QUOTE) != -1:
+                        return None
+                    buf = np.frombuffer(file_map, dtype=np.uint8)
+                    try:
+                        starts, ends, token_lines = ScanDataFiles.find_tokens(buf)
+                        data = token_lines > 0
+                        token_lines = token_lines[data]
+                        if token_lines.size == 0:
+                            return None
+                        row_keep = ScanDataFiles.keep_rows(buf, starts[data], ends[data],
+                                                           token_lines,
+                                                           hdr_names.index(CN.LINE_TYPE),
+                                                           line_types)
+                        if row_keep.all():
+                            return None
+
+                        # keep the bytes of the header line and the lines to load
+                        new_lines = np.flatnonzero(buf == NEW_LINE)
+                        line_keep = np.zeros(new_lines.size + 1, dtype=bool)
+                        line_keep[0] = True
+                        row_lines = token_lines[ScanDataFiles.number_rows(token_lines)[2]]
+                        line_keep[row_lines[row_keep]] = True
+                        # repeat each line's flag for its bytes, the new line included
+                        line_sizes = np.diff(np.concatenate(([0], new_lines + 1, [buf.size])))
+                        kept_bytes = buf[np.repeat(line_keep, line_sizes)].tobytes()
+                    finally:
+                        del buf
+
+            return io.BytesIO(kept_bytes), np.flatnonzero(row_keep)
+
+        except ValueError:
+            return None
+        except (RuntimeError, TypeError, NameError, KeyError, OSError):
+            logging.error("*** %s in scan_data_files filter_file ***", sys.exc_info()[0])
+            return None
+
+    @staticmethod
+    def keep_rows(buf, starts, ends, token_lines, type_col, line_types):
+        """ Find the data lines that have a line type to load. line_types holds the
+            list of line types to keep, or None to keep all, and the list to skip.
+            Returns:
+               boolean array with one value for each non blank line
+        """
+        token_rows, token_cols, row_starts = ScanDataFiles.number_rows(token_lines)
+        type_tokens = np.flatnonzero(token_cols == type_col)
+        type_bytes = ScanDataFiles.gather_bytes(buf, starts[type_tokens], ends[type_tokens])
+        types = np.ascontiguousarray(type_bytes).view('S' + str(type_bytes.shape[1])).ravel()
+
+        keep_types, drop_types = line_types
+        type_keep = np.ones(types.size, dtype=bool)
+        if keep_types is not None:
+            type_keep &= np.isin(types, np.array([line_type.encode()
+                                                  for line_type in keep_types], dtype='S'))
+        if drop_types:
+            type_keep &= ~np.isin(types, np.array([line_type.encode()
+                                                   for line_type in drop_types], dtype='S'))
+
+        # lines too short to have a line type are not kept
+        row_keep = np.zeros(row_starts.size, dtype=bool)
+        row_keep[token_rows[type_tokens]] = type_keep
+        return row_keep
+
+    @staticmethod
+    def number_rows(token_lines):
+        """ Number the non blank lines, and find the column of each token in its line.
+            Returns:
+               row of each token, column of each token, and first token of each row
+        """
+        new_row = np.concatenate(([True], token_lines[1:] != token_lines[:-1]))
+        row_starts = np.flatnonzero(new_row).astype(token_lines.dtype)
+        token_rows = np.cumsum(new_row, dtype=token_lines.dtype) - 1
+        token_cols = np.arange(token_lines.size, dtype=token_lines.dtype) - row_starts[token_rows]
+        return token_rows, token_cols, row_starts
+
+    @staticmethod
+    def find_tokens(buf, split_vsdb=False):
+        """ Find the start and end of every whitespace delimited token in a buffer.
+            For VSDB files, = is also a separator, and some hyphens start a token.
+            Returns:
+               token starts, token ends, and the 0 based physical line of each token
+        """
+        is_space = (buf == SPACE) | (buf == TAB) | (buf == NEW_LINE) | (buf == RETURN)
+        if split_vsdb:
+            is_space |= buf == EQUALS
+        # a token starts at a byte that is not a space, after a space or the start of the
+        # buffer, and ends at one before a space or the end. Only boolean arrays, of one
+        # byte each, are made for every byte of the file, and int32 positions for every
+        # token, unless the file is too large for them
+        index_type = np.int32 if buf.size < np.iinfo(np.int32).max else np.int64
+        next_to_space = np.empty_like(is_space)
+        next_to_space[0] = True
+        next_to_space[1:] = is_space[:-1]
+        starts = np.flatnonzero(next_to_space & ~is_space).astype(index_type)
+        next_to_space[:-1] = is_space[1:]
+        next_to_space[-1] = True
+        ends = (np.flatnonzero(next_to_space & ~is_space) + 1).astype(index_type)
+        del next_to_space
+        if split_vsdb:
+            # a hyphen inside a token ends one token and starts the next
+            hyphens = ScanDataFiles.find_vsdb_hyphens(buf)
+            if hyphens.size:
+                starts = np.insert(starts, np.searchsorted(starts, hyphens), hyphens)
+                ends = np.insert(ends, np.searchsorted(ends, hyphens), hyphens)
+        new_lines = np.flatnonzero(buf == NEW_LINE)
+        token_lines = np.searchsorted(new_lines, starts).astype(index_type)
+        return starts, ends, token_lines
+
+    @staticmethod
+    def find_vsdb_hyphens(buf):
+        """ Find hyphens between two digits that come after an = on the same line.
+            FHO can have a negative thresh, so only hyphens between numbers are split.
+            Returns:
+               positions of the hyphens
+        """
+        hyphens = np.flatnonzero(buf == HYPHEN)
+        hyphens = hyphens[(hyphens > 0) & (hyphens < buf.size - 1)]
+        if hyphens.size == 0:
+            return hyphens
+        before = buf[hyphens - 1]
+        after = buf[hyphens + 1]
+        hyphens = hyphens[(before >= ZERO) & (before <= NINE) & (after >= ZERO) & (after <= NINE)]
+
+        # the last = before each hyphen has to be after the last new line before it
+        equals = np.flatnonzero(buf == EQUALS)
+        new_lines = np.flatnonzero(buf == NEW_LINE)
+        last_equals = np.concatenate(([-1], equals))[np.searchsorted(equals, hyphens)]
+        last_new_line = np.concatenate(([-1], new_lines))[np.searchsorted(new_lines, hyphens)]
+        return hyphens[last_equals > last_new_line]
+
+    @staticmethod
+    def scan_buffer(buf, hdr_names, date_cols, line_types=None):
+        """ Turn the bytes of a file, with a header line, into a dataframe.
+            Lines with line types that are not loaded are skipped, but the index
+            still numbers the lines of the whole file.
+            Returns:
+               dataframe like the one pandas read_csv creates, or None
+        """
+        starts, ends, token_lines = ScanDataFiles.find_tokens(buf)
+
+        # skip the header line
+        keep = token_lines > 0
+        starts = starts[keep]
+        ends = ends[keep]
+        token_lines = token_lines[keep]
+
+        kept_rows = None
+        if line_types is not None and starts.size:
+            row_keep = ScanDataFiles.keep_rows(buf, starts, ends, token_lines,
+                                               hdr_names.index(CN.LINE_TYPE), line_types)
+            if not row_keep.all():
+                keep = row_keep[ScanDataFiles.number_rows(token_lines)[0]]
+                starts = starts[keep]
+                ends = ends[keep]
+                token_lines = token_lines[keep]
+                kept_rows = np.flatnonzero(row_keep)
+
+        scan_data = ScanDataFiles.build_frame(buf, starts, ends, token_lines,
+                                              hdr_names, date_cols)
+        if scan_data is not None and kept_rows is not None:
+            scan_data.index = kept_rows
+        return scan_data
+
+    @staticmethod
+    def build_frame(buf, starts, ends, token_lines, hdr_names, date_cols,
+                    str_cols=(), date_len=MET_DATE_LEN, trim_cols=False):
+        """ Given the tokens of the data lines, build a dataframe one column at a time.
+            Columns in str_cols are always strings. If trim_cols, leave off the
+            names past the longest line.
+            Returns:
+               dataframe like the one pandas read_csv creates, or None
+        """
+        if starts.size == 0:
+            return pd.DataFrame(columns=hdr_names)
+
+        # number the non blank lines, and find the column of each token in its line
+        token_rows, token_cols, row_starts = ScanDataFiles.number_rows(token_lines)
+        n_rows = row_starts.size
+
+        # more fields than names is an error for pandas - let it report it
+        if token_cols.max() >= len(hdr_names):
+            return None
+        if trim_cols:
+            hdr_names = hdr_names[:token_cols.max() + 1]
+
+        # put the tokens in column order so each column is one slice
+        order = np.argsort(token_cols, kind='stable').astype(token_cols.dtype)
+        col_bounds = np.searchsorted(token_cols[order], np.arange(len(hdr_names) + 1))
+
+        columns = {}
+        for col_num, col_name in enumerate(hdr_names):
+            col_tokens = order[col_bounds[col_num]:col_bounds[col_num + 1]]
+            col_rows = token_rows[col_tokens]
+            col_bytes = ScanDataFiles.gather_bytes(buf, starts[col_tokens], ends[col_tokens])
+
+            if col_name in date_cols:
+                col_values = ScanDataFiles.convert_dates(col_bytes, col_rows, n_rows,
+                                                         date_len)
+                if col_values is None:
+                    return None
+            else:
+                col_values = ScanDataFiles.convert_column(col_bytes, col_rows, n_rows,
+                                                          col_name in str_cols)
+
+            columns[col_name] = col_values
+
+        # the frame copies the columns, so free the token positions first
+        del order, token_rows, token_cols
+        return ScanDataFiles.make_frame(columns)
+
+    @staticmethod
+    def make_frame(columns):
+        """ Build a dataframe from a dict of columns, emptying the dict.
+            pandas joins columns of the same type into one block, and makes a block
+            for each run of them first, so the columns are given grouped by type,
+            then put back in order, which is only one copy of the data.
+            Returns:
+               dataframe with the columns in the order of the dict
+        """
+        col_names = list(columns)
+        by_type = sorted(col_names, key=lambda col_name: columns[col_name].dtype.str)
+        scan_data = pd.DataFrame({col_name: columns.pop(col_name) for col_name in by_type})
+        return scan_data[col_names]
+
+    @staticmethod
+    def gather_bytes(buf, starts, ends):
+        """ Copy tokens into a 2 dimensional byte array, padded on the right with zeros.
+            Returns:
+               uint8 array with one row per token
+        """
+        if starts.size == 0:
+            return np.zeros((0, 1), dtype=np.uint8)
+        lengths = ends - starts
+        width = int(lengths.max())
+        positions = np.arange(width)
+        offsets = np.minimum(starts[:, None] + positions, buf.size - 1)
+        token_bytes = buf[offsets]
+        token_bytes[positions >= lengths[:, None]] = 0
+        return token_bytes
+
+    @staticmethod
+    def convert_column(col_bytes, col_rows, n_rows, as_str=False):
+        """ Convert the tokens of one column to int, float, bool, or string values, with the
+            types pandas read_csv gives when it does not convert NA values: nan stays a
+            string, and integers too large for int64 are uint64 or strings.
+            Lines that are too short to have this column get NaN, as in pandas.
+            Returns:
+               NumPy array of the column values
+        """
+        if col_rows.size == 0:
+            return np.full(n_rows, np.nan)
+
+        strings = np.ascontiguousarray(col_bytes).view('S' + str(col_bytes.shape[1])).ravel()
+        all_present = col_rows.size == n_rows
+
+        numbers = None
+        if not as_str and not (col_bytes == UNDERSCORE).any():
+            try:
+                numbers = strings.astype(np.float64)
+            except ValueError:
+                pass
+            # NumPy reads nan, and numbers too large for a float, as numbers.
+            # pandas keeps them as strings
+            if numbers is not None:
+                is_inf = np.isinf(numbers)
+                if np.isnan(numbers).any() or \
+                        not np.isin(col_bytes[is_inf], INF_CHARS).any(axis=1).all():
+                    numbers = None
+
+        if numbers is not None and not np.isin(col_bytes, NOT_INT_CHARS).any():
+            try:
+                int_values = strings.astype(np.int64)
+                if all_present:
+                    return int_values
+            except OverflowError:
+                # pandas reads integers past int64 as uint64 if it can, otherwise as strings
+                numbers = None
+                if all_present and not (col_bytes == HYPHEN).any():
+                    try:
+                        return strings.astype(np.uint64)
+                    except OverflowError:
+                        pass
+            except ValueError:
+                pass
+
+        if numbers is not None:
+            col_values = np.full(n_rows, np.nan)
+            col_values[col_rows] = numbers
+            return col_values
+
+        if not as_str:
+            is_true = np.isin(strings, TRUE_VALUES)
+            if (is_true | np.isin(strings, FALSE_VALUES)).all():
+                if all_present:
+                    return is_true
+                col_values = np.full(n_rows, np.nan, dtype=object)
+                col_values[col_rows] = is_true.astype(object)
+                return col_values
+
+        # decode each distinct value once - header columns repeat a few values many times
+        uniques, inverse = np.unique(strings, return_inverse=True)
+        decoded = np.array([value.decode('utf-8') for value in uniques], dtype=object)
+        col_values = np.full(n_rows, np.nan, dtype=object)
+        col_values[col_rows] = decoded[inverse]
+        return col_values
+
+    @staticmethod
+    def convert_dates(col_bytes, col_rows, n_rows, date_len=MET_DATE_LEN):
+        """ Convert MET dates like 20120409_120000, or VSDB dates like 2012040912,
+            to datetime values.
+            Returns:
+               NumPy datetime64 array, or None if any value is not a plain date
+        """
+        if col_rows.size != n_rows or col_bytes.shape[1] != date_len:
+            return None
+
+        iso_order, iso_fill = ISO_DATE_LAYOUTS[date_len]
+        date_cols = [met_col for met_col in iso_order if met_col >= 0]
+        sep_cols = [met_col for met_col in range(date_len) if met_col not in date_cols]
+        digits = col_bytes[:, date_cols]
+        if (col_bytes[:, sep_cols] != ord(CN.U_SCORE)).any() or \
+                (digits < ZERO).any() or (digits > NINE).any():
+            return None
+
+        # rearrange to ISO format, which NumPy can parse directly
+        iso_bytes = np.tile(np.frombuffer(iso_fill, dtype=np.uint8), (n_rows, 1))
+        for iso_col, met_col in enumerate(iso_order):
+            if met_col >= 0:
+                iso_bytes[:, iso_col] = col_bytes[:, met_col]
+        iso_dates = iso_bytes.view('S' + str(len(iso_order))).ravel()
+
+        col_values = np.empty(n_rows, dtype='datetime64[ns]')
+        col_values[col_rows] = iso_dates.astype('datetime64[s]')
+        return col_values
@@ -20,6 +20,7 @@ import logging
 import time
 from datetime import timedelta
 import getpass
+import numpy as np
 import pandas as pd
 
 import constants as CN
@@ -54,78 +55,40 @@ class WriteFileSql:
             # Write Data Files
             # --------------------
 
-            # get next valid data file id. data files start counting from 1
-            next_file_id = self.sql_met.get_next_id(CN.DATA_FILE, CN.DATA_FILE_ID, sql_cur)
-            if next_file_id == 0:
-                next_file_id = 1
+            # look up all of the files in the database at once
+            file_ids = self.get_file_ids(data_files, sql_cur)
+            is_dupe = file_ids != CN.NO_KEY
+            list_dupes = data_files.loc[is_dupe, CN.FILE_ROW].tolist()
 
-            id_ctr = 0
-            list_dupes = []
-
-            # write out records for data files, but first:
-            # check for duplicates if flag on - delete if found
-            for row_num, file_line in data_files.iterrows():
-                # look for existing data file record
-                sql_cur.execute(CN.Q_FILE, [file_line[CN.FILEPATH], file_line[CN.FILENAME]])
-                result = sql_cur.fetchone()
-
-                # If you find a match, check the force_dup_file tag/flag
-                if sql_cur.rowcount > 0:
-                    list_dupes = list_dupes + [file_line[CN.FILE_ROW]]
-                    if not load_flags['force_dup_file']:
-                        logging.warning("!!! Duplicate file %s without FORCE_DUP_FILE tag",
-                                        file_line[CN.FULL_FILE])
-                    else:
-                        # With duplicate files allowed, save the existing id for the file
-                        data_files.loc[data_files.index[row_num], CN.DATA_FILE_ID] = result[0]
-                        logging.warning("Duplicate file %s already in data_file",
-                                        file_line[CN.FULL_FILE])
-                # Not a duplicate - give it a new id
+            # If you find a match, check the force_dup_file tag/flag
+            for full_file in data_files.loc[is_dupe, CN.FULL_FILE]:
+                if not load_flags['force_dup_file']:
+                    logging.warning("!!! Duplicate file %s without FORCE_DUP_FILE tag",
+                                    full_file)
                 else:
-                    data_files.loc[data_files.index[row_num], CN.DATA_FILE_ID] = \
-                        id_ctr + next_file_id
-                    id_ctr = id_ctr + 1
-
-            # end for row_num, file_line
-
-            if not load_flags['force_dup_file']:
-
-                # delete line data rows that match index of duplicated file
-                if not stat_data.empty and list_dupes:
-                    if stat_data.file_row.isin(list_dupes).any():
-                        stat_data.drop(stat_data[stat_data.file_row
-                                                 .isin(list_dupes)].index,
-                                       inplace=True)
-
-                if not mode_cts_data.empty and list_dupes:
-                    if mode_cts_data.file_row.isin(list_dupes).any():
-                        mode_cts_data.drop(mode_cts_data[mode_cts_data.file_row
-                                                         .isin(list_dupes)].index,
-                                           inplace=True)
-
-                if not mode_obj_data.empty and list_dupes:
-                    if mode_obj_data.file_row.isin(list_dupes).any():
-                        mode_obj_data.drop(mode_obj_data[mode_obj_data.file_row
-                                                         .isin(list_dupes)].index,
-                                           inplace=True)
-
-                if not mtd_2d_data.empty and list_dupes:
-                    if mtd_2d_data.file_row.isin(list_dupes).any():
-                        mtd_2d_data.drop(mtd_2d_data[mtd_2d_data.file_row
-                                                     .isin(list_dupes)].index,
-                                         inplace=True)
-
-                if not mtd_3d_single_data.empty and list_dupes:
-                    if mtd_3d_single_data.file_row.isin(list_dupes).any():
-                        mtd_3d_single_data.drop(mtd_3d_single_data[mtd_3d_single_data.file_row
-                                                                   .isin(list_dupes)].index,
-                                                inplace=True)
-
-                if not mtd_3d_pair_data.empty and list_dupes:
-                    if mtd_3d_pair_data.file_row.isin(list_dupes).any():
-                        mtd_3d_pair_data.drop(mtd_3d_pair_data[mtd_3d_pair_data.file_row
-                                                               .isin(list_dupes)].index,
-                                              inplace=True)
+                    logging.warning("Duplicate file %s already in data_file", full_file)
+
+            # With duplicate files allowed, save the existing id for the file
+            if load_flags['force_dup_file']:
+                data_files.loc[is_dupe, CN.DATA_FILE_ID] = file_ids[is_dupe]
+
+            # Not a duplicate - give it a new id from a reserved block. data files start from 1
+            next_file_id = self.sql_met.reserve_ids(CN.DATA_FILE, CN.DATA_FILE_ID,
+                                                    (~is_dupe).sum(), sql_cur, first_id=1)
+            data_files.loc[~is_dupe, CN.DATA_FILE_ID] = \
+                np.arange(next_file_id, next_file_id + (~is_dupe).sum())
+
+            # the line data from each kind of file
+            line_frames = [stat_data, mode_cts_data, mode_obj_data, tcst_data,
+                           mtd_2d_data, mtd_3d_single_data, mtd_3d_pair_data]
+
+            # delete line data rows that match index of duplicated file
+            if not load_flags['force_dup_file'] and list_dupes:
+                for line_frame in line_frames:
+                    if not line_frame.empty:
+                        is_dupe_line = line_frame[CN.FILE_ROW].isin(list_dupes)
+                        if is_dupe_line.any():
+                            line_frame.drop(line_frame.index[is_dupe_line], inplace=True)
 
             # delete duplicate file entries
             index_names = data_files[data_files.data_file_id == CN.NO_KEY].index
@@ -140,28 +103,11 @@ class WriteFileSql:
                 tcst_data.reset_index(drop=True, inplace=True)
 
                 # Replace the temporary id value with the actual index in the line data
-                for row_num, row in data_files.iterrows():
-                    if not stat_data.empty:
-                        stat_data.loc[stat_data[CN.FILE_ROW] == row[CN.FILE_ROW],
-                                      CN.DATA_FILE_ID] = row[CN.DATA_FILE_ID]
-                    if not mode_cts_data.empty:
-                        mode_cts_data.loc[mode_cts_data[CN.FILE_ROW] == row[CN.FILE_ROW],
-                                          CN.DATA_FILE_ID] = row[CN.DATA_FILE_ID]
-                    if not mode_obj_data.empty:
-                        mode_obj_data.loc[mode_obj_data[CN.FILE_ROW] == row[CN.FILE_ROW],
-                                          CN.DATA_FILE_ID] = row[CN.DATA_FILE_ID]
-                    if not tcst_data.empty:
-                        tcst_data.loc[tcst_data[CN.FILE_ROW] == row[CN.FILE_ROW],
-                                      CN.DATA_FILE_ID] = row[CN.DATA_FILE_ID]
-                    if not mtd_2d_data.empty:
-                        mtd_2d_data.loc[mtd_2d_data[CN.FILE_ROW] == row[CN.FILE_ROW],
-                                        CN.DATA_FILE_ID] = row[CN.DATA_FILE_ID]
-                    if not mtd_3d_single_data.empty:
-                        mtd_3d_single_data.loc[mtd_3d_single_data[CN.FILE_ROW] == row[CN.FILE_ROW],
-                                               CN.DATA_FILE_ID] = row[CN.DATA_FILE_ID]
-                    if not mtd_3d_pair_data.empty:
-                        mtd_3d_pair_data.loc[mtd_3d_pair_data[CN.FILE_ROW] == row[CN.FILE_ROW],
-                                             CN.DATA_FILE_ID] = row[CN.DATA_FILE_ID]
+                file_row_ids = pd.Series(data_files[CN.DATA_FILE_ID].values,
+                                         index=data_files[CN.FILE_ROW].values)
+                for line_frame in line_frames:
+                    if not line_frame.empty:
+                        line_frame[CN.DATA_FILE_ID] = line_frame[CN.FILE_ROW].map(file_row_ids)
 
                 # get just the new data files
                 new_files = data_files[data_files[CN.DATA_FILE_ID] >= next_file_id]
@@ -184,6 +130,30 @@ class WriteFileSql:
         return data_files, stat_data, mode_cts_data, mode_obj_data, tcst_data, \
             mtd_2d_data, mtd_3d_single_data, mtd_3d_pair_data
 
+    @staticmethod
+    def get_file_ids(data_files, sql_cur):
+        """ Look up the data files that are already in the database, a chunk of files per query.
+            Each file has its own SELECT, numbered by its row, so files are matched the way
+            the database compares them, such as without case, and not by the names it returns.
+            Returns:
+               series of existing data_file_id for each file, NO_KEY if not found
+        """
+        file_keys = data_files[[CN.FILEPATH, CN.FILENAME]].values.tolist()
+        file_ids = pd.Series(CN.NO_KEY, index=data_files.index)
+
+        for chunk_start in range(0, len(file_keys), CN.FILE_QUERY_SIZE):
+            chunk = file_keys[chunk_start:chunk_start + CN.FILE_QUERY_SIZE]
+            query_args = []
+            for row_num, file_key in enumerate(chunk, chunk_start):
+                query_args += [row_num] + file_key
+            sql_cur.execute(" UNION ALL ".join([CN.Q_FILE_ID] * len(chunk)), query_args)
+            # if a file is in the database more than once, its first id is used
+            for row_num, data_file_id in sql_cur.fetchall():
+                if data_file_id is not None:
+                    file_ids.iloc[row_num] = data_file_id
+
+        return file_ids
+
     def write_metadata_sql(self, load_flags, data_files, group, description,
                            load_note, xml_str, tmp_dir, sql_cur, local_infile):
         """ write metadata and instance info records to a SQL database.
@@ -228,8 +198,8 @@ class WriteFileSql:
 
             if load_flags['load_xml'] and not data_files.empty:
                 update_date = data_files[CN.LOAD_DATE].iloc[0]
-                next_instance_id = self.sql_met.get_next_id(CN.INSTANCE_INFO, CN.INSTANCE_INFO_ID,
-                                                            sql_cur)
+                next_instance_id = self.sql_met.reserve_ids(CN.INSTANCE_INFO, CN.INSTANCE_INFO_ID,
+                                                            1, sql_cur)
                 sql_cur.execute(CN.INS_INSTANCE, [next_instance_id, getpass.getuser(), update_date,
                                                   load_note, xml_str])
 
@@ -19,11 +19,13 @@ import sys
 import logging
 import time
 from datetime import timedelta
+import numpy as np
 import pandas as pd
 
 import constants as CN
 
 from run_sql import RunSql
+from lookup_header_sql import LookupHeaderSql
 
 
 class WriteModeSql:
@@ -53,52 +55,37 @@ class WriteModeSql:
             # --------------------
 
             # get the unique mode headers from cts_data and obj_data
-            if not cts_data.empty:
-                mode_headers = cts_data[CN.MODE_HEADER_FIELDS[1:]]
-            if not obj_data.empty:
-                mode_headers = mode_headers.append(obj_data[CN.MODE_HEADER_FIELDS[1:]],
-                                                   ignore_index=True)
+            mode_lines = pd.concat([mode_data[CN.MODE_HEADER_FIELDS[1:]]
+                                    for mode_data in (cts_data, obj_data) if not mode_data.empty],
+                                   ignore_index=True)
             # restore to original order now that cts and obj are recombined
-            mode_headers = mode_headers.sort_values(by=[CN.DATA_FILE_ID, CN.LINENUMBER])
-            # get unique values, keeping the first of the duplicate records
-            mode_headers.drop_duplicates(CN.MODE_HEADER_KEYS, keep='first', inplace=True)
-            mode_headers.reset_index(drop=True, inplace=True)
+            mode_lines = mode_lines.sort_values(by=[CN.DATA_FILE_ID, CN.LINENUMBER])
+            # get unique values by a hash of the keys, keeping the first of the duplicate records
+            header_codes, first_rows = \
+                LookupHeaderSql.hash_headers(mode_lines[CN.MODE_HEADER_KEYS])
+            mode_headers = mode_lines.iloc[first_rows].reset_index(drop=True)
+
+            # header of each cts line, then each obj line
+            line_codes = np.empty(len(mode_lines.index), dtype=np.int64)
+            line_codes[mode_lines.index.values] = header_codes
+            mode_lines = mode_lines.iloc[0:0]
 
             # At first, we do not know if the headers already exist, so we have no keys
             mode_headers[CN.MODE_HEADER_ID] = CN.NO_KEY
 
-            # get the next valid mode header id. Set it to zero (first valid id) if no records yet
-            next_header_id = sql_met.get_next_id(CN.MODE_HEADER, CN.MODE_HEADER_ID, sql_cur)
-
-            # if the flag is set to check for duplicate headers, get ids from existing headers
+            # when checking for existing headers, one load at a time looks up and writes
+            # new headers, so loads running at the same time do not add the same header.
+            # The lock is held until the set of files is committed
             if load_flags["mode_header_db_check"]:
+                sql_met.get_lock(CN.MODE_HEADER, sql_cur)
 
-                # For each header, query with unique fields to try to find a match in the database
-                for row_num, data_line in mode_headers.iterrows():
-                    data_line[CN.FCST_VALID] = \
-                        data_line[CN.FCST_VALID].strftime("%Y-%m-%d %H:%M:%S")
-                    data_line[CN.FCST_INIT] = data_line[CN.FCST_INIT].strftime("%Y-%m-%d %H:%M:%S")
-                    data_line[CN.OBS_VALID] = data_line[CN.OBS_VALID].strftime("%Y-%m-%d %H:%M:%S")
-                    # when n_valid and grid_res are null, query needs 'is null'
-                    if data_line[CN.N_VALID] == CN.MV_NULL and data_line[CN.GRID_RES] == CN.MV_NULL:
-                        sql_cur.execute(CN.QN_MHEADER,
-                                        [data_line[CN.VERSION],
-                                         data_line[CN.MODEL]] + data_line.values[7:-1].tolist())
-                    else:
-                        sql_cur.execute(CN.Q_MHEADER, data_line.values[3:-1].tolist())
-                    result = sql_cur.fetchone()
-
-                    # If you find a match, put the key into the mode_headers dataframe
-                    if sql_cur.rowcount > 0:
-                        mode_headers.loc[mode_headers.index[row_num], CN.MODE_HEADER_ID] = result[0]
-                    # otherwise create the next id and put it in
-                    else:
-                        mode_headers.loc[mode_headers.index[row_num], CN.MODE_HEADER_ID] = \
-                            row_num + next_header_id
-            else:
-                # When all new headers, add the next id to the row number/index to make a new key
-                mode_headers.loc[mode_headers.mode_header_id == CN.NO_KEY, CN.MODE_HEADER_ID] = \
-                    mode_headers.index + next_header_id
+            # if the flag is set to check for duplicate headers, get ids from existing headers
+            # new headers get ids from a block reserved for them
+            # n_valid and grid_res can be null, which the NULL safe lookup matches
+            next_header_id = \
+                LookupHeaderSql.set_header_ids(mode_headers, CN.MODE_HEADER, CN.MODE_HEADER_ID,
+                                               CN.MODE_HEADER_KEYS,
+                                               load_flags["mode_header_db_check"], sql_cur)
 
             # get just the new headers with their keys
             new_headers = mode_headers[mode_headers[CN.MODE_HEADER_ID] > (next_header_id - 1)]
@@ -106,8 +93,10 @@ class WriteModeSql:
 
             # Write any new headers out to the sql database
             if not new_headers.empty:
-                sql_met.write_to_sql(new_headers, CN.MODE_HEADER_FIELDS, CN.MODE_HEADER,
-                                     CN.INS_MHEADER, tmp_dir, sql_cur, local_infile)
+                # headers that were not written must not be given to later sets
+                if not sql_met.write_to_sql(new_headers, CN.MODE_HEADER_FIELDS, CN.MODE_HEADER,
+                                            CN.INS_MHEADER, tmp_dir, sql_cur, local_infile):
+                    LookupHeaderSql.drop_new_headers(CN.MODE_HEADER)
                 new_headers = new_headers.iloc[0:0]
 
             # --------------------
@@ -118,7 +107,10 @@ class WriteModeSql:
 
             if not cts_data.empty:
                 # put the header ids back into the dataframes
-                cts_data = pd.merge(left=mode_headers, right=cts_data, on=CN.MODE_HEADER_KEYS)
+                cts_data = LookupHeaderSql.add_header_ids(cts_data,
+                                                          mode_headers[CN.MODE_HEADER_ID].values,
+                                                          line_codes[:len(cts_data.index)],
+                                                          CN.MODE_HEADER_ID)
 
                 sql_met.write_to_sql(cts_data, CN.MODE_CTS_FIELDS, CN.MODE_CTS_T,
                                      CN.INS_CHEADER, tmp_dir, sql_cur, local_infile)
@@ -128,7 +120,10 @@ class WriteModeSql:
                 # MET has a different column name than METviewer
                 obj_data = obj_data.rename(columns={'axis_ang': 'axis_avg'})
                 # put the header ids back into the dataframes
-                obj_data = pd.merge(left=mode_headers, right=obj_data, on=CN.MODE_HEADER_KEYS)
+                obj_data = LookupHeaderSql.add_header_ids(obj_data,
+                                                          mode_headers[CN.MODE_HEADER_ID].values,
+                                                          line_codes[-len(obj_data.index):],
+                                                          CN.MODE_HEADER_ID)
                 mode_headers = mode_headers.iloc[0:0]
 
                 # intensity values can be NA, which causes MySQL warning
@@ -146,8 +141,9 @@ class WriteModeSql:
                 # reset the index so mode_obj_ids are set correctly
                 obj_data.reset_index(drop=True, inplace=True)
 
-                # get next valid mode object id. Set it to zero (first valid id) if no records yet
-                next_line_id = sql_met.get_next_id(CN.MODE_SINGLE_T, CN.MODE_OBJ_ID, sql_cur)
+                # reserve a block of mode object ids, one for each single object
+                next_line_id = sql_met.reserve_ids(CN.MODE_SINGLE_T, CN.MODE_OBJ_ID,
+                                                   len(obj_data.index), sql_cur)
 
                 # create the mode_obj_ids using the dataframe index and next valid id
                 obj_data[CN.MODE_OBJ_ID] = obj_data.index + next_line_id
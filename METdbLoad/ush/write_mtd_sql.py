@@ -24,6 +24,7 @@ import pandas as pd
 import constants as CN
 
 from run_sql import RunSql
+from lookup_header_sql import LookupHeaderSql
 
 
 class WriteMtdSql:
@@ -55,67 +56,42 @@ class WriteMtdSql:
             # --------------------
 
             # get the unique MTD headers
-            if not m_2d_data.empty:
-                mtd_headers = m_2d_data[CN.MTD_HEADER_FIELDS[1:]]
-            if not m_3d_single_data.empty:
-                mtd_headers = mtd_headers.append(m_3d_single_data[CN.MTD_HEADER_FIELDS[1:]],
-                                                 ignore_index=True)
-            if not m_3d_pair_data.empty:
-                mtd_headers = mtd_headers.append(m_3d_pair_data[CN.MTD_HEADER_FIELDS[1:]],
-                                                 ignore_index=True)
-
-            # get unique values, keeping the first of the duplicate records
-            mtd_headers = mtd_headers.drop_duplicates(CN.MTD_2D_HEADER_KEYS, keep='first')
-            mtd_headers.reset_index(drop=True, inplace=True)
-
-            # make sure type of columns is consistent between headers and line data
+            mtd_lines = pd.concat([mtd_data[CN.MTD_HEADER_FIELDS[1:]]
+                                   for mtd_data in (m_2d_data, m_3d_single_data, m_3d_pair_data)
+                                   if not mtd_data.empty], ignore_index=True)
+
+            # get unique values by a hash of the keys, keeping the first of the duplicate records
+            header_codes, first_rows = \
+                LookupHeaderSql.hash_headers(mtd_lines[CN.MTD_2D_HEADER_KEYS])
+            mtd_headers = mtd_lines.iloc[first_rows].reset_index(drop=True)
+            mtd_lines = mtd_lines.iloc[0:0]
+
+            # header of each 2D line, then each 3D single line, then each 3D pair line
+            codes_2d = header_codes[:len(m_2d_data.index)]
+            codes_single = header_codes[len(m_2d_data.index):
+                                        len(m_2d_data.index) + len(m_3d_single_data.index)]
+            codes_pair = header_codes[len(m_2d_data.index) + len(m_3d_single_data.index):]
+
+            # make sure type of columns is consistent between headers and database
             mtd_headers.fcst_lead = mtd_headers.fcst_lead.astype('int64')
             mtd_headers.obs_lead = mtd_headers.obs_lead.astype('int64')
 
             # At first, we do not know if the headers already exist, so we have no keys
             mtd_headers[CN.MTD_HEADER_ID] = CN.NO_KEY
 
-            # get the next valid MTD header id. Set it to zero (first valid id) if no records yet
-            next_header_id = sql_met.get_next_id(CN.MTD_HEADER, CN.MTD_HEADER_ID, sql_cur)
-
-            # if the flag is set to check for duplicate headers, get ids from existing headers
+            # when checking for existing headers, one load at a time looks up and writes
+            # new headers, so loads running at the same time do not add the same header.
+            # The lock is held until the set of files is committed
             if load_flags["mtd_header_db_check"]:
+                sql_met.get_lock(CN.MTD_HEADER, sql_cur)
 
-                # For each header, query with unique fields to try to find a match in the database
-                for row_num, data_line in mtd_headers.iterrows():
-                    data_line[CN.FCST_VALID] = \
-                        data_line[CN.FCST_VALID].strftime("%Y-%m-%d %H:%M:%S")
-                    data_line[CN.FCST_INIT] = data_line[CN.FCST_INIT].strftime("%Y-%m-%d %H:%M:%S")
-                    if data_line[CN.OBS_VALID] != CN.MV_NULL:
-                        data_line[CN.OBS_VALID] = \
-                            data_line[CN.OBS_VALID].strftime("%Y-%m-%d %H:%M:%S")
-                    if CN.MV_NULL not in data_line.values[4:-1].tolist():
-                        sql_cur.execute(CN.Q_MTDHEADER, data_line.values[4:-1].tolist())
-                    else:
-                        sql_query = "SELECT mtd_header_id FROM mtd_header WHERE " + \
-                                    "version=%s AND model=%s AND descr=%s AND fcst_lead=%s " + \
-                                    "AND fcst_valid=%s AND fcst_init=%s AND obs_lead=%s "
-                        data_values = data_line.values[4:11].tolist()
-                        for mfield in CN.MTD_HEADER_KEYS[7:]:
-                            if data_line[mfield] != CN.MV_NULL:
-                                sql_query = sql_query + 'AND ' + mfield + '=%s '
-                                data_values.append(data_line[mfield])
-                            else:
-                                sql_query = sql_query + 'AND ' + mfield + ' is NULL '
-                        sql_cur.execute(sql_query, data_values)
-                    result = sql_cur.fetchone()
-
-                    # If you find a match, put the key into the mtd_headers dataframe
-                    if sql_cur.rowcount > 0:
-                        mtd_headers.loc[mtd_headers.index[row_num], CN.MTD_HEADER_ID] = result[0]
-                    # otherwise create the next id and put it in
-                    else:
-                        mtd_headers.loc[mtd_headers.index[row_num], CN.MTD_HEADER_ID] = \
-                            row_num + next_header_id
-            else:
-                # When all new headers, add the next id to the row number/index to make a new key
-                mtd_headers.loc[mtd_headers.mtd_header_id == CN.NO_KEY, CN.MTD_HEADER_ID] = \
-                    mtd_headers.index + next_header_id
+            # if the flag is set to check for duplicate headers, get ids from existing headers
+            # new headers get ids from a block reserved for them
+            # fields that are null in the database are matched by the NULL safe lookup
+            next_header_id = \
+                LookupHeaderSql.set_header_ids(mtd_headers, CN.MTD_HEADER, CN.MTD_HEADER_ID,
+                                               CN.MTD_HEADER_KEYS,
+                                               load_flags["mtd_header_db_check"], sql_cur)
 
             # get just the new headers with their keys
             new_headers = mtd_headers[mtd_headers[CN.MTD_HEADER_ID] > (next_header_id - 1)]
@@ -124,18 +100,22 @@ class WriteMtdSql:
             # Write any new headers out to the sql database
             if not new_headers.empty:
                 # If there are any 2D revision files
-                if new_headers[CN.REVISION_ID].ne(CN.MV_NULL).any():
-                    # numbered revision ids must have max revision id added to be unique
-                    next_rev_id = sql_met.get_next_id(CN.MTD_HEADER, CN.REVISION_ID, sql_cur)
-                    new_headers.loc[new_headers.revision_id != CN.MV_NULL, CN.REVISION_ID] = \
-                        new_headers.loc[new_headers.revision_id != CN.MV_NULL, CN.REVISION_ID] + \
-                        next_rev_id
-                sql_met.write_to_sql(new_headers, CN.MTD_HEADER_FIELDS, CN.MTD_HEADER,
-                                     CN.INS_MTDHEADER, tmp_dir, sql_cur, local_infile)
+                revision_rows = new_headers.revision_id != CN.MV_NULL
+                if revision_rows.any():
+                    # numbered revision ids must have the start of a reserved block added
+                    # to be unique. Other headers have a revision id of MV_NULL
+                    revision_count = \
+                        int(new_headers.loc[revision_rows, CN.REVISION_ID].max()) + 1
+                    next_rev_id = sql_met.reserve_ids(CN.MTD_HEADER, CN.REVISION_ID,
+                                                      revision_count, sql_cur)
+                    new_headers.loc[revision_rows, CN.REVISION_ID] = \
+                        new_headers.loc[revision_rows, CN.REVISION_ID] + next_rev_id
+                # headers that were not written must not be given to later sets
+                if not sql_met.write_to_sql(new_headers, CN.MTD_HEADER_FIELDS, CN.MTD_HEADER,
+                                            CN.INS_MTDHEADER, tmp_dir, sql_cur, local_infile):
+                    LookupHeaderSql.drop_new_headers(CN.MTD_HEADER)
                 new_headers = new_headers.iloc[0:0]
 
-            mtd_headers.obs_valid = pd.to_datetime(mtd_headers.obs_valid, errors='coerce')
-
             # --------------------
             # Write Line Data
             # --------------------
@@ -144,7 +124,9 @@ class WriteMtdSql:
 
             if not m_2d_data.empty:
                 # put the header ids back into the dataframe
-                m_2d_data = pd.merge(left=mtd_headers, right=m_2d_data, on=CN.MTD_2D_HEADER_KEYS)
+                m_2d_data = LookupHeaderSql.add_header_ids(m_2d_data,
+                                                           mtd_headers[CN.MTD_HEADER_ID].values,
+                                                           codes_2d, CN.MTD_HEADER_ID)
 
                 # create defaults for flags
                 m_2d_data[CN.SIMPLE_FLAG] = 1
@@ -174,15 +156,11 @@ class WriteMtdSql:
 
             if not m_3d_single_data.empty:
 
-                # make sure type of columns is consistent between headers and line data
-                m_3d_single_data.fcst_lead = m_3d_single_data.fcst_lead.astype('int64')
-                m_3d_single_data.obs_lead = m_3d_single_data.obs_lead.astype('int64')
-                m_3d_single_data.obs_valid = pd.to_datetime(m_3d_single_data.obs_valid,
-                                                            errors='coerce')
-
                 # put the header ids back into the dataframe
-                m_3d_single_data = pd.merge(left=mtd_headers, right=m_3d_single_data,
-                                            on=CN.MTD_HEADER_KEYS)
+                m_3d_single_data = \
+                    LookupHeaderSql.add_header_ids(m_3d_single_data,
+                                                   mtd_headers[CN.MTD_HEADER_ID].values,
+                                                   codes_single, CN.MTD_HEADER_ID)
 
                 # create defaults for flags
                 m_3d_single_data[CN.SIMPLE_FLAG] = 1
@@ -212,14 +190,11 @@ class WriteMtdSql:
 
             if not m_3d_pair_data.empty:
 
-                # make sure type of columns is consistent between headers and line data
-                m_3d_pair_data.fcst_lead = m_3d_pair_data.fcst_lead.astype('int64')
-                m_3d_pair_data.obs_lead = m_3d_pair_data.obs_lead.astype('int64')
-                m_3d_pair_data.obs_valid = pd.to_datetime(m_3d_pair_data.obs_valid, errors='coerce')
-
                 # put the header ids back into the dataframe
-                m_3d_pair_data = pd.merge(left=mtd_headers, right=m_3d_pair_data,
-                                          on=CN.MTD_HEADER_KEYS)
+                m_3d_pair_data = \
+                    LookupHeaderSql.add_header_ids(m_3d_pair_data,
+                                                   mtd_headers[CN.MTD_HEADER_ID].values,
+                                                   codes_pair, CN.MTD_HEADER_ID)
                 mtd_headers = mtd_headers.iloc[0:0]
 
                 # create defaults for flags
@@ -25,6 +25,7 @@ import pandas as pd
 import constants as CN
 
 from run_sql import RunSql
+from lookup_header_sql import LookupHeaderSql
 
 
 class WriteStatSql:
@@ -54,34 +55,26 @@ class WriteStatSql:
 
             # find the unique headers for this current load job
             # Do not include Version, as MVLoad does not
-            stat_headers = stat_data[CN.STAT_HEADER_KEYS].copy()
-            stat_headers.drop_duplicates(CN.STAT_HEADER_KEYS[1:], keep='first', inplace=True)
-            stat_headers.reset_index(drop=True, inplace=True)
+            # Lines with the same hash of the header keys have the same header
+            header_codes, first_rows = \
+                LookupHeaderSql.hash_headers(stat_data[CN.STAT_HEADER_KEYS[1:]])
+            stat_headers = stat_data.iloc[first_rows][CN.STAT_HEADER_KEYS].reset_index(drop=True)
 
             # At first, we do not know if the headers already exist, so we have no keys
             stat_headers[CN.STAT_HEADER_ID] = CN.NO_KEY
 
-            # get the next valid stat header id. Set it to zero (first valid id) if no records yet
-            next_header_id = sql_met.get_next_id(CN.STAT_HEADER, CN.STAT_HEADER_ID, sql_cur)
-
-            # if the flag is set to check for duplicate headers, get ids from existing headers
+            # when checking for existing headers, one load at a time looks up and writes
+            # new headers, so loads running at the same time do not add the same header.
+            # The lock is held until the set of files is committed
             if load_flags["stat_header_db_check"]:
+                sql_met.get_lock(CN.STAT_HEADER, sql_cur)
 
-                # For each header, query with unique fields to try to find a match in the database
-                for row_num, data_line in stat_headers.iterrows():
-                    sql_cur.execute(CN.Q_HEADER, data_line.values[1:-1].tolist())
-                    result = sql_cur.fetchone()
-
-                    # If you find a match, put the key into the stat_headers dataframe
-                    if sql_cur.rowcount > 0:
-                        stat_headers.loc[stat_headers.index[row_num], CN.STAT_HEADER_ID] = result[0]
-                    else:
-                        stat_headers.loc[stat_headers.index[row_num], CN.STAT_HEADER_ID] = \
-                            row_num + next_header_id
-            else:
-                # When all new headers, add the next id to the row number/index to make a new key
-                stat_headers.loc[stat_headers.stat_header_id == CN.NO_KEY, CN.STAT_HEADER_ID] = \
-                    stat_headers.index + next_header_id
+            # if the flag is set to check for duplicate headers, get ids from existing headers
+            # new headers get ids from a block reserved for them
+            next_header_id = \
+                LookupHeaderSql.set_header_ids(stat_headers, CN.STAT_HEADER, CN.STAT_HEADER_ID,
+                                               CN.STAT_HEADER_KEYS[1:],
+                                               load_flags["stat_header_db_check"], sql_cur)
 
             # get just the new headers with their keys
             new_headers = stat_headers[stat_headers[CN.STAT_HEADER_ID] > (next_header_id - 1)]
@@ -89,14 +82,13 @@ class WriteStatSql:
 
             # Write any new headers out to the sql database
             if not new_headers.empty:
-                sql_met.write_to_sql(new_headers, CN.STAT_HEADER_FIELDS, CN.STAT_HEADER,
-                                     CN.INS_HEADER, tmp_dir, sql_cur, local_infile)
+                # headers that were not written must not be given to later sets
+                if not sql_met.write_to_sql(new_headers, CN.STAT_HEADER_FIELDS, CN.STAT_HEADER,
+                                            CN.INS_HEADER, tmp_dir, sql_cur, local_infile):
+                    LookupHeaderSql.drop_new_headers(CN.STAT_HEADER)
 
             # put the header ids back into the dataframe of all the line data
-            stat_data = pd.merge(left=stat_data, right=stat_headers, on=CN.STAT_HEADER_KEYS[1:])
-            # Merging with limited keys renames the version column, change it back
-            if 'version_x' in stat_data.columns:
-                stat_data = stat_data.rename(columns={'version_x': CN.VERSION})
+            stat_data[CN.STAT_HEADER_ID] = stat_headers[CN.STAT_HEADER_ID].values[header_codes]
             # Clean out the headers working dataframes
             stat_headers = stat_headers.iloc[0:0]
             new_headers = new_headers.iloc[0:0]
@@ -126,9 +118,9 @@ class WriteStatSql:
 
                 # Only variable length lines have a line_data_id
                 if line_type in CN.VAR_LINE_TYPES:
-                    # Get next valid line data id. Set it to zero (first valid id) if no records yet
-                    next_line_id = \
-                        sql_met.get_next_id(line_table, CN.LINE_DATA_ID, sql_cur)
+                    # Reserve a block of line data ids, one for each line
+                    next_line_id = sql_met.reserve_ids(line_table, CN.LINE_DATA_ID,
+                                                       len(line_data.index), sql_cur)
                     logging.debug("next_line_id is %s", next_line_id)
 
                     # try to keep order the same as MVLoad
@@ -137,85 +129,8 @@ class WriteStatSql:
 
                     line_data[CN.LINE_DATA_ID] = line_data.index + next_line_id
 
-                    # index of the first column of the repeating variables
-                    var_index = line_data.columns.get_loc(CN.LINE_VAR_COUNTER[line_type]) + 1
-
-                    # There are 10 extra variables after n_thresh in PSTD records
-                    if line_type == CN.PSTD:
-                        var_index = var_index + 10
-
-                    # need this later for old RHIST
-                    orig_index = var_index
-
-                    # process each variable line one at a time for different versions
-                    for row_num, file_line in line_data.iterrows():
-                        # how many sets of repeating variables
-                        var_count = int(file_line[CN.LINE_VAR_COUNTER[line_type]])
-                        # these two variable line types are one group short
-                        if line_type in [CN.PJC, CN.PRC]:
-                            var_count = var_count - 1
-
-                        # VSDB and STAT values for sets of repeating vars may be different
-                        if line_type == 'CN.ECLV':
-                            var_count = var_index - 1
-
-                        # reset to original value
-                        var_index = orig_index
-
-                        # older versions of RHIST have varying ECNT data in them
-                        if line_type == CN.RHIST and file_line[CN.VERSION] in CN.RHIST_OLD:
-                            var_count = int(file_line['3'])
-                            var_index = orig_index + 2
-                            if file_line[CN.VERSION] in CN.RHIST_5:
-                                var_index = var_index + 1
-                            if file_line[CN.VERSION] in CN.RHIST_6:
-                                var_index = var_index + 2
-                        # MCTC needs an i and a j counter
-                        if line_type == CN.MCTC:
-                            basic_count = var_count
-                            var_count = var_count * var_count
-                        # The number of variables in the repeats
-                        var_repeats = CN.LINE_VAR_REPEATS[line_type]
-                        # number of sets of variables times the number of variables in the sets
-                        repeat_width = int(var_count * var_repeats)
-
-                        # pull out just the repeating data
-                        list_var_data = file_line.iloc[var_index:var_index + repeat_width]
-                        # put it into the right number of rows and columns
-                        var_data = \
-                            pd.DataFrame(list_var_data.values.reshape(var_count, var_repeats))
-
-                        # for older versions of RHIST, blank out repeating fields in line data
-                        if line_type == CN.RHIST and file_line[CN.VERSION] in CN.RHIST_OLD:
-                            line_data.iloc[row_num, var_index:var_index + repeat_width] = \
-                                CN.MV_NOTAV
-
-                        # for stat file versions of PSTD, blank out variable fields in line data
-                        if line_type == CN.PSTD and file_line[CN.VERSION] != 'V01':
-                            line_data.iloc[row_num, var_index:var_index + repeat_width] = \
-                                CN.MV_NOTAV
-
-                        # add on the first two fields - line data id, and i value
-                        var_data.insert(0, CN.LINE_DATA_ID, file_line[CN.LINE_DATA_ID])
-                        var_data.insert(1, 'i_value', var_data.index + 1)
-
-                        # MCTC has i and j counters where j increments faster
-                        if line_type == CN.MCTC:
-                            var_data.loc[:, 'i_value'] = \
-                                np.repeat(np.array(range(1, basic_count + 1)), basic_count)
-                            j_indices = np.resize(range(1, basic_count + 1), var_count)
-                            var_data.insert(2, 'j_value', j_indices)
-
-                        if line_type == CN.ORANK:
-                            # move the values after the variable length data to the left
-                            var_end = var_index + repeat_width
-                            line_data.iloc[row_num, var_index:var_index + 7] = \
-                                line_data.iloc[row_num, var_end:var_end + 7].values
-
-                        # collect all of the variable data for a line type
-                        all_var = all_var.append(var_data, ignore_index=True)
-
-                    # end for row_num, file_line
+                    # expand the repeating variables into rows of the variable length table
+                    all_var = WriteStatSql.get_var_data(line_type, line_data)
 
                     if line_type == CN.RHIST:
                         # copy the RHIST columns and create ECNT lines from them
@@ -278,3 +193,94 @@ class WriteStatSql:
         logging.info("    >>> Write time Stat: %s", str(write_time))
 
         logging.debug("[--- End write_stat_data ---]")
+
+    @staticmethod
+    def get_var_data(line_type, line_data):
+        """ Expand the repeating variables of variable length lines into rows of the
+            variable length table. Lines with the same number of repeats, starting in the
+            same column, are reshaped together. Fields in line_data are blanked or moved
+            where the line type needs it.
+            Returns:
+               dataframe of variable length data
+        """
+        # index of the first column of the repeating variables
+        orig_index = line_data.columns.get_loc(CN.LINE_VAR_COUNTER[line_type]) + 1
+
+        # There are 10 extra variables after n_thresh in PSTD records
+        if line_type == CN.PSTD:
+            orig_index = orig_index + 10
+
+        # how many sets of repeating variables, and where they start, for each line
+        var_counts = line_data[CN.LINE_VAR_COUNTER[line_type]].values.astype(int)
+        var_indexes = np.full(len(line_data.index), orig_index)
+
+        # these two variable line types are one group short
+        if line_type in [CN.PJC, CN.PRC]:
+            var_counts = var_counts - 1
+
+        # older versions of RHIST have varying ECNT data in them
+        old_rhist = np.zeros(len(line_data.index), dtype=bool)
+        if line_type == CN.RHIST:
+            old_rhist = line_data[CN.VERSION].isin(CN.RHIST_OLD).values
+            var_counts[old_rhist] = line_data.loc[old_rhist, '3'].values.astype(int)
+            var_indexes[old_rhist] = orig_index + 2
+            var_indexes[line_data[CN.VERSION].isin(CN.RHIST_5).values] += 1
+            var_indexes[line_data[CN.VERSION].isin(CN.RHIST_6).values] += 2
+
+        # for older versions of RHIST, and stat file versions of PSTD, blank out
+        # the repeating fields in line data
+        blank_lines = old_rhist
+        if line_type == CN.PSTD:
+            blank_lines = line_data[CN.VERSION].ne('V01').values
+
+        # MCTC needs an i and a j counter
+        basic_counts = var_counts
+        if line_type == CN.MCTC:
+            var_counts = var_counts * var_counts
+
+        var_counts = np.maximum(var_counts, 0)
+        # The number of variables in the repeats
+        var_repeats = CN.LINE_VAR_REPEATS[line_type]
+
+        # row of the variable data where each line starts
+        var_starts = np.cumsum(var_counts) - var_counts
+        line_values = line_data.values
+        var_values = np.empty((var_counts.sum(), var_repeats), dtype=object)
+
+        line_groups = pd.DataFrame({'var_index': var_indexes, 'var_count': var_counts})
+        line_groups = line_groups.groupby(['var_index', 'var_count']).indices
+
+        for (var_index, var_count), group_rows in line_groups.items():
+            # number of sets of variables times the number of variables in the sets
+            repeat_width = var_count * var_repeats
+            var_rows = (var_starts[group_rows][:, np.newaxis] + np.arange(var_count)).ravel()
+
+            # pull out just the repeating data, in the right number of rows and columns
+            var_block = line_values[group_rows, var_index:var_index + repeat_width]
+            var_values[var_rows] = var_block.reshape(-1, var_repeats)
+
+            blank_rows = group_rows[blank_lines[group_rows]]
+            if blank_rows.size:
+                line_data.iloc[blank_rows, var_index:var_index + repeat_width] = CN.MV_NOTAV
+
+            if line_type == CN.ORANK:
+                # move the values after the variable length data to the left
+                var_end = var_index + repeat_width
+                line_data.iloc[group_rows, var_index:var_index + 7] = \
+                    line_values[group_rows, var_end:var_end + 7]
+
+        var_data = pd.DataFrame(var_values)
+
+        # add on the first two fields - line data id, and i value
+        var_data.insert(0, CN.LINE_DATA_ID,
+                        np.repeat(line_data[CN.LINE_DATA_ID].values, var_counts))
+        var_nums = np.arange(len(var_data.index)) - np.repeat(var_starts, var_counts)
+        var_data.insert(1, 'i_value', var_nums + 1)
+
+        # MCTC has i and j counters where j increments faster
+        if line_type == CN.MCTC:
+            basic_counts = np.repeat(basic_counts, var_counts)
+            var_data['i_value'] = var_nums // basic_counts + 1
+            var_data.insert(2, 'j_value', var_nums % basic_counts + 1)
+
+        return var_data
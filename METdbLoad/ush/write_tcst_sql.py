@@ -25,6 +25,7 @@ import pandas as pd
 import constants as CN
 
 from run_sql import RunSql
+from lookup_header_sql import LookupHeaderSql
 
 
 class WriteTcstSql:
@@ -54,34 +55,26 @@ class WriteTcstSql:
 
             # find the unique headers for this current load job
             # Do not include Version, as MVLoad does not
-            tcst_headers = tcst_data[CN.TCST_HEADER_KEYS].copy()
-            tcst_headers.drop_duplicates(CN.TCST_HEADER_KEYS[1:], keep='first', inplace=True)
-            tcst_headers.reset_index(drop=True, inplace=True)
+            # Lines with the same hash of the header keys have the same header
+            header_codes, first_rows = \
+                LookupHeaderSql.hash_headers(tcst_data[CN.TCST_HEADER_KEYS[1:]])
+            tcst_headers = tcst_data.iloc[first_rows][CN.TCST_HEADER_KEYS].reset_index(drop=True)
 
             # At first, we do not know if the headers already exist, so we have no keys
             tcst_headers[CN.TCST_HEADER_ID] = CN.NO_KEY
 
-            # get the next valid tcst header id. Set it to zero (first valid id) if no records yet
-            next_header_id = sql_met.get_next_id(CN.TCST_HEADER, CN.TCST_HEADER_ID, sql_cur)
-
-            # if the flag is set to check for duplicate headers, get ids from existing headers
+            # when checking for existing headers, one load at a time looks up and writes
+            # new headers, so loads running at the same time do not add the same header.
+            # The lock is held until the set of files is committed
             if load_flags["tcst_header_db_check"]:
+                sql_met.get_lock(CN.TCST_HEADER, sql_cur)
 
-                # For each header, query with unique fields to try to find a match in the database
-                for row_num, data_line in tcst_headers.iterrows():
-                    sql_cur.execute(CN.Q_HEADER_TCST, data_line.values[1:-1].tolist())
-                    result = sql_cur.fetchone()
-
-                    # If you find a match, put the key into the tcst_headers dataframe
-                    if sql_cur.rowcount > 0:
-                        tcst_headers.loc[tcst_headers.index[row_num], CN.TCST_HEADER_ID] = result[0]
-                    else:
-                        tcst_headers.loc[tcst_headers.index[row_num], CN.TCST_HEADER_ID] = \
-                            row_num + next_header_id
-            else:
-                # When all new headers, add the next id to the row number/index to make a new key
-                tcst_headers.loc[tcst_headers.tcst_header_id == CN.NO_KEY, CN.TCST_HEADER_ID] = \
-                    tcst_headers.index + next_header_id
+            # if the flag is set to check for duplicate headers, get ids from existing headers
+            # new headers get ids from a block reserved for them
+            next_header_id = \
+                LookupHeaderSql.set_header_ids(tcst_headers, CN.TCST_HEADER, CN.TCST_HEADER_ID,
+                                               CN.TCST_HEADER_KEYS[1:],
+                                               load_flags["tcst_header_db_check"], sql_cur)
 
             # get just the new headers with their keys
             new_headers = tcst_headers[tcst_headers[CN.TCST_HEADER_ID] > (next_header_id - 1)]
@@ -89,14 +82,13 @@ class WriteTcstSql:
 
             # Write any new headers out to the sql database
             if not new_headers.empty:
-                sql_met.write_to_sql(new_headers, CN.TCST_HEADER_FIELDS, CN.TCST_HEADER,
-                                     CN.INS_HEADER_TCST, tmp_dir, sql_cur, local_infile)
+                # headers that were not written must not be given to later sets
+                if not sql_met.write_to_sql(new_headers, CN.TCST_HEADER_FIELDS, CN.TCST_HEADER,
+                                            CN.INS_HEADER_TCST, tmp_dir, sql_cur, local_infile):
+                    LookupHeaderSql.drop_new_headers(CN.TCST_HEADER)
 
             # put the header ids back into the dataframe of all the line data
-            tcst_data = pd.merge(left=tcst_data, right=tcst_headers, on=CN.TCST_HEADER_KEYS[1:])
-            # Merging with limited keys renames the version column, change it back
-            if 'version_x' in tcst_data.columns:
-                tcst_data = tcst_data.rename(columns={'version_x': CN.VERSION})
+            tcst_data[CN.TCST_HEADER_ID] = tcst_headers[CN.TCST_HEADER_ID].values[header_codes]
             # Clean out the headers working dataframes
             tcst_headers = tcst_headers.iloc[0:0]
             new_headers = new_headers.iloc[0:0]
@@ -139,9 +131,9 @@ class WriteTcstSql:
 
                 # Only variable length lines have a line_data_id
                 if line_type in CN.VAR_LINE_TYPES_TCST:
-                    # Get next valid line data id. Set it to zero (first valid id) if no records yet
-                    next_line_id = \
-                        sql_met.get_next_id(line_table, CN.LINE_DATA_ID, sql_cur)
+                    # Reserve a block of line data ids, one for each line
+                    next_line_id = sql_met.reserve_ids(line_table, CN.LINE_DATA_ID,
+                                                       len(line_data.index), sql_cur)
                     logging.debug("next_line_id is %s", next_line_id)
 
                     # try to keep order the same as MVLoad